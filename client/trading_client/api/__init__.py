@@ -1,4 +1,6 @@
 from .api_client import APIClient
-from .product import Product, PriceRecord
+from .product import Product, PriceRecord, PriceTick, Candle, RecordArrays
 from .user import User, InventoryItem
 from .market import Market, MarketItem
+from .snapshot import Snapshot
+from .order import Order, Fill, OrderResult
@@ -1,4 +1,5 @@
-from datetime import datetime
+from datetime import datetime, timedelta
+from pathlib import Path
 from functools import wraps
 import traceback
 import httpx
@@ -18,15 +19,25 @@ from typing import (
 import random
 import logging
 import json
+import struct
+import sys
+from array import array
 
-from .product import Product, PriceRecord
+from .product import Product, PriceRecord, PriceTick, Candle, RecordArrays
+from .http_cache import ConditionalCache, default_cache_path
 from .market import Market, MarketItem
 from .user import User, InventoryItem
+from .snapshot import Snapshot
+from .order import Order, Fill, OrderResult
 from .responses import (
     MarketItemResponse,
     UserResponse,
     ProductResponse,
     PriceRecordResponse,
+    ProductCandlesResponse,
+    TickResponse,
+    SnapshotResponse,
+    OrderBatchResponse,
 )
 from .exceptions import (
     IncorrectCredentials,
@@ -38,6 +49,32 @@ from .exceptions import (
 
 from textual import log
 
+RECORD_ARRAYS_MEDIA_TYPE = "application/vnd.trading.columns"
+
+
+def decode_record_arrays(data: bytes) -> list[RecordArrays]:
+    """Decodes the little-endian record arrays of the server
+
+    The layout is a uint32 product count, per product an int32 id and a uint32
+    record count, followed per product by the int64 timestamps, int32 prices and
+    int64 cursors.
+    """
+    (product_count,) = struct.unpack_from("<I", data)
+    header = struct.unpack_from("<" + "iI" * product_count, data, 4)
+    offset = 4 + 8 * product_count
+    products = []
+    for product_id, count in zip(header[::2], header[1::2]):
+        columns = []
+        for typecode, size in (("q", 8), ("i", 4), ("q", 8)):
+            column = array(typecode)
+            column.frombytes(data[offset : offset + count * size])
+            if sys.byteorder == "big":
+                column.byteswap()
+            columns.append(column)
+            offset += count * size
+        products.append(RecordArrays(product_id, *columns))
+    return products
+
 
 # write a decorator function that takes in a list of exceptions catches them and retries the api call. The decorator should be applicable to a class to effect all async functions. It should also take a max_retries function
 
@@ -106,14 +143,50 @@ class Cache(TypedDict):
 
 
 class APIClient:
-    """ """
-
-    def __init__(self, base_url="http://localhost:8000") -> None:
+    """
+
+    Args:
+      base_url: Address of the trading server
+      cache_path: File the catalog responses are kept in between sessions, None
+    for the default location in $XDG_CACHE_HOME or ~/.cache
+      persist_cache: False to only keep the catalog responses in memory
+
+    """
+
+    def __init__(
+        self,
+        base_url="http://localhost:8000",
+        cache_path: Path | None = None,
+        persist_cache: bool = True,
+    ) -> None:
         self.client = httpx.AsyncClient(base_url=base_url)  # Use AsyncClient
 
         self.cache: Cache = {
             "products": {},
         }
+        if persist_cache and cache_path is None:
+            cache_path = default_cache_path()
+        self.http_cache = ConditionalCache(cache_path if persist_cache else None)
+
+    async def _get_revalidated(self, url: str) -> httpx.Response:
+        """GETs a response the server tags with an ETag. A stored copy is
+        revalidated with If-None-Match and reused if the server answers 304 Not
+        Modified."""
+        key = str(self.client.base_url.join(url))
+        cached = self.http_cache.get(key)
+        headers = {"If-None-Match": cached.etag} if cached else {}
+        response = await self.client.get(url, headers=headers)
+
+        if response.status_code == 304 and cached is not None:
+            return httpx.Response(
+                200,
+                headers=response.headers,
+                content=cached.body,
+                request=response.request,
+            )
+        if response.status_code == 200 and "etag" in response.headers:
+            self.http_cache.store(key, response.headers["etag"], response.content)
+        return response
 
     async def login(self, username: str, password: str):
         response = await self.client.post(
@@ -174,7 +247,7 @@ class APIClient:
             return self.cache["products"][product_id]
 
         log.info("sending request for {}".format(product_id))
-        response = await self.client.get(f"/product/{product_id}")
+        response = await self._get_revalidated(f"/product/{product_id}")
 
         if response.status_code == 404:
             raise ProductNotFound(response.json()["message"])
@@ -187,13 +260,21 @@ class APIClient:
 
     @retry_on_exception(CATCH, MAX_RETRIES)
     async def get_records(
-        self, product_id: int, from_: datetime, to_: datetime | None = None
+        self,
+        product_id: int,
+        from_: datetime | None = None,
+        to_: datetime | None = None,
+        after: int | None = None,
     ) -> list[PriceRecord]:
-        params = {
-            "from": from_.isoformat(),
-        }
+        """Gets the records of a product in a time range, or with `after` exactly
+        the records stored after that cursor."""
+        params: dict[str, str | int] = {}
+        if from_ is not None:
+            params["from"] = from_.isoformat()
         if to_ is not None:
             params["to"] = to_.isoformat()
+        if after is not None:
+            params["after"] = after
 
         response = await self.client.get(
             f"/product/{product_id}/records",
@@ -203,17 +284,202 @@ class APIClient:
         data: PriceRecordResponse = response.json()
         return [
             PriceRecord(
-                date=datetime.fromisoformat(record["date"]), value=record["value"]
+                date=datetime.fromisoformat(record["date"]),
+                value=record["value"],
+                cursor=record["cursor"],
             )
             for record in data["records"]
         ]
 
+    @retry_on_exception(CATCH, MAX_RETRIES)
+    async def get_candles(
+        self,
+        product_id: int,
+        interval: timedelta,
+        from_: datetime | None = None,
+        to_: datetime | None = None,
+    ) -> list[Candle]:
+        """Gets the records of a product downsampled to one candle per interval."""
+        params: dict[str, str | float] = {"interval": interval.total_seconds()}
+        if from_ is not None:
+            params["from"] = from_.isoformat()
+        if to_ is not None:
+            params["to"] = to_.isoformat()
+
+        response = await self.client.get(
+            f"/product/{product_id}/candles", params=params
+        )
+        if response.status_code == 404:
+            raise ProductNotFound(response.json()["message"])
+        response.raise_for_status()
+        data: ProductCandlesResponse = response.json()
+        return [
+            Candle(
+                start=datetime.fromisoformat(candle["start"]),
+                open=candle["open"],
+                high=candle["high"],
+                low=candle["low"],
+                close=candle["close"],
+                count=candle["count"],
+            )
+            for candle in data["candles"]
+        ]
+
+    @retry_on_exception(CATCH, MAX_RETRIES)
+    async def get_records_batch(
+        self,
+        product_ids: Iterable[int],
+        since: datetime | None = None,
+        after: int | None = None,
+    ) -> dict[int, list[PriceRecord]]:
+        """Gets the records of many products that are newer than `since`, or with
+        `after` the ones stored after that cursor, with a single request."""
+        params: dict[str, str | int | list[int]] = {"ids": list(product_ids)}
+        if since is not None:
+            params["since"] = since.isoformat()
+        if after is not None:
+            params["after"] = after
+
+        response = await self.client.get("/records", params=params)
+        response.raise_for_status()
+        data: list[PriceRecordResponse] = response.json()
+        return {
+            product["product_id"]: [
+                PriceRecord(
+                    date=datetime.fromisoformat(record["date"]),
+                    value=record["value"],
+                    cursor=record["cursor"],
+                )
+                for record in product["records"]
+            ]
+            for product in data
+        }
+
+    @retry_on_exception(CATCH, MAX_RETRIES)
+    async def get_record_arrays(
+        self,
+        product_id: int,
+        from_: datetime | None = None,
+        to_: datetime | None = None,
+        after: int | None = None,
+    ) -> RecordArrays:
+        """Like get_records, but transfers and decodes the records as arrays."""
+        params: dict[str, str | int] = {}
+        if from_ is not None:
+            params["from"] = from_.isoformat()
+        if to_ is not None:
+            params["to"] = to_.isoformat()
+        if after is not None:
+            params["after"] = after
+
+        response = await self.client.get(
+            f"/product/{product_id}/records",
+            params=params,
+            headers={"Accept": RECORD_ARRAYS_MEDIA_TYPE},
+        )
+        response.raise_for_status()
+        return decode_record_arrays(response.content)[0]
+
+    @retry_on_exception(CATCH, MAX_RETRIES)
+    async def get_record_arrays_batch(
+        self,
+        product_ids: Iterable[int],
+        since: datetime | None = None,
+        after: int | None = None,
+    ) -> dict[int, RecordArrays]:
+        """Like get_records_batch, but transfers and decodes the records as
+        arrays."""
+        params: dict[str, str | int | list[int]] = {"ids": list(product_ids)}
+        if since is not None:
+            params["since"] = since.isoformat()
+        if after is not None:
+            params["after"] = after
+
+        response = await self.client.get(
+            "/records",
+            params=params,
+            headers={"Accept": RECORD_ARRAYS_MEDIA_TYPE},
+        )
+        response.raise_for_status()
+        return {
+            arrays.product_id: arrays
+            for arrays in decode_record_arrays(response.content)
+        }
+
     @retry_on_exception(CATCH, MAX_RETRIES)
     async def get_products(self) -> list[Product]:
-        response = await self.client.get("/products")
+        response = await self._get_revalidated("/products")
         response.raise_for_status()
         data: list[ProductResponse] = response.json()
-        return [Product(**product) for product in data]
+        products = [Product(**product) for product in data]
+        # products never change, later lookups of single products need no request
+        self.cache["products"].update(
+            (product.product_id, product) for product in products
+        )
+        return products
+
+    @retry_on_exception(CATCH, MAX_RETRIES)
+    async def get_snapshot(self, records_since: datetime | None = None) -> Snapshot:
+        """Gets the user, the market supply and the latest prices with a single
+        request, with `records_since` also the records newer than that time."""
+        params: dict[str, str] = {}
+        if records_since is not None:
+            params["records_since"] = records_since.isoformat()
+
+        response = await self.client.get("/snapshot", params=params)
+
+        if response.status_code == 401:
+            raise InvalidToken(response.json()["message"])
+        response.raise_for_status()
+
+        data: SnapshotResponse = response.json()
+        products = [Product(**product) for product in data["products"]]
+        self.cache["products"].update(
+            (product.product_id, product) for product in products
+        )
+        user = data["user"]
+        records = data["records"]
+        return Snapshot(
+            user=User(
+                user_id=user["user_id"],
+                user_name=user["user_name"],
+                balance=user["balance"],
+                inventory=[
+                    InventoryItem(
+                        await self.get_product(item["product_id"]), item["quantity"]
+                    )
+                    for item in user["inventory"]
+                ],
+            ),
+            products=products,
+            market=Market(
+                supply={item["product_id"]: item["quantity"] for item in data["market"]}
+            ),
+            prices={
+                price["product_id"]: PriceRecord(
+                    date=datetime.fromisoformat(price["date"]),
+                    value=price["value"],
+                    cursor=price["cursor"],
+                )
+                for price in data["prices"]
+            },
+            records=(
+                {
+                    product["product_id"]: [
+                        PriceRecord(
+                            date=datetime.fromisoformat(record["date"]),
+                            value=record["value"],
+                            cursor=record["cursor"],
+                        )
+                        for record in product["records"]
+                    ]
+                    for product in records
+                }
+                if records is not None
+                else None
+            ),
+            cursor=data["cursor"],
+        )
 
     @retry_on_exception(CATCH, MAX_RETRIES)
     async def get_market(self) -> Market:
@@ -223,6 +489,32 @@ class APIClient:
         supply = {item["product_id"]: item["quantity"] for item in data}
         return Market(supply=supply)
 
+    async def subscribe_prices(self) -> AsyncGenerator[PriceTick, None]:
+        """Yields the new records of every price update pushed by the server, until
+        the connection is closed. Replaces polling the records of every product."""
+        async with self.client.stream(
+            "GET", "/stream", timeout=httpx.Timeout(None, connect=5.0)
+        ) as response:
+            response.raise_for_status()
+            data: list[str] = []
+            async for line in response.aiter_lines():
+                if line.startswith("data:"):
+                    data.append(line[len("data:") :].strip())
+                elif not line and data:  # an empty line ends the event
+                    tick: TickResponse = json.loads("\n".join(data))
+                    data = []
+                    yield PriceTick(
+                        sequence=tick["sequence"],
+                        records={
+                            record["product_id"]: PriceRecord(
+                                date=datetime.fromisoformat(record["date"]),
+                                value=record["value"],
+                                cursor=record["cursor"],
+                            )
+                            for record in tick["records"]
+                        },
+                    )
+
     async def buy_product(self, product_id: int, amount: int):
         response = await self.client.post(
             f"/product/{product_id}/buy", json={"amount": amount}
@@ -244,3 +536,43 @@ class APIClient:
         elif response.status_code == 401:
             raise InvalidToken(response.json()["message"])
         response.raise_for_status()
+
+    async def submit_orders(self, orders: Iterable[Order]) -> OrderResult:
+        """Executes all buy and sell orders at once, either all of them succeed or
+        none does."""
+        response = await self.client.post(
+            "/orders/batch",
+            json={
+                "orders": [
+                    {
+                        "product_id": order.product_id,
+                        "side": order.side,
+                        "amount": order.amount,
+                    }
+                    for order in orders
+                ]
+            },
+        )
+
+        if response.status_code == 400:
+            raise TransactionFailed(response.json()["message"])
+        elif response.status_code == 401:
+            raise InvalidToken(response.json()["message"])
+        elif response.status_code == 404:
+            raise ProductNotFound(response.json()["message"])
+        response.raise_for_status()
+
+        data: OrderBatchResponse = response.json()
+        return OrderResult(
+            fills=[
+                Fill(
+                    product_id=fill["product_id"],
+                    side=fill["side"],
+                    amount=fill["amount"],
+                    price=fill["price"],
+                    total=fill["total"],
+                )
+                for fill in data["fills"]
+            ],
+            balance=data["balance"],
+        )
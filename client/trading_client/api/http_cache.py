@@ -0,0 +1,83 @@
+import json
+import logging
+import os
+from dataclasses import dataclass
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+def default_cache_path() -> Path:
+    """Location of the cache file, inside $XDG_CACHE_HOME or ~/.cache"""
+    cache_home = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(cache_home) / "trading_client" / "http_cache.json"
+
+
+@dataclass
+class CachedEntry:
+    """ """
+
+    etag: str
+    body: bytes
+
+
+class ConditionalCache:
+    """JSON response bodies together with their ETags, kept in a file so the
+    client revalidates them with If-None-Match after a restart instead of
+    downloading them again.
+
+    Args:
+        path (Path | None): File the cache is persisted in, None to keep it in
+        memory only
+        max_entries (int): Number of responses kept, the least recently stored
+        ones are dropped first
+    """
+
+    def __init__(self, path: Path | None, max_entries: int = 256) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self._entries: dict[str, CachedEntry] = {}
+        self._load()
+
+    def get(self, url: str) -> CachedEntry | None:
+        return self._entries.get(url)
+
+    def store(self, url: str, etag: str, body: bytes) -> None:
+        """Stores the response of url and persists the cache"""
+        entry = self._entries.pop(url, None)
+        if entry is not None and entry.etag == etag:
+            self._entries[url] = entry
+            return
+        self._entries[url] = CachedEntry(etag, body)
+        while len(self._entries) > self.max_entries:
+            del self._entries[next(iter(self._entries))]
+        self._save()
+
+    def _load(self) -> None:
+        if self.path is None or not self.path.exists():
+            return
+        try:
+            data = json.loads(self.path.read_text())
+            self._entries = {
+                url: CachedEntry(entry["etag"], entry["body"].encode())
+                for url, entry in data.items()
+            }
+        except (OSError, ValueError, KeyError, AttributeError) as e:
+            # a broken cache only costs a download
+            logger.warning(f"Ignoring unreadable response cache {self.path}: {e}")
+
+    def _save(self) -> None:
+        if self.path is None:
+            return
+        data = {
+            url: {"etag": entry.etag, "body": entry.body.decode()}
+            for url, entry in self._entries.items()
+        }
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # replaced atomically, so a crash never leaves half a file behind
+            temporary = self.path.with_suffix(".tmp")
+            temporary.write_text(json.dumps(data))
+            temporary.replace(self.path)
+        except OSError as e:
+            logger.warning(f"Could not persist response cache {self.path}: {e}")
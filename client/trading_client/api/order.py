@@ -0,0 +1,32 @@
+from dataclasses import dataclass
+from typing import Literal
+
+Side = Literal["buy", "sell"]
+
+
+@dataclass
+class Order:
+    """ """
+
+    product_id: int
+    side: Side
+    amount: int
+
+
+@dataclass
+class Fill:
+    """ """
+
+    product_id: int
+    side: Side
+    amount: int
+    price: int
+    total: int
+
+
+@dataclass
+class OrderResult:
+    """ """
+
+    fills: list[Fill]
+    balance: int
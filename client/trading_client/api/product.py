@@ -1,5 +1,7 @@
-from dataclasses import dataclass
+from array import array
+from dataclasses import dataclass, field
 from datetime import datetime
+from typing import Iterable
 
 
 @dataclass
@@ -16,3 +18,73 @@ class PriceRecord:
 
     date: datetime
     value: int
+    cursor: int = 0
+
+
+@dataclass
+class Candle:
+    """ """
+
+    start: datetime
+    open: int
+    high: int
+    low: int
+    close: int
+    count: int
+
+
+@dataclass
+class PriceTick:
+    """ """
+
+    sequence: int
+    records: dict[int, PriceRecord]
+
+
+@dataclass
+class RecordArrays:
+    """The records of a product as parallel arrays, decoded without creating an
+    object per record. Timestamps are milliseconds since the unix epoch."""
+
+    product_id: int
+    timestamps: array = field(default_factory=lambda: array("q"))
+    prices: array = field(default_factory=lambda: array("i"))
+    cursors: array = field(default_factory=lambda: array("q"))
+
+    def __len__(self) -> int:
+        return len(self.prices)
+
+    @classmethod
+    def from_records(
+        cls, product_id: int, records: Iterable[PriceRecord]
+    ) -> "RecordArrays":
+        """Collects records, e.g. the ones of the stream, into arrays"""
+        arrays = cls(product_id)
+        for record in records:
+            arrays.timestamps.append(int(record.date.timestamp() * 1000))
+            arrays.prices.append(record.value)
+            arrays.cursors.append(record.cursor)
+        return arrays
+
+    def extend(self, other: "RecordArrays", start: int = 0) -> None:
+        """Appends the records of other from index start on"""
+        self.timestamps.extend(other.timestamps[start:])
+        self.prices.extend(other.prices[start:])
+        self.cursors.extend(other.cursors[start:])
+
+    def keep_last(self, length: int) -> None:
+        """Drops the oldest records until at most length are left"""
+        excess = len(self) - length
+        if excess > 0:
+            del self.timestamps[:excess]
+            del self.prices[:excess]
+            del self.cursors[:excess]
+
+    def to_records(self) -> list[PriceRecord]:
+        """Converts the arrays to records with local naive dates"""
+        return [
+            PriceRecord(datetime.fromtimestamp(timestamp / 1000), price, cursor)
+            for timestamp, price, cursor in zip(
+                self.timestamps, self.prices, self.cursors
+            )
+        ]
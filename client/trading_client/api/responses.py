@@ -1,4 +1,4 @@
-from typing import TypedDict
+from typing import Literal, TypedDict
 
 
 class InventoryItemResponse(TypedDict):
@@ -29,6 +29,7 @@ class PriceRecordListEntryResponse(TypedDict):
 
     date: str
     value: int
+    cursor: int
 
 
 class PriceRecordResponse(TypedDict):
@@ -38,6 +39,26 @@ class PriceRecordResponse(TypedDict):
     records: list[PriceRecordListEntryResponse]
     date: str
     value: int
+    cursor: int
+
+
+class CandleResponse(TypedDict):
+    """ """
+
+    start: str
+    open: int
+    high: int
+    low: int
+    close: int
+    count: int
+
+
+class ProductCandlesResponse(TypedDict):
+    """ """
+
+    product_id: int
+    interval: float
+    candles: list[CandleResponse]
 
 
 class MarketItemResponse(TypedDict):
@@ -45,3 +66,47 @@ class MarketItemResponse(TypedDict):
 
     product_id: int
     quantity: int
+
+
+class StreamRecordResponse(TypedDict):
+    """ """
+
+    product_id: int
+    date: str
+    value: int
+    cursor: int
+
+
+class TickResponse(TypedDict):
+    """ """
+
+    sequence: int
+    records: list[StreamRecordResponse]
+
+
+class SnapshotResponse(TypedDict):
+    """ """
+
+    user: UserResponse
+    products: list[ProductResponse]
+    market: list[MarketItemResponse]
+    prices: list[StreamRecordResponse]
+    records: list[PriceRecordResponse] | None
+    cursor: int
+
+
+class FillResponse(TypedDict):
+    """ """
+
+    product_id: int
+    side: Literal["buy", "sell"]
+    amount: int
+    price: int
+    total: int
+
+
+class OrderBatchResponse(TypedDict):
+    """ """
+
+    fills: list[FillResponse]
+    balance: int
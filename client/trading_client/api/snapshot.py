@@ -0,0 +1,17 @@
+from dataclasses import dataclass
+
+from .market import Market
+from .product import Product, PriceRecord
+from .user import User
+
+
+@dataclass
+class Snapshot:
+    """ """
+
+    user: User
+    products: list[Product]
+    market: Market
+    prices: dict[int, PriceRecord]
+    records: dict[int, list[PriceRecord]] | None
+    cursor: int
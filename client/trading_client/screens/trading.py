@@ -1,4 +1,5 @@
 from asyncio import sleep
+from bisect import bisect_right
 from functools import partial
 from itertools import tee
 import random
@@ -23,7 +24,6 @@ from textual.color import Color
 from textual.geometry import Size
 from textual.events import Resize
 from textual.containers import VerticalScroll, Vertical, Grid, Horizontal, Container
-from textual.message import Message
 from textual.reactive import reactive, var
 from textual.screen import ModalScreen, Screen
 from textual.widgets import Button, Label, Static, TabbedContent, Footer, Input
@@ -31,7 +31,15 @@ from textual.worker import Worker, WorkerState
 from textual_plotext import PlotextPlot
 
 from trading_client.api.market import Supply
-from trading_client.api import Product, PriceRecord, User, Market, InventoryItem
+from trading_client.api import (
+    Product,
+    PriceRecord,
+    RecordArrays,
+    User,
+    Market,
+    InventoryItem,
+    Snapshot,
+)
 from trading_client.api.exceptions import (
     IncorrectCredentials,
     UserAlreadyExists,
@@ -57,6 +65,10 @@ class TradingScreen(AppType, Screen):
     ]
     current_time_window_index = var(2)
     time_window = var(timedelta(minutes=10), init=False)
+    # records are pushed by the server while the stream is up, only polled otherwise
+    streaming = var(False)
+    # cursor of the newest known record of any product, 0 before the first fetch
+    cursor = var(0)
 
     def compose(self) -> ComposeResult:
         """ """
@@ -66,21 +78,101 @@ class TradingScreen(AppType, Screen):
 
     def on_mount(self):
         self.updater = self.set_interval(1, self.update_childs, pause=True)
-
-    def on_market_widget_all_product_fetch_done(
-        self, message: "MarketWidget.AllProductFetchDone"
-    ):
+        # the history is fetched once, new records come from the stream
+        self.hydrate()
+
+    @work(exclusive=True, name="hydrate")
+    async def hydrate(self):
+        """Fills the screen with the products, the user, the market and the records
+        of the last hour from a single request, then starts the updates."""
+        snapshot = await self.app.api.get_snapshot(
+            records_since=datetime.now() - timedelta(hours=1)
+        )
+        await self.query_one(MarketWidget).show_products(
+            [
+                product
+                for product in snapshot.products
+                if product.product_id in snapshot.market.supply
+            ]
+        )
+        await self.apply_snapshot(snapshot)
+        for product in self.query(ProductWidget):
+            product.add_records((snapshot.records or {}).get(product.product_id, []))
+        self.cursor = max(self.cursor, snapshot.cursor)
+        self.stream_prices()
         self.updater.resume()
 
+    @work(exclusive=True, name="fetch_snapshot")
+    async def fetch_snapshot(self):
+        """Fetches the user and the market supply with a single request."""
+        await self.apply_snapshot(await self.app.api.get_snapshot())
+
+    async def apply_snapshot(self, snapshot: Snapshot):
+        self.query_one(MarketWidget).market = snapshot.market
+        user_info = self.query_one(UserInfoWidget)
+        user_info.user = snapshot.user
+        await user_info.update_user()
+
+    @work(exclusive=True, name="stream_prices")
+    async def stream_prices(self):
+        """Adds the records pushed by the server to the products, reconnecting if
+        the stream breaks."""
+        while True:
+            try:
+                synced = False
+                async for tick in self.app.api.subscribe_prices():
+                    if not synced:
+                        # records stored while the stream was not connected
+                        await self.load_records()
+                        synced = True
+                    self.streaming = True
+                    for product in self.query(ProductWidget):
+                        record = tick.records.get(product.product_id)
+                        if record is not None:
+                            product.add_records([record])
+                    self.cursor = max(
+                        [self.cursor, *(r.cursor for r in tick.records.values())]
+                    )
+            except Exception as e:
+                # any broken tick falls back to polling until reconnected
+                self.log.error(f"Price stream failed: {e}")
+            finally:
+                self.streaming = False
+            await sleep(5)
+
+    @work(exclusive=True, name="fetch_records")
+    async def fetch_records(self):
+        """Fetches the new records of all products with a single request."""
+        await self.load_records()
+
+    async def load_records(self):
+        """Adds the records stored after the cursor to the products, or the ones of
+        the last hour before the first fetch."""
+        products = {
+            product.product_id: product for product in self.query(ProductWidget)
+        }
+        if not products:
+            return
+        if self.cursor:
+            arrays = await self.app.api.get_record_arrays_batch(
+                products, after=self.cursor
+            )
+        else:
+            since = datetime.now() - timedelta(hours=1)
+            arrays = await self.app.api.get_record_arrays_batch(products, since=since)
+        for product_id, product_arrays in arrays.items():
+            if product_id in products and product_arrays:
+                products[product_id].add_arrays(product_arrays)
+            if product_arrays:
+                self.cursor = max(self.cursor, product_arrays.cursors[-1])
+
     async def update_childs(self):
         market = self.query_one(MarketWidget)
         products = market.query(ProductWidget)
-        inventory = self.query_one(UserInfoWidget)
 
-        market.fetch_market()
-        inventory.fetch_user()
-        for product in products:
-            product.fetch_new_records()
+        self.fetch_snapshot()
+        if not self.streaming:
+            self.fetch_records()
 
         for product in products:
             await product.update_product_label()
@@ -124,11 +216,6 @@ class UserInfoWidget(AppType, Static):
 
         yield InventoryWidget()
 
-    @work(exclusive=True)
-    async def fetch_user(self):
-        self.user = await self.app.api.get_user()
-        await self.update_user()
-
     async def update_user(self):
         logged_in_as_label = self.query_one("#logged-in-as-label", Label)
         logged_in_as_label.update(f"Logged in as: {self.user.user_name}")
@@ -193,49 +280,25 @@ class InventoryWidget(AppType, Static):
 class MarketWidget(AppType, Static):
     """ """
 
-    class AllProductFetchDone(Message):
-        pass
-
-    product_ids: reactive[list[int]] = reactive(
-        [], recompose=True, layout=True, init=False, always_update=True
-    )
+    products: var[list[Product]] = var([], init=False)
     market = var(Market({}), init=False)
-    all_product_fetch_done: var[bool] = var(False, init=False)
-    product_fetch_done: dict[int, bool] = {}
 
     def __init__(self):
         super().__init__()
-        self.product_fetch_done = {product_id: False for product_id in self.product_ids}
         self.old_height = self.size.height
 
     def compose(self) -> ComposeResult:
         """ """
         with VerticalScroll():
-            for product_id in self.product_ids:
-                yield ProductWidget(product_id)
+            for product in self.products:
+                yield ProductWidget(product)
 
-    async def on_mount(self):
-        self.product_ids = [
-            product.product_id for product in await self.app.api.get_products()
-        ]
+    async def show_products(self, products: list[Product]):
+        """Shows a widget per product, the products come with the snapshot so no
+        request is made per product."""
+        self.products = products
         await self.recompose()
 
-    def compute_all_product_fetch_done(self):
-        return all(self.product_fetch_done.values())
-
-    def watch_all_product_fetch_done(self, all_product_fetch_done: bool):
-        if all_product_fetch_done:
-            self.post_message(self.AllProductFetchDone())
-
-    def on_product_widget_fetch_product_finished(
-        self, message: "ProductWidget.FetchProductFinished"
-    ):
-        self.product_fetch_done[message.product_id] = True
-
-    @work(exclusive=True)
-    async def fetch_market(self):
-        self.market = await self.app.api.get_market()
-
     async def watch_market(self):
         for product_widget in self.query(ProductWidget):
             product_widget.in_stock = self.market.supply[product_widget.product_id]
@@ -246,7 +309,7 @@ class MarketWidget(AppType, Static):
             return
 
         space = new_resize.size.height
-        num_products = len(self.product_ids)
+        num_products = len(self.products)
         self.log(space)
 
         min_height = 15
@@ -309,16 +372,13 @@ class ProductWidget(AppType, Static):
     product: reactive[Product] = reactive(Product(-1, ""))
     in_stock: var[int] = var(0)
 
-    class FetchProductFinished(Message):
-        def __init__(self, product_id) -> None:
-            super().__init__()
-            self.product_id = product_id
-
-    def __init__(self, product_id: int):
+    def __init__(self, product: Product):
         super().__init__()
-        self.product_id = product_id
+        self.product_id = product.product_id
+        self.set_reactive(ProductWidget.product, product)
         self.color = random.choice(COOL_COLORS)
-        self.records = deque([], maxlen=self.MAX_RECORD_LENGTH)
+        # kept as arrays, the records are never turned into an object each
+        self.records = RecordArrays(product.product_id)
 
     def compose(self) -> ComposeResult:
         """ """
@@ -327,34 +387,21 @@ class ProductWidget(AppType, Static):
         yield TradeWidget()
 
     async def on_mount(self):
-        worker = self.fetch_product()  # Worker starten, kein await
-        await worker.wait()            # Auf Ergebnis warten
         self.styles.background = self.color.with_alpha(0.1)
         self.query_one("#product-name", Label).update(self.product.product_name)
         self.query_one("#product-name", Label).styles.background = self.color.darken(0.3)
 
-    @work
-    async def fetch_product(self):
-        self.log.info(f"Fetching product {self.product_id}")
-        self.product = await self.app.api.get_product(self.product_id)
-        self.post_message(self.FetchProductFinished(self.product_id))
-
-    @work(exclusive=True, name="fetch_new_records")
-    async def fetch_new_records(self):
-        """Fetches new records from the API and adds them to the plot."""
-        # if not self.parent.can_view(self):
-        #     return
+    def add_records(self, new_records: Iterable[PriceRecord]):
+        """Adds the records stored after the newest known one and replots."""
+        self.add_arrays(RecordArrays.from_records(self.product_id, new_records))
 
+    def add_arrays(self, new_arrays: RecordArrays):
+        """Adds the records stored after the newest known one and replots."""
+        start = 0
         if self.records:
-            newest_record_time = self.records[-1].date
-        else:
-            newest_record_time = datetime.now() - timedelta(hours=1)
-
-        new_records = (
-            await self.app.api.get_records(self.product_id, from_=newest_record_time)
-        )[1:]
-
-        self.records.extend(new_records)
+            start = bisect_right(new_arrays.cursors, self.records.cursors[-1])
+        self.records.extend(new_arrays, start)
+        self.records.keep_last(self.MAX_RECORD_LENGTH)
         price_chart = self.query_one(PriceChart)
         price_chart.records = self.records
         price_chart.replot()
@@ -365,7 +412,7 @@ class ProductWidget(AppType, Static):
         text.append(self.product.product_name)
         text.append(f"{self.in_stock} in stock")
         if self.records:
-            text.append(f"${self.records[-1].value}")
+            text.append(f"${self.records.prices[-1]}")
         label.update(" - ".join(text))
 
 
@@ -390,7 +437,7 @@ class PriceChart(AppType, PlotextPlot):
     time_window = var(timedelta(minutes=1), init=False)
     marker: var[str] = var("braille")
 
-    records: deque[PriceRecord] | None = None
+    records: RecordArrays | None = None
 
     async def on_mount(self):
         self.time_window = self.screen.time_window
@@ -411,24 +458,21 @@ class PriceChart(AppType, PlotextPlot):
             self.log.info("No records to plot")
             return
 
-        # filter records that are older than the cutoff_time
-        now = datetime.now()
-        cutoff_time = now - self.time_window
+        # skip records that are older than the cutoff time, timestamps are in ms
+        now = datetime.now().timestamp() * 1000
+        cutoff_time = now - self.time_window.total_seconds() * 1000
+        start = bisect_right(self.records.timestamps, cutoff_time)
 
         # only plot the desired records
-        filtered_records = [
-            record for record in self.records if record.date > cutoff_time
+        delta_seconds = [
+            (timestamp - now) / 1000 for timestamp in self.records.timestamps[start:]
         ]
-
-        deltas = [record.date - now for record in filtered_records]
-        prices = [record.value for record in filtered_records]
+        prices = self.records.prices[start:].tolist()
 
         # Plot the filtered records
-        if not prices or not deltas:
+        if not prices or not delta_seconds:
             return
 
-        delta_seconds = [delta.total_seconds() for delta in deltas]
-
         self.plt.plot(delta_seconds, prices, marker=self.marker, color=self.color.rgb)
         self.plt.hline(prices[-1], color=self.color.lighten(0.2).rgb)
 
@@ -437,11 +481,11 @@ class PriceChart(AppType, PlotextPlot):
         # Add one second because the actual time span is from the first record to the
         # last record is 59 seconds, but we want to calc with 1 minute (we include
         # the waiting time for the next record in the time span for accurate ticking)
-        total_time_span = deltas[-1] - deltas[0] + timedelta(seconds=1)
+        total_time_span = delta_seconds[-1] - delta_seconds[0] + 1
         num_xticks = 6
         xtick_intervals = total_time_span / (num_xticks - 1)
         xticks = [
-            float(int((deltas[-1] + (-i) * xtick_intervals).total_seconds()))
+            float(int(delta_seconds[-1] + (-i) * xtick_intervals))
             for i in range(num_xticks)
         ]
 
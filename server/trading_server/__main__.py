@@ -1,15 +1,22 @@
+import asyncio
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta, timezone
+from functools import partial
 from logging import getLogger
-from typing import Annotated
+from typing import Annotated, AsyncIterator
 
-from fastapi import Depends, FastAPI, Query
-from fastapi.responses import JSONResponse
+from fastapi import Depends, FastAPI, Query, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from pydantic import TypeAdapter
 
+import os
 import secrets
 
 from pathlib import Path
 
+from trading_server.catalog import CatalogCache
+from trading_server.encodings import RECORD_MEDIA_TYPES, encode, negotiate
 from trading_server.exception_handlers import (
     incorrect_password_handler,
     invalid_token_handler,
@@ -18,7 +25,9 @@ from trading_server.exception_handlers import (
     product_not_found_handler,
     account_already_exists_handler,
     not_in_inventory_handler,
+    executor_overloaded_handler,
 )
+from trading_server.executor import BlockingExecutor, ExecutorOverloaded
 from trading_server.models import (
     InventoryItemModel,
     ProductModel,
@@ -26,8 +35,32 @@ from trading_server.models import (
     UserModel,
     ProductRecordModel,
     ProductRecordsModel,
+    CandleModel,
+    ProductCandlesModel,
+    MetricsModel,
+    DurationBucketModel,
+    TickMetricsModel,
+    SnapshotModel,
+    StreamRecordModel,
+    FillModel,
+    OrderBatchModel,
 )
-from trading_server.payloads import AmountPayload
+from trading_server.response_cache import ResponseCache
+from trading_server.payloads import AmountPayload, OrderBatchPayload
+from trading_server.stream import PriceStream
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """Pushes the ticks of the market to the price stream while the server runs"""
+    price_stream_task = asyncio.create_task(
+        price_stream.run(market, timedelta(seconds=1))
+    )
+    try:
+        yield
+    finally:
+        price_stream_task.cancel()
+
 
 try:
     from trading_server.modules.market_logic import (  # type: ignore
@@ -41,7 +74,11 @@ try:
         User,
         Product,
         MarketPlace,
+        OverrunPolicy,
         Account,
+        PriceUpdate,
+        Order,
+        OrderSide,
         get_product,
         init_database,
         db_register_account,
@@ -51,7 +88,7 @@ try:
         db_get_user_by_token,
     )
 
-    app = FastAPI()
+    app = FastAPI(lifespan=lifespan)
 except ImportError as e:
     raise ImportError(
         "Could not import the shared object file. Please run the build script to \
@@ -63,7 +100,57 @@ logger = getLogger("uvicorn")
 # init_database("./stockmarket.db")
 # market = MarketPlace(60 * 60, False)
 init_database("stockmarket.db")
-market = MarketPlace(60 * 60, True)
+# a fixed seed replays the same prices, e.g. for benchmarks
+price_seed = os.environ.get("TRADING_SERVER_PRICE_SEED")
+market = MarketPlace(
+    60 * 60, True, price_seed=int(price_seed) if price_seed is not None else None
+)
+# large catalogs compute their prices on several threads
+market.price_shards = int(os.environ.get("TRADING_SERVER_PRICE_SHARDS", 1))
+market.tick_period = timedelta(
+    milliseconds=int(os.environ.get("TRADING_SERVER_TICK_MS", 1000))
+)
+# "skip" drops ticks that could not run in time, "catch_up" runs them late
+overrun_policy = os.environ.get("TRADING_SERVER_OVERRUN_POLICY", "skip")
+if overrun_policy.upper() not in OverrunPolicy.__members__:
+    raise ValueError(
+        f"Invalid TRADING_SERVER_OVERRUN_POLICY {overrun_policy!r}, expected one of "
+        + ", ".join(name.lower() for name in OverrunPolicy.__members__)
+    )
+market.overrun_policy = OverrunPolicy.__members__[overrun_policy.upper()]
+if "TRADING_SERVER_BACKFILL_HOURS" in os.environ:
+    # fast-forwards the market through simulated history, products that already
+    # have a history keep it
+    backfill_report = market.backfill(
+        timedelta(hours=float(os.environ["TRADING_SERVER_BACKFILL_HOURS"])),
+        market.tick_period,
+    )
+    logger.info(
+        f"Backfilled {backfill_report.ticks} ticks "
+        f"({backfill_report.prices_per_second:.0f} prices/s), "
+        f"stored {backfill_report.records} records "
+        f"({backfill_report.records_per_second:.0f} records/s)"
+    )
+
+# The market logic blocks while it waits for SQLite, so every call into it runs on
+# this bounded pool instead of the event loop
+executor = BlockingExecutor(
+    pool_size=int(
+        os.environ.get("TRADING_SERVER_POOL_SIZE", min(32, (os.cpu_count() or 1) + 4))
+    ),
+    queue_depth=int(os.environ.get("TRADING_SERVER_QUEUE_DEPTH", 64)),
+)
+
+# Every tick of the market is pushed to the clients subscribed to /stream
+price_stream = PriceStream(
+    buffer_size=int(os.environ.get("TRADING_SERVER_STREAM_BUFFER", 16))
+)
+
+catalog = CatalogCache(market, executor)
+
+response_cache = ResponseCache(
+    max_entries=int(os.environ.get("TRADING_SERVER_RESPONSE_CACHE", 1024))
+)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
@@ -77,7 +164,7 @@ async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]) -> Use
     Returns:
         User: User object representing the current user
     """
-    user = db_get_user_by_token(token)
+    user = await executor.run(db_get_user_by_token, token)
     return user
 
 
@@ -94,7 +181,7 @@ async def get_current_user_model(
     """
     inventory = [
         InventoryItemModel(product_id=entry.product.id, quantity=entry.amount)
-        for entry in user.get_inventory()
+        for entry in await executor.run(user.get_inventory)
     ]
     return UserModel(
         user_id=user.id,
@@ -113,27 +200,10 @@ async def get_market_product(product_id: int) -> Product:
     Returns:
         Product: Model representing the product
     """
-    product = get_product(product_id)
+    product = await executor.run(get_product, product_id)
     return product
 
 
-async def get_product_model(
-    product: Annotated[Product, Depends(get_market_product)]
-) -> ProductModel:
-    """Searches the database for the product
-
-    Args:
-        product_id (int): product_id to search for
-
-    Returns:
-        ProductModel: Model representing the product
-    """
-    return ProductModel(
-        product_id=product.id,
-        product_name=product.name,
-    )
-
-
 # Registering all exception handlers
 app.exception_handlers.update(
     {
@@ -144,6 +214,7 @@ app.exception_handlers.update(
         IncorrectPassword: incorrect_password_handler,
         NotInInventory: not_in_inventory_handler,
         AccountAlreadyExists: account_already_exists_handler,
+        ExecutorOverloaded: executor_overloaded_handler,
     }
 )
 
@@ -162,9 +233,9 @@ async def index_() -> dict[str, str]:
 )
 async def login_(form_data: Annotated[OAuth2PasswordRequestForm, Depends()]) -> Token:
     account = Account(form_data.username, form_data.password)
-    account_id = db_verify_credentials(account)
+    account_id = await executor.run(db_verify_credentials, account)
     token = secrets.token_hex(16)
-    db_add_token(account_id, token)
+    await executor.run(db_add_token, account_id, token)
     return Token(access_token=token)
 
 
@@ -179,11 +250,11 @@ async def register_(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()]
 ) -> Token:
     account = Account(form_data.username, form_data.password)
-    db_register_account(account, form_data.username)
+    await executor.run(db_register_account, account, form_data.username)
     # Login the user
-    account_id = db_verify_credentials(account)
+    account_id = await executor.run(db_verify_credentials, account)
     token = secrets.token_hex(16)
-    db_add_token(account_id, token)
+    await executor.run(db_add_token, account_id, token)
     return Token(access_token=token)
 
 
@@ -195,7 +266,7 @@ async def register_(
     """,
 )
 async def logout_(token: Annotated[str, Depends(oauth2_scheme)]) -> None:
-    db_remove_token(token)
+    await executor.run(db_remove_token, token)
 
 
 @app.get(
@@ -211,17 +282,20 @@ async def get_authenticated_user_(
     return current_user
 
 
+_NOT_MODIFIED = {304: {"description": "Not modified since the given ETag"}}
+
+
 @app.get(
     "/product/{product_id}",
-    responses={404: {"description": "Product not found"}},
+    response_model=ProductModel,
+    responses={404: {"description": "Product not found"}, **_NOT_MODIFIED},
     description="""
-    Get products information by its id.
+    Get products information by its id. The response carries an ETag, requests with
+    a matching If-None-Match header are answered with 304 Not Modified.
     """,
 )
-async def get_product_by_id_(
-    product: Annotated[ProductModel, Depends(get_product_model)]
-) -> ProductModel:
-    return product
+async def get_product_by_id_(request: Request, product_id: int) -> Response:
+    return catalog.respond(request, await catalog.product(product_id))
 
 
 def _utc_now() -> datetime:
@@ -234,76 +308,319 @@ def _10_minutess_ago() -> datetime:
     return datetime.now() - timedelta(minutes=10)
 
 
+def _local_naive(dt: datetime) -> datetime:
+    """Helper Function that converts a datetime to a naive datetime in local time"""
+    if dt.tzinfo is None:
+        return dt
+    return dt.astimezone().replace(tzinfo=None)
+
+
+_RECORD_RESPONSES: dict[int | str, dict] = {
+    200: {
+        "content": {
+            media_type: {"schema": {"type": "string", "description": description}}
+            for media_type, description in RECORD_MEDIA_TYPES.items()
+        }
+    }
+}
+
+
 @app.get(
     "/product/{product_id}/records",
-    responses={404: {"description": "Product not found"}},
+    response_model=ProductRecordsModel,
+    responses={404: {"description": "Product not found"}, **_RECORD_RESPONSES},
     description="""
-    Get all records of the specified product in the given time range.
+    Get all records of the specified product in the given time range. With `after`
+    only the records stored after that cursor are returned instead, which is the
+    exact delta to a previous response. Clients accepting one of the columnar media
+    types get the records as arrays instead of one object per record.
     """,
 )
 async def get_product_records_(
-    product: Annotated[Product, Depends(get_market_product)],
+    request: Request,
+    product_id: int,
     from_: Annotated[datetime, Query(alias="from", default_factory=_10_minutess_ago)],
     to_: Annotated[datetime, Query(alias="to", default_factory=_utc_now)],
-) -> ProductRecordsModel:
-    # Convert the datetime objects to naive UTC datetime objects for the database
-    # this should work if datetimes provided are aware
-    # if not maybe too?
+    after: Annotated[int | None, Query()] = None,
+) -> Response:
+    # The market logic interprets naive datetimes as local time and returns local
+    # naive datetimes, aware datetimes are converted before handing them over
     logger.info(from_)
     logger.info(to_)
 
-    records = product.get_records(from_, to_)
-
-    # AUS IRGENDEINEN GRUND MÜSSEN WIR HIER 1 STUNDE HINZUADDIEREN
-    # ZEITZONEN SIND EIN MIST
-    # Was passiert: Zeit wird hier als naive/aware objekt übergeben
-    # pybind strippt die timezone information und speichert es als naive
-    # c++ system_clock zieht aus irgendeinen grund 2 stunden ab und macht utc draus?
-    # so wirds auch in der Datenbank gespeichert
-    # wenn wir es aber wieder auslesen, kommt bei der konvertierung von c++ zu python
-    # eine stunde hinzu. Also fügen wir eine Stunde hinzu und tun so, als ob es keine
-    # Zeitzone gäbe, da Server und Client in der selben Zeitzone laufen werden.
+    media_type = negotiate(request.headers.get("accept"))
+    build = partial(_product_records_body, product_id, from_, to_, after, media_type)
+    if request.query_params.keys().isdisjoint({"from", "to", "after"}):
+        # the default window only changes with a tick, so every client polling it
+        # shares one serialized response per tick without even looking up the
+        # product again
+        body = await response_cache.get(
+            ("records", product_id, media_type), market.tick_sequence, build
+        )
+    else:
+        body = await build()
+    return Response(body, media_type=media_type or "application/json")
+
+
+async def _product_records_body(
+    product_id: int,
+    from_: datetime,
+    to_: datetime,
+    after: int | None,
+    media_type: str | None,
+) -> bytes:
+    """Helper Function that serializes the records of a product, columnar if a
+    compact media type was negotiated"""
+    product = await get_market_product(product_id)
+    if media_type is not None:
+
+        def encoded_records() -> bytes:
+            if after is not None:
+                batch = product.get_record_batch_after(after)
+            else:
+                batch = product.get_record_batch(_local_naive(from_), _local_naive(to_))
+            return encode(batch, media_type)
+
+        return await executor.run(encoded_records)
+
+    if after is not None:
+        records = await executor.run(product.get_records_after, after)
+    else:
+        records = await executor.run(
+            product.get_records, _local_naive(from_), _local_naive(to_)
+        )
+
     if records:
-        return ProductRecordsModel(
+        model = ProductRecordsModel(
             product_id=product.id,
             records=[
                 ProductRecordModel(
-                    date=record.date + timedelta(hours=1), value=record.value
+                    date=record.date, value=record.value, cursor=record.cursor
                 )
                 for record in records
             ],
-            start_date=records[0].date + timedelta(hours=1),
-            end_date=records[-1].date + timedelta(hours=1),
+            start_date=records[0].date,
+            end_date=records[-1].date,
+            cursor=records[-1].cursor,
         )
     else:
-        return ProductRecordsModel(
+        model = ProductRecordsModel(
             product_id=product.id,
             records=[],
             start_date=from_,
             end_date=to_,
+            cursor=after or 0,
+        )
+    return model.model_dump_json().encode()
+
+
+@app.get(
+    "/product/{product_id}/candles",
+    responses={404: {"description": "Product not found"}},
+    description="""
+    Get the records of the specified product in the given time range downsampled to
+    one open/high/low/close candle per `interval` seconds. Buckets start at multiples
+    of the interval, buckets without records are left out.
+    """,
+)
+async def get_product_candles_(
+    product: Annotated[Product, Depends(get_market_product)],
+    from_: Annotated[datetime, Query(alias="from", default_factory=_10_minutess_ago)],
+    to_: Annotated[datetime, Query(alias="to", default_factory=_utc_now)],
+    # candles are bucketed in whole milliseconds
+    interval: Annotated[float, Query(ge=0.001)] = 60,
+) -> ProductCandlesModel:
+    candles = await executor.run(
+        product.get_candles,
+        _local_naive(from_),
+        _local_naive(to_),
+        timedelta(seconds=interval),
+    )
+    return ProductCandlesModel(
+        product_id=product.id,
+        interval=interval,
+        candles=[
+            CandleModel(
+                start=candle.start,
+                open=candle.open,
+                high=candle.high,
+                low=candle.low,
+                close=candle.close,
+                count=candle.count,
+            )
+            for candle in candles
+        ],
+    )
+
+
+@app.get(
+    "/records",
+    responses=_RECORD_RESPONSES,
+    description="""
+    Get the records of many products that are newer than `since` in one request,
+    or with `after` the ones stored after that cursor. Cursors grow across all
+    products, so the newest cursor of a response fetches the next delta of every
+    product. Without `ids` the records of all products are returned. Clients
+    accepting one of the columnar media types get the records as arrays instead of
+    one object per record.
+    """,
+)
+async def get_records_(
+    request: Request,
+    since: Annotated[datetime, Query(default_factory=_10_minutess_ago)],
+    ids: Annotated[list[int] | None, Query()] = None,
+    after: Annotated[int | None, Query()] = None,
+) -> list[ProductRecordsModel]:
+    media_type = negotiate(request.headers.get("accept"))
+    if media_type is not None:
+
+        def encoded_records() -> bytes:
+            if after is not None:
+                batch = market.get_record_batch_after(ids or [], after)
+            else:
+                batch = market.get_record_batch(ids or [], _local_naive(since))
+            return encode(batch, media_type)
+
+        return Response(await executor.run(encoded_records), media_type=media_type)
+
+    if after is not None:
+        updates = await executor.run(market.get_records_after, ids or [], after)
+    else:
+        updates = await executor.run(
+            market.get_records, ids or [], _local_naive(since)
         )
 
+    return _group_records(updates, ids or [], since, after or 0)
 
-@app.get("/products")
-async def get_all_products_() -> list[ProductModel]:
+
+def _group_records(
+    updates: list[PriceUpdate], product_ids: list[int], since: datetime, cursor: int
+) -> list[ProductRecordsModel]:
+    """Helper Function that groups records ordered by product into one model per
+    product, products in `product_ids` are included even without records"""
+    # the updates are ordered by product, so every product is one run of updates
+    records: dict[int, list[ProductRecordModel]] = {
+        product_id: [] for product_id in product_ids
+    }
+    for update in updates:
+        records.setdefault(update.product_id, []).append(
+            ProductRecordModel(
+                date=update.record.date,
+                value=update.record.value,
+                cursor=update.record.cursor,
+            )
+        )
     return [
-        ProductModel(
-            product_id=product.id,
-            product_name=product.name,
+        ProductRecordsModel(
+            product_id=product_id,
+            records=product_records,
+            start_date=product_records[0].date if product_records else since,
+            end_date=product_records[-1].date if product_records else _utc_now(),
+            cursor=product_records[-1].cursor if product_records else cursor,
         )
-        for product in market.get_all_products()
+        for product_id, product_records in records.items()
     ]
 
 
-@app.get("/market")
-async def get_market_() -> list[InventoryItemModel]:
-    return [
-        InventoryItemModel(
-            product_id=entry.product.id,
-            quantity=entry.amount,
+@app.get(
+    "/products",
+    response_model=list[ProductModel],
+    responses=_NOT_MODIFIED,
+    description="""
+    Get all products of the market. The response carries an ETag, requests with a
+    matching If-None-Match header are answered with 304 Not Modified.
+    """,
+)
+async def get_all_products_(request: Request) -> Response:
+    return catalog.respond(request, await catalog.products())
+
+
+@app.get(
+    "/snapshot",
+    responses={401: {"description": "Invalid Token"}},
+    description="""
+    Get the user, the market supply and the latest price of every product in one
+    request, read from one consistent state of the database. With `records_since`
+    the records of all products newer than that time are included as well.
+    """,
+)
+async def get_snapshot_(
+    user: Annotated[User, Depends(get_current_user)],
+    records_since: Annotated[datetime | None, Query()] = None,
+) -> SnapshotModel:
+    snapshot = await executor.run(
+        market.get_snapshot,
+        user,
+        _local_naive(records_since) if records_since is not None else None,
+    )
+    prices = [
+        StreamRecordModel(
+            product_id=update.product_id,
+            date=update.record.date,
+            value=update.record.value,
+            cursor=update.record.cursor,
         )
-        for entry in market.get_inventory()
+        for update in snapshot.prices
     ]
+    cursor = max((price.cursor for price in prices), default=0)
+    return SnapshotModel(
+        user=UserModel(
+            user_id=snapshot.user.id,
+            user_name=snapshot.user.name,
+            balance=snapshot.user.balance,
+            inventory=[
+                InventoryItemModel(product_id=entry.product.id, quantity=entry.amount)
+                for entry in snapshot.inventory
+            ],
+        ),
+        products=[
+            ProductModel(product_id=entry.product.id, product_name=entry.product.name)
+            for entry in snapshot.market
+        ],
+        market=[
+            InventoryItemModel(product_id=entry.product.id, quantity=entry.amount)
+            for entry in snapshot.market
+        ],
+        prices=prices,
+        records=(
+            _group_records(
+                snapshot.records,
+                [entry.product.id for entry in snapshot.market],
+                records_since,
+                cursor,
+            )
+            if records_since is not None
+            else None
+        ),
+        cursor=cursor,
+    )
+
+
+_INVENTORY = TypeAdapter(list[InventoryItemModel])
+
+
+@app.get(
+    "/market",
+    response_model=list[InventoryItemModel],
+    description="""
+    Get the amount of every product offered by the market.
+    """,
+)
+async def get_market_() -> Response:
+    async def build() -> bytes:
+        return _INVENTORY.dump_json(
+            [
+                InventoryItemModel(
+                    product_id=entry.product.id,
+                    quantity=entry.amount,
+                )
+                for entry in await executor.run(market.get_inventory)
+            ]
+        )
+
+    # the supply only changes with trades, all clients share one response until then
+    body = await response_cache.get(("market",), market.inventory_version, build)
+    return Response(body, media_type="application/json")
 
 
 @app.post(
@@ -319,7 +636,7 @@ async def buy_product_(
     product: Annotated[Product, Depends(get_market_product)],
     payload: AmountPayload,
 ) -> None:
-    user.buy_product(product, payload.amount)
+    await executor.run(user.buy_product, product, payload.amount)
 
 
 @app.post(
@@ -335,7 +652,101 @@ async def sell_product_(
     product: Annotated[Product, Depends(get_market_product)],
     payload: AmountPayload,
 ) -> None:
-    user.sell_product(product, payload.amount)
+    await executor.run(user.sell_product, product, payload.amount)
+
+
+_ORDER_SIDES = {"buy": OrderSide.BUY, "sell": OrderSide.SELL}
+
+
+@app.post(
+    "/orders/batch",
+    responses={
+        401: {"description": "Invalid Token"},
+        400: {"description": "Transaction failed"},
+        404: {"description": "Product not found"},
+    },
+    description="""
+    Executes many buy and sell legs at once. All legs are priced from the same
+    prices and applied in one transaction, if any leg fails none is executed.
+    """,
+)
+async def execute_orders_(
+    user: Annotated[User, Depends(get_current_user)],
+    payload: OrderBatchPayload,
+) -> OrderBatchModel:
+    orders = [
+        Order(order.product_id, _ORDER_SIDES[order.side], order.amount)
+        for order in payload.orders
+    ]
+    fills = await executor.run(user.execute_orders, orders)
+    return OrderBatchModel(
+        fills=[
+            FillModel(
+                product_id=fill.product_id,
+                side=order.side,
+                amount=fill.amount,
+                price=fill.price,
+                total=fill.total,
+            )
+            for order, fill in zip(payload.orders, fills)
+        ],
+        balance=user.balance,
+    )
+
+
+@app.get(
+    "/stream",
+    response_class=StreamingResponse,
+    description="""
+    Server-Sent Events stream of the market prices. Every price update of the market
+    is pushed once as a `tick` event with the new record of each product. Clients that
+    can not keep up skip the oldest ticks, which shows as a gap in the sequence.
+    """,
+)
+async def stream_prices_() -> StreamingResponse:
+    return StreamingResponse(
+        price_stream.events(keepalive=15),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
+@app.get(
+    "/metrics",
+    description="""
+    Runtime metrics of the server, e.g. the usage of the market logic thread pool.
+    """,
+)
+async def get_metrics_() -> MetricsModel:
+    return MetricsModel(
+        executor=executor.metrics(),
+        stream=price_stream.metrics(),
+        responses=response_cache.metrics(),
+        ticks=_tick_metrics(),
+    )
+
+
+def _milliseconds(duration: timedelta) -> float:
+    return duration / timedelta(milliseconds=1)
+
+
+def _tick_metrics() -> TickMetricsModel:
+    stats = market.timer_stats
+    bounds: list[float | None] = [_milliseconds(b) for b in stats.bucket_bounds]
+    return TickMetricsModel(
+        period_ms=_milliseconds(market.tick_period),
+        overrun_policy=market.overrun_policy.name.lower(),
+        ticks=stats.ticks,
+        overruns=stats.overruns,
+        skipped=stats.skipped,
+        last_duration_ms=_milliseconds(market.last_tick_duration),
+        last_lag_ms=_milliseconds(stats.last_lag),
+        max_lag_ms=_milliseconds(stats.max_lag),
+        durations=[
+            DurationBucketModel(le_ms=bound, count=count)
+            for bound, count in zip(bounds + [None], stats.duration_histogram)
+        ],
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,90 @@
+import hashlib
+
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+
+from trading_server.executor import BlockingExecutor
+from trading_server.models import ProductModel
+from trading_server.modules.market_logic import MarketPlace, ProductNotFound
+
+_PRODUCTS = TypeAdapter(list[ProductModel])
+
+
+class CachedResponse:
+    """A serialized response body together with its strong ETag"""
+
+    def __init__(self, body: bytes) -> None:
+        self.body = body
+        self.etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+    def matches(self, if_none_match: str | None) -> bool:
+        """Checks if the If-None-Match header names the current body"""
+        if not if_none_match:
+            return False
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        # If-None-Match uses the weak comparison, so W/ prefixed tags match too
+        return "*" in tags or any(tag.removeprefix("W/") == self.etag for tag in tags)
+
+
+class CatalogCache:
+    """Serialized responses of the product catalog. Products only change when one
+    is added, which bumps the catalog version of the market, so the responses are
+    built once per version instead of once per request.
+
+    The ETags are hashes of the bodies, so they stay valid across restarts of the
+    server and clients keep revalidating cheaply after reconnecting.
+
+    Args:
+        market (MarketPlace): Market whose catalog is served
+        executor (BlockingExecutor): Pool the catalog is loaded on
+    """
+
+    CACHE_CONTROL = "no-cache"
+    """Clients may store the catalog but have to revalidate it before using it"""
+
+    def __init__(self, market: MarketPlace, executor: BlockingExecutor) -> None:
+        self.market = market
+        self.executor = executor
+        self._version = -1
+        self._products = CachedResponse(b"[]")
+        self._product: dict[int, CachedResponse] = {}
+
+    async def _refresh(self) -> None:
+        # the version is read before the catalog, a product added in between
+        # bumps it again and only causes another rebuild
+        version = self.market.catalog_version
+        if version == self._version:
+            return
+        products = [
+            ProductModel(product_id=product.id, product_name=product.name)
+            for product in await self.executor.run(self.market.get_all_products)
+        ]
+        self._products = CachedResponse(_PRODUCTS.dump_json(products))
+        self._product = {
+            product.product_id: CachedResponse(product.model_dump_json().encode())
+            for product in products
+        }
+        self._version = version
+
+    async def products(self) -> CachedResponse:
+        await self._refresh()
+        return self._products
+
+    async def product(self, product_id: int) -> CachedResponse:
+        """Gets the response of a single product
+
+        Raises:
+            ProductNotFound: If the catalog does not contain the product
+        """
+        await self._refresh()
+        if product_id not in self._product:
+            raise ProductNotFound(f"Product {product_id} not found")
+        return self._product[product_id]
+
+    @classmethod
+    def respond(cls, request: Request, cached: CachedResponse) -> Response:
+        """Answers with 304 Not Modified if the client already has the body"""
+        headers = {"ETag": cached.etag, "Cache-Control": cls.CACHE_CONTROL}
+        if cached.matches(request.headers.get("if-none-match")):
+            return Response(status_code=304, headers=headers)
+        return Response(cached.body, media_type="application/json", headers=headers)
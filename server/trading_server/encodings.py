@@ -0,0 +1,60 @@
+from trading_server.modules.market_logic import RecordBatch
+
+COLUMNAR_JSON = "application/vnd.trading.columns+json"
+"""Records as JSON arrays per product, see RecordBatch.to_json"""
+
+BINARY = "application/vnd.trading.columns"
+"""Records as little-endian arrays per product, see RecordBatch.to_binary"""
+
+RECORD_MEDIA_TYPES = {
+    COLUMNAR_JSON: "Records as one timestamp (ms), price and cursor array per product",
+    BINARY: """Little-endian: uint32 product count, per product int32 id and uint32
+    record count, then per product int64 timestamps (ms), int32 prices and int64
+    cursors""",
+}
+
+DEFAULT_TYPES = ("application/json", "application/*", "*/*")
+"""Accepted types that are answered with the default JSON model"""
+
+
+def negotiate(accept: str | None) -> str | None:
+    """Picks the compact encoding of records requested by the Accept header
+
+    Args:
+        accept (str | None): Value of the Accept header
+
+    Returns:
+        str | None: The media type to respond with, None for the default model
+    """
+    if not accept:
+        return None
+    # ranked by quality, then wildcards below exact types, then by position
+    best: tuple[float, bool] | None = None
+    best_media_type: str | None = None
+    for part in accept.split(","):
+        media_type, *params = (value.strip() for value in part.split(";"))
+        if media_type not in RECORD_MEDIA_TYPES and media_type not in DEFAULT_TYPES:
+            continue
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        rank = (quality, "*" not in media_type)
+        if quality > 0 and (best is None or rank > best):
+            best = rank
+            best_media_type = media_type
+    if best_media_type in RECORD_MEDIA_TYPES:
+        return best_media_type
+    return None
+
+
+def encode(batch: RecordBatch, media_type: str) -> bytes:
+    """Encodes the batch in the negotiated media type, without creating an object
+    per record"""
+    if media_type == BINARY:
+        return batch.to_binary()
+    return batch.to_json()
@@ -9,6 +9,7 @@ from trading_server.modules.market_logic import (
     NotInInventory,
     AccountAlreadyExists,
 )
+from trading_server.executor import ExecutorOverloaded
 
 
 async def account_already_exists_handler(request: Request, exc: AccountAlreadyExists):
@@ -59,3 +60,11 @@ async def invalid_token_handler(request: Request, exc: InvalidToken):
         content={"message": "Invalid token"},
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+
+async def executor_overloaded_handler(request: Request, exc: ExecutorOverloaded):
+    return JSONResponse(
+        status_code=503,
+        content={"message": "Server is busy, try again later"},
+        headers={"Retry-After": "1"},
+    )
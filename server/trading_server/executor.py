@@ -0,0 +1,97 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from typing import Callable, ParamSpec, TypeVar
+
+from trading_server.models import ExecutorMetricsModel
+
+P = ParamSpec("P")
+T = TypeVar("T")
+
+
+class ExecutorOverloaded(Exception):
+    """Raised when more calls are waiting for the pool than the queue allows."""
+
+
+class BlockingExecutor:
+    """Runs blocking calls into the market logic on a bounded thread pool, so the
+    event loop keeps serving other requests while SQLite works.
+
+    Args:
+        pool_size (int): Number of threads running calls concurrently
+        queue_depth (int): Number of calls that may wait for a free thread, further
+        calls are rejected with ExecutorOverloaded
+    """
+
+    def __init__(self, pool_size: int, queue_depth: int) -> None:
+        self.pool_size = pool_size
+        self.queue_depth = queue_depth
+        self._pool = ThreadPoolExecutor(
+            max_workers=pool_size, thread_name_prefix="market_logic"
+        )
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._running = 0
+        self._completed = 0
+        self._rejected = 0
+        self._total_wait = 0.0
+        self._total_run = 0.0
+
+    async def run(self, func: Callable[P, T], *args: P.args, **kwargs: P.kwargs) -> T:
+        """Runs func(*args, **kwargs) on the pool and waits for the result
+
+        Raises:
+            ExecutorOverloaded: If the queue is full
+        """
+        with self._lock:
+            if self._in_flight >= self.pool_size + self.queue_depth:
+                self._rejected += 1
+                raise ExecutorOverloaded(
+                    f"{self._in_flight} calls in flight, queue depth exceeded"
+                )
+            self._in_flight += 1
+
+        call = partial(self._timed, func, time.perf_counter(), *args, **kwargs)
+        future = self._pool.submit(call)
+        # a cancelled request does not stop the pool thread, so the call only
+        # leaves the flight once the pool is done with it
+        future.add_done_callback(self._finished)
+        return await asyncio.wrap_future(future)
+
+    def _finished(self, future: Future) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            if not future.cancelled():
+                self._completed += 1
+
+    def _timed(self, func: Callable[..., T], submitted: float, *args, **kwargs) -> T:
+        started = time.perf_counter()
+        with self._lock:
+            self._running += 1
+            self._total_wait += started - submitted
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._total_run += time.perf_counter() - started
+
+    def metrics(self) -> ExecutorMetricsModel:
+        """Snapshot of the pool usage"""
+        with self._lock:
+            completed = max(self._completed, 1)
+            return ExecutorMetricsModel(
+                pool_size=self.pool_size,
+                queue_depth=self.queue_depth,
+                running=self._running,
+                queued=self._in_flight - self._running,
+                completed=self._completed,
+                rejected=self._rejected,
+                average_wait_ms=1000 * self._total_wait / completed,
+                average_run_ms=1000 * self._total_run / completed,
+            )
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=True)
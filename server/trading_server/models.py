@@ -15,6 +15,7 @@ class ProductRecordModel(BaseModel):
 
     date: datetime = Field(examples=["2024-6-29T12:00:00", "2024-6-30T12:00:00"])
     value: int = Field(examples=[100, 200])
+    cursor: int = Field(examples=[1041, 1042])
 
 
 class ProductRecordsModel(BaseModel):
@@ -24,6 +25,30 @@ class ProductRecordsModel(BaseModel):
     records: list[ProductRecordModel]
     start_date: datetime = Field(examples=["2024-6-28T12:00:00", "2024-6-29T12:00:00"])
     end_date: datetime = Field(examples=["2024-6-29T12:00:00", "2024-6-30T12:00:00"])
+    cursor: int = Field(
+        examples=[1042],
+        description="Cursor of the newest record, pass it as `after` to only get "
+        "newer records",
+    )
+
+
+class CandleModel(BaseModel):
+    """Model that represents the prices of a product within one time bucket."""
+
+    start: datetime = Field(examples=["2024-6-29T12:00:00", "2024-6-29T12:01:00"])
+    open: int = Field(examples=[100, 104])
+    high: int = Field(examples=[110, 108])
+    low: int = Field(examples=[95, 101])
+    close: int = Field(examples=[104, 106])
+    count: int = Field(examples=[60, 60])
+
+
+class ProductCandlesModel(BaseModel):
+    """Model that represents the records of a product downsampled to candles."""
+
+    product_id: int = Field(examples=[1, 2])
+    interval: float = Field(examples=[60.0], description="Bucket length in seconds")
+    candles: list[CandleModel]
 
 
 class InventoryItemModel(BaseModel):
@@ -43,6 +68,23 @@ class UserModel(BaseModel):
     inventory: list[InventoryItemModel]
 
 
+class FillModel(BaseModel):
+    """Model that represents the execution of one leg of an order batch."""
+
+    product_id: int = Field(examples=[1, 2])
+    side: str = Field(examples=["buy", "sell"])
+    amount: int = Field(examples=[2, 1])
+    price: int = Field(examples=[100, 200], description="Price of a single product")
+    total: int = Field(examples=[200, 200], json_schema_extra={"format": "int64"})
+
+
+class OrderBatchModel(BaseModel):
+    """Model that represents the fills of an order batch in the order of its legs."""
+
+    fills: list[FillModel]
+    balance: int = Field(examples=[1000, 2000])
+
+
 class Token(BaseModel):
     """Model that represents a token used for authentication."""
 
@@ -52,3 +94,106 @@ class Token(BaseModel):
         ]
     )
     token_type: str = Field(default="bearer", examples=["bearer"])
+
+
+class ExecutorMetricsModel(BaseModel):
+    """Model that describes the usage of the thread pool running the market logic."""
+
+    pool_size: int = Field(examples=[8])
+    queue_depth: int = Field(examples=[64])
+    running: int = Field(examples=[3])
+    queued: int = Field(examples=[0])
+    completed: int = Field(examples=[1042])
+    rejected: int = Field(examples=[0])
+    average_wait_ms: float = Field(examples=[0.2])
+    average_run_ms: float = Field(examples=[1.5])
+
+
+class StreamRecordModel(BaseModel):
+    """Model that represents a new record of a product pushed by the price stream."""
+
+    product_id: int = Field(examples=[1, 2])
+    date: datetime = Field(examples=["2024-6-29T12:00:00", "2024-6-30T12:00:00"])
+    value: int = Field(examples=[100, 200])
+    cursor: int = Field(examples=[1041, 1042])
+
+
+class TickModel(BaseModel):
+    """Model that represents all records produced by one price update of the
+    market."""
+
+    sequence: int = Field(examples=[41, 42])
+    records: list[StreamRecordModel]
+
+
+class SnapshotModel(BaseModel):
+    """Model that represents everything the dashboard of a client shows, read from
+    one consistent state of the market."""
+
+    user: UserModel
+    products: list[ProductModel]
+    market: list[InventoryItemModel]
+    prices: list[StreamRecordModel] = Field(
+        description="Latest record of every product"
+    )
+    records: list[ProductRecordsModel] | None = Field(
+        default=None, description="Records newer than `records_since` if requested"
+    )
+    cursor: int = Field(
+        examples=[1042],
+        description="Cursor of the newest record, pass it as `after` to only get "
+        "newer records",
+    )
+
+
+class StreamMetricsModel(BaseModel):
+    """Model that describes the usage of the price stream."""
+
+    subscribers: int = Field(examples=[12])
+    sequence: int = Field(examples=[3600])
+    published: int = Field(examples=[3600])
+    dropped: int = Field(examples=[0])
+
+
+class ResponseCacheMetricsModel(BaseModel):
+    """Model that describes the usage of the shared response cache."""
+
+    entries: int = Field(examples=[12])
+    hits: int = Field(examples=[36000])
+    builds: int = Field(examples=[3600])
+
+
+class DurationBucketModel(BaseModel):
+    """Model that represents one bucket of a duration histogram."""
+
+    le_ms: float | None = Field(
+        examples=[1.0, None], description="Upper bound, None for the last bucket"
+    )
+    count: int = Field(examples=[3600])
+
+
+class TickMetricsModel(BaseModel):
+    """Model that describes the timing of the price updates of the market."""
+
+    period_ms: float = Field(examples=[1000.0])
+    overrun_policy: str = Field(examples=["skip", "catch_up"])
+    ticks: int = Field(examples=[3600])
+    overruns: int = Field(
+        examples=[0], description="Ticks that ended after the next deadline"
+    )
+    skipped: int = Field(examples=[0], description="Deadlines dropped by skip")
+    last_duration_ms: float = Field(examples=[1.5])
+    last_lag_ms: float = Field(
+        examples=[0.1], description="How late the last tick started"
+    )
+    max_lag_ms: float = Field(examples=[2.3])
+    durations: list[DurationBucketModel]
+
+
+class MetricsModel(BaseModel):
+    """Model that collects runtime metrics of the server."""
+
+    executor: ExecutorMetricsModel
+    stream: StreamMetricsModel
+    responses: ResponseCacheMetricsModel
+    ticks: TickMetricsModel
@@ -1,4 +1,7 @@
-from datetime import datetime
+import numpy as np
+import numpy.typing as npt
+from datetime import datetime, timedelta
+from enum import Enum
 
 class InvalidToken(Exception): ...
 class IncorrectPassword(Exception): ...
@@ -13,15 +16,77 @@ class ProductNotFound(Exception): ...
 class Record:
     date: datetime
     value: int
+    cursor: int
 
     def __init__(self, date: datetime, value: int) -> None: ...
 
+class RecordColumns:
+    product_id: int
+    timestamps: npt.NDArray[np.int64]
+    """milliseconds since the unix epoch (UTC)"""
+    prices: npt.NDArray[np.int32]
+    cursors: npt.NDArray[np.int64]
+
+    def __len__(self) -> int: ...
+
+class RecordBatch:
+    def __len__(self) -> int: ...
+    def to_json(self) -> bytes: ...
+    def to_binary(self) -> bytes: ...
+
+class Candle:
+    start: datetime
+    open: int
+    high: int
+    low: int
+    close: int
+    count: int
+
+class PriceUpdate:
+    product_id: int
+    record: Record
+
+class Tick:
+    sequence: int
+    updates: list[PriceUpdate]
+
+class OverrunPolicy(Enum):
+    SKIP = ...
+    CATCH_UP = ...
+
+class TimerStats:
+    ticks: int
+    overruns: int
+    skipped: int
+    last_lag: timedelta
+    max_lag: timedelta
+    bucket_bounds: list[timedelta]
+    duration_histogram: list[int]
+
+class BackfillReport:
+    ticks: int
+    prices: int
+    records: int
+    simulation_time: timedelta
+    persist_time: timedelta
+    prices_per_second: float
+    records_per_second: float
+
 class Product:
     name: str
     id: int
+    current_price: int
 
     def get_all_records(self) -> list[Record]: ...
     def get_records(self, from_: datetime, to: datetime) -> list[Record]: ...
+    def get_records_after(self, cursor: int) -> list[Record]: ...
+    def get_candles(
+        self, from_: datetime, to: datetime, interval: timedelta
+    ) -> list[Candle]: ...
+    def get_record_batch(self, from_: datetime, to: datetime) -> RecordBatch: ...
+    def get_record_batch_after(self, cursor: int) -> RecordBatch: ...
+    def get_record_columns(self, from_: datetime, to: datetime) -> RecordColumns: ...
+    def get_record_columns_after(self, cursor: int) -> RecordColumns: ...
 
 class ProductEntry:
     product: Product
@@ -29,6 +94,24 @@ class ProductEntry:
 
     def __init__(self, product: Product, amount: int) -> None: ...
 
+class OrderSide(Enum):
+    BUY = ...
+    SELL = ...
+
+class Order:
+    product_id: int
+    side: OrderSide
+    amount: int
+
+    def __init__(self, product_id: int, side: OrderSide, amount: int) -> None: ...
+
+class Fill:
+    product_id: int
+    side: OrderSide
+    amount: int
+    price: int
+    total: int
+
 class User:
     id: int
     name: str
@@ -37,17 +120,64 @@ class User:
     def get_inventory(self) -> list[ProductEntry]: ...
     def buy_product(self, product: Product, amount: int) -> None: ...
     def sell_product(self, product: Product, amount: int) -> None: ...
+    def execute_orders(self, orders: list[Order]) -> list[Fill]: ...
+
+class Snapshot:
+    user: User
+    inventory: list[ProductEntry]
+    market: list[ProductEntry]
+    prices: list[PriceUpdate]
+    records: list[PriceUpdate]
 
 class MarketPlace:
+    catalog_version: int
+    inventory_version: int
+    tick_sequence: int
+    last_tick_duration: timedelta
+    tick_period: timedelta
+    overrun_policy: OverrunPolicy
+    timer_stats: TimerStats
+    price_shards: int
+
     def __init__(
-        self, limit_record_entries: int, try_generate_products: bool
+        self,
+        limit_record_entries: int,
+        try_generate_products: bool,
+        price_seed: int | None = None,
     ) -> None: ...
     def get_inventory(self) -> list[ProductEntry]: ...
     def get_all_products(self) -> list[Product]: ...
+    def get_records(
+        self, product_ids: list[int], since: datetime
+    ) -> list[PriceUpdate]: ...
+    def get_records_after(
+        self, product_ids: list[int], cursor: int
+    ) -> list[PriceUpdate]: ...
+    def get_snapshot(
+        self, user: User, records_since: datetime | None = None
+    ) -> Snapshot: ...
+    def get_record_batch(
+        self, product_ids: list[int], since: datetime
+    ) -> RecordBatch: ...
+    def get_record_batch_after(
+        self, product_ids: list[int], cursor: int
+    ) -> RecordBatch: ...
+    def get_record_columns(
+        self, product_ids: list[int], since: datetime
+    ) -> list[RecordColumns]: ...
+    def get_record_columns_after(
+        self, product_ids: list[int], cursor: int
+    ) -> list[RecordColumns]: ...
+    def wait_for_tick(self, after: int, timeout: timedelta) -> Tick | None: ...
+    def seed_prices(self, seed: int) -> None: ...
+    def backfill(
+        self, history: timedelta, period: timedelta, batch_size: int = 100000
+    ) -> BackfillReport: ...
 
 def get_product(product_id: int) -> Product: ...
 def get_user(user_id: int) -> User: ...
-def init_database(path: str) -> None: ...
+def init_database(path: str, readers: int = -1) -> None: ...
+def db_reader_count() -> int: ...
 
 # AUTH LOGIC
 
@@ -62,3 +192,18 @@ def db_register_account(account: Account, display_name: str) -> str: ...
 def db_add_token(account_id: int, token: str) -> None: ...
 def db_remove_token(token: str) -> None: ...
 def db_get_user_by_token(token: str) -> User: ...
+
+class StatementCacheStats:
+    hits: int
+    misses: int
+
+def db_statement_cache_stats() -> StatementCacheStats: ...
+def db_reset_statement_cache_stats() -> None: ...
+
+class SessionCacheStats:
+    hits: int
+    misses: int
+    size: int
+
+def configure_session_cache(ttl: timedelta, capacity: int) -> None: ...
+def session_cache_stats() -> SessionCacheStats: ...
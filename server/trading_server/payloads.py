@@ -1,7 +1,20 @@
 from datetime import datetime, timedelta
 
+from typing import Literal
+
 from pydantic import BaseModel, Field
 
 
 class AmountPayload(BaseModel):
     amount: int = Field(default=1, ge=1, examples=[1, 2, 3])
+
+
+class OrderPayload(BaseModel):
+    product_id: int = Field(examples=[1, 2])
+    side: Literal["buy", "sell"] = Field(examples=["buy", "sell"])
+    # bounded by the 32 bit amount of the market logic
+    amount: int = Field(default=1, ge=1, le=2**31 - 1, examples=[1, 2, 3])
+
+
+class OrderBatchPayload(BaseModel):
+    orders: list[OrderPayload] = Field(min_length=1, max_length=100)
@@ -0,0 +1,84 @@
+import asyncio
+from typing import Awaitable, Callable, Hashable
+
+from trading_server.models import ResponseCacheMetricsModel
+
+
+class ResponseCache:
+    """Serialized response bodies shared by all clients. Every entry belongs to a
+    generation, e.g. the tick sequence of the market, and is rebuilt once the
+    generation moved on. Concurrent requests for a missing entry wait for a single
+    build, so the work per generation does not grow with the number of clients.
+
+    Args:
+        max_entries (int): Number of entries kept, the least recently built ones are
+        dropped first
+    """
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._entries: dict[Hashable, tuple[Hashable, bytes]] = {}
+        self._building: dict[tuple[Hashable, Hashable], asyncio.Future[bytes]] = {}
+        self._hits = 0
+        self._builds = 0
+
+    async def get(
+        self,
+        key: Hashable,
+        generation: Hashable,
+        build: Callable[[], Awaitable[bytes]],
+    ) -> bytes:
+        """Gets the body of key for the given generation, building it if needed
+
+        Args:
+            key (Hashable): Endpoint and parameters of the response
+            generation (Hashable): State the body is built from, read before calling
+            so a body is never older than its generation
+            build (Callable[[], Awaitable[bytes]]): Builds the serialized body
+        """
+        while True:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == generation:
+                self._hits += 1
+                return entry[1]
+            pending = self._building.get((key, generation))
+            if pending is None:
+                break
+            try:
+                body = await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+                continue  # the request building it went away, build it here
+            self._hits += 1
+            return body
+
+        self._builds += 1
+        future: asyncio.Future[bytes] = asyncio.get_running_loop().create_future()
+        self._building[(key, generation)] = future
+        try:
+            body = await build()
+            future.set_result(body)
+        except Exception as e:
+            future.set_exception(e)
+            # raised again in every waiting request, nobody has to retrieve it
+            future.exception()
+            raise
+        finally:
+            del self._building[(key, generation)]
+            if not future.done():
+                future.cancel()
+
+        self._entries.pop(key, None)
+        self._entries[key] = (generation, body)
+        while len(self._entries) > self.max_entries:
+            del self._entries[next(iter(self._entries))]
+        return body
+
+    def metrics(self) -> ResponseCacheMetricsModel:
+        """Snapshot of the cache usage"""
+        return ResponseCacheMetricsModel(
+            entries=len(self._entries),
+            hits=self._hits,
+            builds=self._builds,
+        )
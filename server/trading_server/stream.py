@@ -0,0 +1,105 @@
+import asyncio
+from datetime import timedelta
+from typing import AsyncIterator
+
+from trading_server.models import (
+    StreamMetricsModel,
+    StreamRecordModel,
+    TickModel,
+)
+from trading_server.modules.market_logic import MarketPlace, Tick
+
+
+def encode_tick(tick: Tick) -> bytes:
+    """Serializes a tick as a Server-Sent Event"""
+    model = TickModel(
+        sequence=tick.sequence,
+        records=[
+            StreamRecordModel(
+                product_id=update.product_id,
+                date=update.record.date,
+                value=update.record.value,
+                cursor=update.record.cursor,
+            )
+            for update in tick.updates
+        ],
+    )
+    return (
+        f"id: {tick.sequence}\nevent: tick\ndata: {model.model_dump_json()}\n\n"
+    ).encode()
+
+
+class PriceStream:
+    """Fans the ticks of the market out to all connected clients as Server-Sent
+    Events. Every tick is serialized once and put into the bounded queue of each
+    subscriber, a subscriber that can not keep up loses its oldest events instead of
+    slowing down the others. The sequence of the ticks lets clients notice the gap.
+
+    Args:
+        buffer_size (int): Number of events buffered per subscriber
+    """
+
+    def __init__(self, buffer_size: int) -> None:
+        self.buffer_size = buffer_size
+        self._subscribers: set[asyncio.Queue[bytes]] = set()
+        self._sequence = 0
+        self._published = 0
+        self._dropped = 0
+
+    def subscribe(self) -> "asyncio.Queue[bytes]":
+        """Registers a new subscriber, its queue receives all following events"""
+        queue: asyncio.Queue[bytes] = asyncio.Queue(maxsize=self.buffer_size)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: "asyncio.Queue[bytes]") -> None:
+        self._subscribers.discard(queue)
+
+    def publish(self, event: bytes) -> None:
+        """Puts the event into the queue of every subscriber, dropping the oldest
+        event of full queues"""
+        self._published += 1
+        for queue in self._subscribers:
+            if queue.full():
+                queue.get_nowait()
+                self._dropped += 1
+            queue.put_nowait(event)
+
+    async def events(self, keepalive: float) -> AsyncIterator[bytes]:
+        """Yields the events of a new subscriber until the client disconnects
+
+        Args:
+            keepalive (float): Seconds without events after which a comment is sent,
+            so proxies do not close the idle connection
+        """
+        queue = self.subscribe()
+        try:
+            while True:
+                try:
+                    yield await asyncio.wait_for(queue.get(), keepalive)
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"
+        finally:
+            self.unsubscribe(queue)
+
+    async def run(self, market: MarketPlace, poll_timeout: timedelta) -> None:
+        """Publishes every tick of the market until cancelled. Waiting for a tick
+        blocks, so it runs in a thread of its own instead of the market logic pool.
+        """
+        while True:
+            tick = await asyncio.to_thread(
+                market.wait_for_tick, self._sequence, poll_timeout
+            )
+            if tick is None:
+                continue
+            self._sequence = tick.sequence
+            self.publish(encode_tick(tick))
+
+    def metrics(self) -> StreamMetricsModel:
+        """Snapshot of the stream usage"""
+        return StreamMetricsModel(
+            subscribers=len(self._subscribers),
+            sequence=self._sequence,
+            published=self._published,
+            dropped=self._dropped,
+        )
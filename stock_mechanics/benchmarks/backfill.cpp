@@ -0,0 +1,36 @@
+// Fills a database with simulated price history and reports how fast the
+// prices are simulated and stored.
+//
+// usage: benchmarkBackfill [database] [products] [hours] [period ms] [limit]
+#include <chrono>
+#include <db_connector.hpp>
+#include <iostream>
+#include <market_place.hpp>
+#include <string>
+
+namespace sm = ProjectStockMarket;
+
+int main(int argc, char* argv[]) {
+  std::string path = argc > 1 ? argv[1] : ":memory:";
+  int products = argc > 2 ? std::stoi(argv[2]) : 1000;
+  int hours = argc > 3 ? std::stoi(argv[3]) : 48;
+  int period_ms = argc > 4 ? std::stoi(argv[4]) : 1000;
+  int limit = argc > 5 ? std::stoi(argv[5]) : 3600;
+
+  sm::DBConnector::initDB(path);
+  sm::MarketPlace mp(limit, false, 42);
+  sm::time_point now = std::chrono::system_clock::now();
+  for (int i = mp.getAllProducts().size(); i < products; i++) {
+    mp.addProduct("Product " + std::to_string(i), 100)
+        .addRecord(sm::Record(now, 100));
+  }
+
+  sm::BackfillReport report = mp.backfill(std::chrono::hours(hours),
+                                          std::chrono::milliseconds(period_ms));
+  std::cout << "simulated " << report.ticks << " ticks, " << report.prices
+            << " prices in " << report.simulationTime.count() / 1000 << " ms ("
+            << report.pricesPerSecond() << " prices/s)" << std::endl;
+  std::cout << "stored " << report.records << " records in "
+            << report.persistTime.count() / 1000 << " ms ("
+            << report.recordsPerSecond() << " records/s)" << std::endl;
+}
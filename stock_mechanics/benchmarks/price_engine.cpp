@@ -0,0 +1,57 @@
+// Compares the cost of advancing the prices of many products with a generator
+// per product and draw against one seeded engine for all of them.
+#include <chrono>
+#include <cmath>
+#include <cstdlib>
+#include <iostream>
+#include <price_engine.hpp>
+#include <random>
+#include <vector>
+
+namespace sm = ProjectStockMarket;
+
+// the random walk the market used before the engine, one generator per call
+int perCallWalk(int current_price) {
+  std::uniform_real_distribution<> shock{-0.05, 0.04};
+  std::uniform_real_distribution<> offset{2, 4};
+  double trend = 0.3 * (2.0 * ((double)std::rand() / RAND_MAX) - 1.0);
+  std::mt19937 generator(std::random_device{}());
+  double y = shock(generator);
+  return current_price * (1 + trend + 0.8 * y) + offset(generator);
+}
+
+int main() {
+  const int products = 10000;
+  const int ticks = 20;
+  std::vector<int> ids(products);
+  std::vector<int> prices(products, 100);
+  for (int i = 0; i < products; i++) {
+    ids[i] = i + 1;
+  }
+  sm::time_point now = std::chrono::system_clock::now();
+
+  auto start = std::chrono::steady_clock::now();
+  for (int tick = 0; tick < ticks; tick++) {
+    for (int& price : prices) {
+      price = perCallWalk(price);
+    }
+  }
+  std::chrono::duration<double, std::nano> per_call =
+      std::chrono::steady_clock::now() - start;
+
+  sm::PriceEngine engine(42);
+  engine.setPrices(ids, std::vector<int>(products, 100));
+  start = std::chrono::steady_clock::now();
+  for (int tick = 0; tick < ticks; tick++) {
+    engine.step(now);
+  }
+  std::chrono::duration<double, std::nano> batched =
+      std::chrono::steady_clock::now() - start;
+
+  double per_call_ns = per_call.count() / (products * ticks);
+  double batched_ns = batched.count() / (products * ticks);
+  std::cout << "generator per product: " << per_call_ns
+            << " ns per product and tick" << std::endl;
+  std::cout << "seeded engine: " << batched_ns << " ns per product and tick ("
+            << per_call_ns / batched_ns << "x faster)" << std::endl;
+}
@@ -0,0 +1,65 @@
+// Reports how many ticks per second the market reaches with the prices
+// computed on 1, 2, 4, ... shards up to the number of cores, once for the
+// price computation alone and once for the full tick including the write.
+//
+// usage: benchmarkShardedTicks [products] [ticks]
+#include <algorithm>
+#include <chrono>
+#include <db_connector.hpp>
+#include <functional>
+#include <iostream>
+#include <market_place.hpp>
+#include <price_engine.hpp>
+#include <string>
+#include <thread>
+#include <vector>
+
+namespace sm = ProjectStockMarket;
+
+double ticksPerSecond(int ticks, const std::function<void()>& tick) {
+  auto start = std::chrono::steady_clock::now();
+  for (int i = 0; i < ticks; i++) {
+    tick();
+  }
+  std::chrono::duration<double> elapsed =
+      std::chrono::steady_clock::now() - start;
+  return ticks / elapsed.count();
+}
+
+int main(int argc, char* argv[]) {
+  int products = argc > 1 ? std::stoi(argv[1]) : 10000;
+  int ticks = argc > 2 ? std::stoi(argv[2]) : 50;
+  size_t cores = std::max(1u, std::thread::hardware_concurrency());
+
+  sm::DBConnector::initDB(":memory:");
+  sm::MarketPlace mp(3600, false, 42);
+  sm::time_point now = std::chrono::system_clock::now();
+  for (int i = 0; i < products; i++) {
+    mp.addProduct("Product " + std::to_string(i), 100)
+        .addRecord(sm::Record(now, 100));
+  }
+  std::vector<int> ids;
+  std::vector<int> prices;
+  for (const auto& product : mp.getAllProducts()) {
+    ids.push_back(product.getId());
+    prices.push_back(product.getCurrentPrice());
+  }
+
+  std::cout << products << " products on " << cores << " cores" << std::endl;
+  std::cout << "shards  prices ticks/s  full ticks/s" << std::endl;
+  for (size_t shards = 1;; shards = std::min(shards * 2, cores)) {
+    sm::PriceEngine engine(42);
+    engine.setShards(shards);
+    engine.setPrices(ids, prices);
+    // the price computation alone is much faster, so it runs more ticks
+    double compute = ticksPerSecond(ticks * 20, [&]() { engine.advance(); });
+
+    mp.setPriceShards(shards);
+    double full = ticksPerSecond(ticks, [&]() { mp.updateProductPrices(); });
+
+    std::cout << shards << "\t" << compute << "\t\t" << full << std::endl;
+    if (shards == cores) {
+      break;
+    }
+  }
+}
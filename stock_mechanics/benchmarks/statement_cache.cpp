@@ -0,0 +1,57 @@
+// Compares the cost of the most frequent database calls with and without the
+// prepared statement cache.
+#include <authenticator.hpp>
+#include <chrono>
+#include <db_connector.hpp>
+#include <functional>
+#include <iostream>
+#include <market_place.hpp>
+#include <statement_cache.hpp>
+#include <string>
+
+namespace sm = ProjectStockMarket;
+
+double nanosPerCall(int iterations, const std::function<void()>& call) {
+  auto start = std::chrono::steady_clock::now();
+  for (int i = 0; i < iterations; i++) {
+    call();
+  }
+  std::chrono::duration<double, std::nano> elapsed =
+      std::chrono::steady_clock::now() - start;
+  return elapsed.count() / iterations;
+}
+
+void compare(const std::string& name, int iterations,
+             const std::function<void()>& call) {
+  sm::StatementCache::setEnabled(false);
+  double uncached = nanosPerCall(iterations, call);
+  sm::StatementCache::setEnabled(true);
+  double cached = nanosPerCall(iterations, call);
+  std::cout << name << ": " << uncached << " ns -> " << cached
+            << " ns per call (" << (uncached - cached) << " ns saved)"
+            << std::endl;
+}
+
+int main() {
+  sm::DBConnector::initDB(":memory:");
+  sm::MarketPlace mp(3600, false);
+
+  sm::Product apple = mp.addProduct("Apple", 100);
+  apple.addRecord(sm::Record(std::chrono::system_clock::now(), 100));
+  std::string token =
+      sm::Authenticator::registerAccount("bench", "bench", "Bench");
+
+  const int iterations = 100000;
+  compare("getUserByToken", iterations,
+          [&]() { sm::DBConnector::getUserByToken(token); });
+  compare("getProduct", iterations,
+          [&]() { sm::DBConnector::getProduct(apple.getId()); });
+  compare("addRecord", iterations, [&]() {
+    sm::DBConnector::addRecord(
+        apple, sm::Record(std::chrono::system_clock::now(), 100));
+  });
+
+  sm::StatementCacheStats stats = sm::StatementCache::getStats();
+  std::cout << "cache hits: " << stats.hits << ", misses: " << stats.misses
+            << std::endl;
+}
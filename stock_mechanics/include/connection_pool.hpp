@@ -0,0 +1,118 @@
+#pragma once
+
+#include <SQLiteCpp/SQLiteCpp.h>
+
+#include <condition_variable>
+#include <cstdint>
+#include <memory>
+#include <mutex>
+#include <string>
+#include <vector>
+
+#include "statement_cache.hpp"
+
+namespace ProjectStockMarket {
+
+/**
+ * @brief A database connection together with its prepared statements.
+ */
+struct Connection {
+  Connection(const std::string& p_path, int p_flags);
+
+  SQLite::Database database;
+  StatementCache statements;  ///< finalized before the connection is closed
+};
+
+class ConnectionPool;
+
+/**
+ * @class ConnectionLease
+ * @brief Borrows a connection of a ConnectionPool. The writer stays locked and
+ * a reader stays checked out until the lease goes out of scope, so statements
+ * of the lease have to be destroyed before it.
+ */
+class ConnectionLease {
+ public:
+  explicit ConnectionLease(ConnectionPool& p_pool);
+  ConnectionLease(ConnectionPool& p_pool, std::unique_ptr<Connection> p_reader,
+                  uint64_t p_generation);
+  ~ConnectionLease();
+
+  ConnectionLease(const ConnectionLease&) = delete;
+  ConnectionLease& operator=(const ConnectionLease&) = delete;
+
+  SQLite::Database& database();
+
+  /**
+   * @brief Gets the prepared statement for a query from the statement cache
+   * of the leased connection.
+   *
+   * @param p_query The SQL text of the statement.
+   * @return The statement, it is reset when the handle goes out of scope.
+   */
+  CachedStatement statement(const std::string& p_query);
+
+ private:
+  ConnectionPool& m_pool;
+  Connection* m_connection;
+  std::unique_ptr<Connection> m_reader;  ///< only set for readers
+  uint64_t m_generation;
+};
+
+/**
+ * @class ConnectionPool
+ * @brief One writer connection and a set of reader connections to the same
+ * database in WAL mode. Writes are serialized on the writer while readers see
+ * the last committed state, so reads run in parallel to each other and to the
+ * writer.
+ */
+class ConnectionPool {
+ public:
+  /**
+   * @brief Opens the writer and the reader connections, closing the ones of a
+   * previously opened database. Must not be called while leases are taken.
+   *
+   * @param p_path The path to the database file. In-memory databases can not
+   * be shared between connections, so they get no readers.
+   * @param p_readers The amount of reader connections.
+   */
+  void open(const std::string& p_path, int p_readers);
+
+  /**
+   * @brief Locks and borrows the writer connection. Recursive, so a thread may
+   * lease the writer again while holding it.
+   */
+  ConnectionLease writer();
+
+  /**
+   * @brief Borrows a reader connection, waiting for one to be returned if all
+   * are in use. Falls back to the writer if there are no readers or this
+   * thread holds the writer, so it reads its own uncommitted changes.
+   */
+  ConnectionLease reader();
+
+  /**
+   * @brief Gets the amount of reader connections.
+   */
+  int getReaderCount();
+
+ private:
+  friend class ConnectionLease;
+
+  void releaseWriter();
+  void releaseReader(std::unique_ptr<Connection> p_reader,
+                     uint64_t p_generation);
+
+  std::recursive_mutex m_writer_mutex;
+  std::unique_ptr<Connection> m_writer;
+
+  std::mutex m_reader_mutex;
+  std::condition_variable m_reader_returned;
+  std::vector<std::unique_ptr<Connection>> m_idle_readers;
+  int m_reader_count = 0;
+  uint64_t m_generation = 0;  ///< readers of older databases are dropped
+
+  static thread_local int t_writer_depth;  ///< writer leases of this thread
+};
+
+}  // namespace ProjectStockMarket
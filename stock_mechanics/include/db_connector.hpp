@@ -3,15 +3,24 @@
 #include <SQLiteCpp/SQLiteCpp.h>
 #include <SQLiteCpp/VariadicBind.h>
 
+#include <atomic>
+#include <cstdint>
 #include <ctime>
 #include <functional>
 #include <memory>
+#include <mutex>
+#include <optional>
 #include <string>
+#include <unordered_map>
+#include <vector>
 
 #include "account.hpp"
+#include "connection_pool.hpp"
+#include "order.hpp"
 #include "product.hpp"
 #include "product_entry.hpp"
 #include "record.hpp"
+#include "snapshot.hpp"
 #include "user.hpp"
 
 namespace ProjectStockMarket {
@@ -28,17 +37,27 @@ class DBConnector {
    * using any Database function else we will work on nullptr.
    *
    * @param path The path to the database file. :memory: for in-memory database.
+   * @param readers The amount of reader connections next to the writer, -1
+   * for one per hardware thread. In-memory databases always read through the
+   * writer.
    */
-  static void initDB(std::string path);
+  static void initDB(std::string path, int readers = -1);
 
   /**
-   * @brief Adds a trigger to the database that deletes on insert
-   * any pricerecord that is over the the limit. Deletes old records first.
-   * Each product has its own limit
+   * @brief Gets the amount of reader connections of the database.
+   */
+  static int getReaderCount();
+
+  /**
+   * @brief Limits the amount of price records kept for each product. Records
+   * are stored in a ring buffer of `limit` slots per product, a new record
+   * replaces the oldest one once the ring is full, so every insert costs the
+   * same no matter how big the limit is. Existing records are renumbered if
+   * they do not fit the new limit.
    *
    * @param limit The limit of records for each product to keep.
    */
-  static void addPriceRecordLimitTrigger(int limit);
+  static void setRecordLimit(int limit);
 
   /**
    * @brief Default destructor, SQLiteCpp manages the database connection
@@ -84,8 +103,8 @@ class DBConnector {
   static Product addProduct(const std::string& p_product_name, int p_count);
 
   /**
-   * @brief Gets a product by its ID from the database.
-   * Throws error if not found.
+   * @brief Gets a product by its ID from the product catalog, only unknown
+   * IDs are looked up in the database. Throws error if not found.
    *
    * @param product_id The ID of the product to get.
    * @return The product found.
@@ -108,12 +127,29 @@ class DBConnector {
   static std::vector<ProductEntry> getMarketInventory();
 
   /**
-   * @brief Gets all products from the database.
+   * @brief Gets all products from the product catalog, ordered by their ID.
    *
    * @return A vector of all products.
    */
   static std::vector<Product> getAllProducts();
 
+  /**
+   * @brief Gets the version of the product catalog, it increases whenever a
+   * product is added or the database is initialized. Responses built from
+   * the catalog can be cached as long as the version is unchanged.
+   *
+   * @return The current catalog version.
+   */
+  static uint64_t getCatalogVersion();
+
+  /**
+   * @brief Gets the version of the market inventory, it increases after every
+   * committed trade or other change of the amounts in the market.
+   *
+   * @return The current inventory version.
+   */
+  static uint64_t getInventoryVersion();
+
   /**
    * @brief Updates the amount of a product in a user's inventory.
    *
@@ -124,6 +160,48 @@ class DBConnector {
   static void updateUserProductEntry(const User& p_user,
                                      const Product& p_product, int p_amount);
 
+  /**
+   * @brief Buys products for a user in a single IMMEDIATE transaction. The
+   * balance, market count and inventory are changed with conditional updates,
+   * so concurrent trades can not overdraw the balance or the stock.
+   *
+   * @param p_user The user buying the products.
+   * @param p_product The product to buy.
+   * @param p_amount The amount of products to buy.
+   * @param p_price The price of a single product.
+   * @return The balance of the user after the trade.
+   * @throws std::invalid_argument If an amount is zero or negative.
+   */
+  static int buyProduct(const User& p_user, const Product& p_product,
+                        int p_amount, int p_price);
+
+  /**
+   * @brief Sells products of a user in a single IMMEDIATE transaction.
+   *
+   * @param p_user The user selling the products.
+   * @param p_product The product to sell.
+   * @param p_amount The amount of products to sell.
+   * @param p_price The price of a single product.
+   * @return The balance of the user after the trade.
+   * @throws std::invalid_argument If an amount is zero or negative.
+   */
+  static int sellProduct(const User& p_user, const Product& p_product,
+                         int p_amount, int p_price);
+
+  /**
+   * @brief Executes many buy and sell legs of a user in a single IMMEDIATE
+   * transaction. All legs are priced from the latest records read inside the
+   * transaction, so they see the same prices. If any leg fails nothing is
+   * committed and the error of that leg is thrown.
+   *
+   * @param p_user The user trading.
+   * @param p_orders The legs, executed in the given order.
+   * @return The fills of all legs and the balance of the user afterwards.
+   * @throws std::invalid_argument If an amount is zero or negative.
+   */
+  static OrderResult executeOrders(const User& p_user,
+                                   const std::vector<Order>& p_orders);
+
   /**
    * @brief Gets all product entries from a user's inventory.
    *
@@ -137,8 +215,32 @@ class DBConnector {
    *
    * @param product The product to add the record for.
    * @param record The record to add.
+   * @return The cursor of the stored record.
    */
-  static void addRecord(const Product& p_product, const Record& p_record);
+  static int64_t addRecord(const Product& p_product, const Record& p_record);
+
+  /**
+   * @brief Adds records for many products in a single transaction, reusing one
+   * prepared statement for all inserts.
+   *
+   * @param p_updates The records to add together with their product ids, the
+   * cursor of every record is set to the one of the stored record.
+   */
+  static void addRecords(std::vector<PriceUpdate>& p_updates);
+
+  /**
+   * @brief Counts the stored records of every product.
+   *
+   * @return The amount of records by product ID, products without records
+   * are left out.
+   */
+  static std::unordered_map<int, int> getRecordCounts();
+
+  /**
+   * @brief Deletes all records of the given products, new records start at
+   * the beginning of their ring of slots again.
+   */
+  static void removeRecords(const std::vector<int>& p_product_ids);
 
   /**
    * @brief Keeps the latest X records for a product.
@@ -168,6 +270,79 @@ class DBConnector {
                                         const time_point& from,
                                         const time_point& to);
 
+  /**
+   * @brief Downsamples the records of a product in the given time range to one
+   * candle per interval, in a single pass over the records.
+   *
+   * @param product The product to get the candles for.
+   * @param from The start of the time range.
+   * @param to The end of the time range.
+   * @param interval The length of a bucket, buckets start at multiples of it
+   * since the unix epoch.
+   * @return The candles of all buckets with records, from oldest to newest.
+   */
+  static std::vector<Candle> getCandles(const Product& product,
+                                        const time_point& from,
+                                        const time_point& to,
+                                        std::chrono::milliseconds interval);
+
+  /**
+   * @brief Gets the records of many products newer than the given time with a
+   * single query.
+   *
+   * @param p_product_ids The products to get the records for, all products if
+   * empty.
+   * @param p_since Only records after this time are returned.
+   * @return The records ordered by product and then from oldest to newest.
+   */
+  static std::vector<PriceUpdate> getRecordsSince(
+      const std::vector<int>& p_product_ids, const time_point& p_since);
+
+  /**
+   * @brief Gets the user, their inventory, the market inventory and the latest
+   * price of every product within one read transaction, so all parts show the
+   * same state of the database.
+   *
+   * @param p_user_id The ID of the user.
+   * @param p_records_since Also gets the records of all products newer than
+   * this time if set.
+   * @return The snapshot of the market.
+   */
+  static Snapshot getSnapshot(int p_user_id,
+                              const std::optional<time_point>& p_records_since);
+
+  /**
+   * @brief Gets the records of a product stored after the given cursor, the
+   * exact delta to a previous call without duplicates.
+   *
+   * @param product The product to get the records for.
+   * @param p_cursor The cursor of the newest record already known, 0 for all.
+   * @return The records from oldest to newest.
+   */
+  static std::vector<Record> getRecordsAfter(const Product& product,
+                                             int64_t p_cursor);
+
+  /**
+   * @brief Gets the records of many products stored after the given cursor
+   * with a single query. Cursors grow across all products, so one cursor
+   * covers every product.
+   *
+   * @param p_product_ids The products to get the records for, all products if
+   * empty.
+   * @param p_cursor The cursor of the newest record already known, 0 for all.
+   * @return The records ordered by product and then from oldest to newest.
+   */
+  static std::vector<PriceUpdate> getRecordsAfter(
+      const std::vector<int>& p_product_ids, int64_t p_cursor);
+
+  /**
+   * @brief Gets the latest record for a product.
+   *
+   * @param product The product to get the latest record for.
+   * @return The latest record stored in the database.
+   */
+  static Record getLatestRecord(const Product& product);
+
   /**
    * @brief Gets the latest record price for a product.
    *
@@ -207,16 +382,146 @@ class DBConnector {
   static User getUserByToken(const std::string& p_token);
 
  private:
+  /**
+   * @brief Applies a purchase inside the transaction of the writer lease,
+   * throws without committing anything if the trade is not possible.
+   *
+   * @return The balance of the user after the trade.
+   */
+  static int buyInTransaction(ConnectionLease& p_db, int p_user_id,
+                              const Product& p_product, int p_amount,
+                              int p_price);
+
+  /**
+   * @brief Applies a sale inside the transaction of the writer lease, throws
+   * without committing anything if the trade is not possible.
+   *
+   * @return The balance of the user after the trade.
+   */
+  static int sellInTransaction(ConnectionLease& p_db, int p_user_id,
+                               const Product& p_product, int p_amount,
+                               int p_price);
+
+  /**
+   * @brief Rejects trade amounts that are not positive, the conditional
+   * updates of a trade only guard positive amounts.
+   *
+   * @throws std::invalid_argument If the amount is zero or negative.
+   */
+  static void checkTradeAmount(int p_amount);
+
+  /**
+   * @brief Gets the records of many products that match a condition on the
+   * PriceRecord columns.
+   *
+   * @param p_condition SQL condition with a single parameter.
+   * @param p_value The value bound to the parameter of the condition.
+   */
+  static std::vector<PriceUpdate> queryPriceUpdates(
+      ConnectionLease& p_db, const std::vector<int>& p_product_ids,
+      const std::string& p_condition, int64_t p_value);
+
+  /**
+   * @brief Gets the latest record of every product through the given
+   * connection, ordered by product.
+   */
+  static std::vector<PriceUpdate> queryLatestRecords(ConnectionLease& p_db);
+
+  static std::vector<ProductEntry> queryMarketInventory(ConnectionLease& p_db);
+  static std::vector<ProductEntry> queryUserInventory(ConnectionLease& p_db,
+                                                      int p_user_id);
+  static User queryUser(ConnectionLease& p_db, int p_user_id);
+
+  /**
+   * @brief Gets the balance of a user through the given connection.
+   */
+  static int getBalance(ConnectionLease& p_db, int p_user_id);
+
   /**
    * @brief Creates the necessary tables in the database.
    */
   static void createTables();
 
   /**
-   * @brief Pointer to our database connection
+   * @brief Converts PriceRecord tables of older databases that store the
+   * date_time column as ISO 8601 text to epoch milliseconds.
+   */
+  static void migratePriceRecordTimestamps();
+
+  /**
+   * @brief Adds the slot column to PriceRecord tables of older databases.
+   */
+  static void migratePriceRecordSlots();
+
+  /**
+   * @brief Loads the next free ring buffer slot of every product.
+   *
+   * @return false if the stored slots do not match the current limit and
+   * have to be renumbered first.
+   */
+  static bool loadRecordSlots();
+
+  /**
+   * @brief Deletes the records over the limit and renumbers the slots of the
+   * remaining ones from oldest to newest.
+   */
+  static void reslotRecords();
+
+  /**
+   * @brief Binds the next ring buffer slot of a product, or NULL if records
+   * are not limited.
+   *
+   * The slot is only advanced in p_slots, so a rolled back insert reuses it
+   * instead of leaving the oldest record behind in a skipped slot.
+   *
+   * @param p_slots Next slots of the current transaction, see
+   * commitRecordSlots.
+   */
+  static void bindRecordSlot(CachedStatement& p_query, int p_index,
+                             int p_product_id,
+                             std::unordered_map<int, int>& p_slots);
+
+  /**
+   * @brief Keeps the slots advanced by bindRecordSlot once their inserts are
+   * committed.
+   */
+  static void commitRecordSlots(const std::unordered_map<int, int>& p_slots);
+
+  /**
+   * @brief Immutable snapshot of all products. Products never change once
+   * added, so the snapshot is only replaced when a new product is added.
+   */
+  struct ProductCatalog {
+    std::vector<Product> products;          ///< ordered by id
+    std::unordered_map<int, size_t> index;  ///< product id -> position
+  };
+
+  /**
+   * @brief Gets the current product catalog, loading it from the database if
+   * it was invalidated.
+   */
+  static std::shared_ptr<const ProductCatalog> getCatalog();
+
+  /**
+   * @brief Drops the product catalog so it is reloaded on the next access.
+   */
+  static void invalidateCatalog();
+
+  static std::mutex m_catalog_mutex;
+  static std::shared_ptr<const ProductCatalog> m_catalog;
+  static std::atomic<uint64_t> m_catalog_version;
+  static std::atomic<uint64_t> m_inventory_version;
+
+  static std::mutex m_slot_mutex;
+  static int m_record_limit;  ///< 0 if records are not limited
+  static std::unordered_map<int, int> m_next_slot;
+
+  /**
+   * @brief Writer and reader connections of our database. The bindings
+   * release the GIL, so DBConnector is called from many threads: writes are
+   * serialized on the writer, reads run on the readers in parallel.
    */
-  static std::unique_ptr<SQLite::Database>
-      m_database;  ///< The database connection.
+  static ConnectionPool m_pool;
 };
 
 }  // namespace ProjectStockMarket
@@ -1,36 +1,226 @@
 #pragma once
-#include <random>
+#include <atomic>
+#include <chrono>
+#include <condition_variable>
+#include <cstdint>
+#include <memory>
+#include <mutex>
+#include <optional>
+#include <unordered_map>
 #include <vector>
 
+#include "price_engine.hpp"
 #include "product_entry.hpp"
 #include "record.hpp"
+#include "snapshot.hpp"
 #include "timer.hpp"
 
 namespace ProjectStockMarket {
 
+/**
+ * @brief The records produced by one price update of the market.
+ */
+struct Tick {
+  uint64_t sequence;  ///< increases by one with every tick, starting at 1
+  std::vector<PriceUpdate> updates;
+};
+
+/**
+ * @brief What a backfill produced and how long it took.
+ */
+struct BackfillReport {
+  uint64_t ticks = 0;    ///< simulated ticks, 0 if no product was backfilled
+  uint64_t prices = 0;   ///< simulated prices, ticks times products
+  uint64_t records = 0;  ///< records stored in the database
+  std::chrono::microseconds simulationTime{0};
+  std::chrono::microseconds persistTime{0};
+
+  double pricesPerSecond() const { return perSecond(prices, simulationTime); }
+  double recordsPerSecond() const { return perSecond(records, persistTime); }
+
+ private:
+  static double perSecond(uint64_t count, std::chrono::microseconds time) {
+    return time.count() > 0
+               ? count / std::chrono::duration<double>(time).count()
+               : 0;
+  }
+};
+
 class MarketPlace {
  public:
-  MarketPlace(int limit_record_entries, bool try_generate_products);
+  /**
+   * @param limit_record_entries The amount of records kept per product.
+   * @param try_generate_products Adds example products to an empty database
+   * and starts the price updates.
+   * @param price_seed Seeds the price simulation, so the same seed and
+   * database always produce the same prices. Seeded from std::random_device
+   * if not set.
+   */
+  MarketPlace(int limit_record_entries, bool try_generate_products,
+              std::optional<uint64_t> price_seed = std::nullopt);
   ~MarketPlace();
   std::vector<ProductEntry> getInventory();
   std::vector<Product> getAllProducts();
   Product addProduct(const std::string& p_name, int p_count);
+
+  /**
+   * @brief Gets the version of the product catalog, which increases with
+   * every added product.
+   */
+  uint64_t getCatalogVersion() const;
+
+  /**
+   * @brief Gets the records of many products newer than `p_since` with a
+   * single database query.
+   *
+   * @param p_product_ids The products to get the records for, all products if
+   * empty.
+   * @return The records ordered by product and then from oldest to newest.
+   */
+  std::vector<PriceUpdate> getRecords(const std::vector<int>& p_product_ids,
+                                      const time_point& p_since);
+
+  /**
+   * @brief Gets the records of many products stored after `p_cursor` with a
+   * single database query.
+   *
+   * @param p_product_ids The products to get the records for, all products if
+   * empty.
+   * @return The records ordered by product and then from oldest to newest.
+   */
+  std::vector<PriceUpdate> getRecordsAfter(
+      const std::vector<int>& p_product_ids, int64_t p_cursor);
+
+  /**
+   * @brief Gets everything a client shows on its dashboard from one consistent
+   * read of the database.
+   *
+   * @param p_user The user whose balance and inventory are included.
+   * @param p_records_since Also includes the records of all products newer
+   * than this time if set.
+   */
+  Snapshot getSnapshot(const User& p_user,
+                       const std::optional<time_point>& p_records_since);
   void startPriceUpdate();
 
- private:
-  int randomWalk(int current_price, double trend, double streuung, double dt);      
+  /**
+   * @brief Computes a new price for every product and persists all of them in
+   * one batch. Runs on the timer thread once per tick.
+   */
+  void updateProductPrices();
 
- private:
-  std::random_device rd;
-  std::mt19937 gen{rd()};
+  /**
+   * @brief Fast-forwards the price simulation through `p_history` ending now,
+   * as fast as possible instead of in real time, e.g. to fill a fresh
+   * database with realistic charts. Only products without history besides
+   * their seed record are backfilled, the seed record is replaced by the
+   * simulated series, so it never interleaves with existing records. Only
+   * the ticks still within the record limit are stored, in transactions of
+   * about `p_batch_size` records. The last simulated prices become the
+   * current prices.
+   *
+   * @param p_history How far the simulation goes back.
+   * @param p_period The time between two simulated ticks.
+   * @param p_batch_size The amount of records stored per transaction.
+   * @throws std::invalid_argument If the period is not positive or longer
+   * than the history, or the batch size is 0.
+   */
+  BackfillReport backfill(std::chrono::seconds p_history,
+                          std::chrono::microseconds p_period,
+                          size_t p_batch_size = 100000);
 
-  std::uniform_real_distribution<> trendDistribution{-0.05, 0.04};
-    std::uniform_real_distribution<> randomNumber{2, 4};
+  /**
+   * @brief Splits the products into shards whose prices are computed in
+   * parallel, the new prices are still stored in one batch. Restarts the
+   * price simulation, a seeded market replays the same prices for the same
+   * amount of shards.
+   *
+   * @throws std::invalid_argument If the amount of shards is 0.
+   */
+  void setPriceShards(size_t p_shards);
+  size_t getPriceShards();
 
+  /**
+   * @brief Restarts the price simulation from a seed, the following price
+   * updates are reproducible.
+   */
+  void seedPrices(uint64_t p_seed);
+
+  /**
+   * @brief Gets how long the last price update took, useful to check that a
+   * tick stays within its period.
+   */
+  std::chrono::microseconds getLastTickDuration() const;
+
+  /**
+   * @brief Changes how often the prices are updated, a running market uses
+   * the new period from its next tick on.
+   *
+   * @throws std::invalid_argument If the period is not positive.
+   */
+  void setTickPeriod(std::chrono::microseconds p_period);
+  std::chrono::microseconds getTickPeriod() const;
+
+  /**
+   * @brief Sets what happens when a price update takes longer than the tick
+   * period.
+   */
+  void setOverrunPolicy(OverrunPolicy p_policy);
+  OverrunPolicy getOverrunPolicy() const;
+
+  /**
+   * @brief Gets the lag, overrun and duration counters of the price updates.
+   */
+  TimerStats getTimerStats() const;
+
+  /**
+   * @brief Waits until a tick newer than `p_after` is published. Only the
+   * newest tick is kept, a caller that falls behind skips to it and can tell
+   * from the sequence how many ticks it missed.
+   *
+   * @param p_after The sequence of the last tick the caller has seen, 0 for
+   * none.
+   * @param p_timeout How long to wait at most.
+   * @return The newest tick or std::nullopt if none was published in time.
+   */
+  std::optional<Tick> waitForTick(uint64_t p_after,
+                                  std::chrono::milliseconds p_timeout);
+
+  /**
+   * @brief Gets the sequence of the newest published tick, 0 before the first
+   * one. Responses built from prices or records stay valid while it does not
+   * change.
+   */
+  uint64_t getTickSequence();
+
+  /**
+   * @brief Gets the version of the market inventory, it increases after
+   * every committed change of the amounts offered by the market.
+   */
+  uint64_t getInventoryVersion() const;
+
+ private:
+  void publishTick(std::vector<PriceUpdate> p_updates);
+  // loads the current price of every product into the engine
+  void loadPrices();
+  // turns the order flow since the last tick into the demand of the engine
+  void loadDemand();
+
+ private:
+  // held during a price update or backfill, so only one of them runs
+  std::mutex m_price_engine_mutex;
+  PriceEngine m_price_engine;
+  // amounts offered by the market, reloaded when the inventory version changes
+  std::unordered_map<int, int> m_supply;
+  std::optional<uint64_t> m_supply_version;
 
   Timer timer;
   int m_limit_record_entries = 3600;
-  void updateProductPrices();  // thread
+  std::atomic<int64_t> m_last_tick_duration_us{0};
+
+  std::mutex m_tick_mutex;
+  std::condition_variable m_tick_published;
+  std::shared_ptr<const Tick> m_last_tick;
 };
 
 }  // namespace ProjectStockMarket
@@ -0,0 +1,38 @@
+#pragma once
+
+#include <cstdint>
+#include <vector>
+
+namespace ProjectStockMarket {
+
+enum class OrderSide { Buy, Sell };
+
+/**
+ * @brief One leg of an order batch.
+ */
+struct Order {
+  int productId;
+  OrderSide side;
+  int amount;
+};
+
+/**
+ * @brief The execution of one leg of an order batch.
+ */
+struct Fill {
+  int productId;
+  OrderSide side;
+  int amount;
+  int price;  ///< price of a single product
+  int64_t total;  ///< amount times price, paid or received by the user
+};
+
+/**
+ * @brief The fills of an order batch in the order of its legs.
+ */
+struct OrderResult {
+  std::vector<Fill> fills;
+  int balance;  ///< balance of the user after all legs
+};
+
+}  // namespace ProjectStockMarket
@@ -0,0 +1,65 @@
+#pragma once
+
+#include <atomic>
+#include <cstdint>
+#include <memory>
+#include <shared_mutex>
+#include <unordered_map>
+#include <vector>
+
+namespace ProjectStockMarket {
+
+/**
+ * @brief The amounts of a product traded since the last tick.
+ */
+struct ProductFlow {
+  int productId;
+  int64_t bought;
+  int64_t sold;
+};
+
+/**
+ * @class OrderFlow
+ * @brief Thread-safe in-memory counters of the amounts bought and sold per
+ * product, so a tick can react to the demand without reading the trades from
+ * the database. Trades add to atomic counters, the lock is only taken
+ * exclusively for the first trade of a product.
+ */
+class OrderFlow {
+ public:
+  /**
+   * @brief Counts a committed purchase from the market.
+   */
+  static void recordBuy(int product_id, int amount);
+
+  /**
+   * @brief Counts a committed sale to the market.
+   */
+  static void recordSell(int product_id, int amount);
+
+  /**
+   * @brief Takes the amounts traded since the last call and resets them.
+   *
+   * @return The flow of every product traded in between.
+   */
+  static std::vector<ProductFlow> drain();
+
+  /**
+   * @brief Resets all counters, e.g. when switching databases.
+   */
+  static void clear();
+
+ private:
+  struct Counters {
+    std::atomic<int64_t> bought{0};
+    std::atomic<int64_t> sold{0};
+  };
+
+  static Counters& counters(int product_id);
+
+  static std::shared_mutex m_mutex;
+  // entries are never removed, so references to the counters stay valid
+  static std::unordered_map<int, std::unique_ptr<Counters>> m_counters;
+};
+
+}  // namespace ProjectStockMarket
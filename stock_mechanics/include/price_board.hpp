@@ -0,0 +1,57 @@
+#pragma once
+
+#include <optional>
+#include <shared_mutex>
+#include <unordered_map>
+
+#include "record.hpp"
+
+namespace ProjectStockMarket {
+
+/**
+ * @class PriceBoard
+ * @brief Thread-safe in-memory board holding the latest record of every
+ * product. It is the authoritative source for current prices, the database is
+ * only used to persist the price history.
+ */
+class PriceBoard {
+ public:
+  /**
+   * @brief Gets the latest known record of a product.
+   *
+   * @param product_id The ID of the product.
+   * @return The latest record or std::nullopt if the product is not on the
+   * board yet.
+   */
+  static std::optional<Record> getLatestRecord(int product_id);
+
+  /**
+   * @brief Gets the current price of a product.
+   *
+   * @param product_id The ID of the product.
+   * @return The current price or std::nullopt if the product is not on the
+   * board yet.
+   */
+  static std::optional<int> getPrice(int product_id);
+
+  /**
+   * @brief Publishes a new record for a product. Records older than the one
+   * already on the board are ignored, so the board always shows the newest
+   * price.
+   *
+   * @param product_id The ID of the product.
+   * @param record The record to publish.
+   */
+  static void update(int product_id, const Record& record);
+
+  /**
+   * @brief Removes all prices from the board, e.g. when switching databases.
+   */
+  static void clear();
+
+ private:
+  static std::shared_mutex m_mutex;
+  static std::unordered_map<int, Record> m_records;
+};
+
+}  // namespace ProjectStockMarket
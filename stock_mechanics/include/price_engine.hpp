@@ -0,0 +1,127 @@
+#pragma once
+
+#include <cstdint>
+#include <memory>
+#include <optional>
+#include <random>
+#include <vector>
+
+#include "record.hpp"
+#include "worker_pool.hpp"
+
+namespace ProjectStockMarket {
+
+/**
+ * @class PriceEngine
+ * @brief Advances the prices of all products in one pass. The prices are kept
+ * in contiguous arrays that can be split into shards, which are advanced in
+ * parallel. Every shard draws from its own generator, so a seeded engine
+ * always produces the same walk for the same amount of shards.
+ */
+class PriceEngine {
+ public:
+  /**
+   * @brief Creates an engine seeded from std::random_device.
+   */
+  PriceEngine();
+
+  /**
+   * @brief Creates a deterministic engine, e.g. for benchmarks and tests.
+   *
+   * @param p_seed The same seed and prices always produce the same prices.
+   */
+  explicit PriceEngine(uint64_t p_seed);
+
+  /**
+   * @brief Restarts the generators from a seed.
+   */
+  void seed(uint64_t p_seed);
+
+  /**
+   * @brief Splits the products into `p_shards` contiguous ranges that are
+   * advanced on their own threads. Restarts the generators, from the seed of
+   * the engine if it has one.
+   *
+   * @throws std::invalid_argument If the amount of shards is 0.
+   */
+  void setShards(size_t p_shards);
+  size_t getShards() const;
+
+  /**
+   * @brief Replaces the products whose prices are advanced, their demand is
+   * reset to 0.
+   *
+   * @param p_product_ids The IDs of the products.
+   * @param p_prices The current price of every product, in the same order.
+   */
+  void setPrices(const std::vector<int>& p_product_ids,
+                 const std::vector<int>& p_prices);
+
+  /**
+   * @brief Sets the demand for the products, which pushes the trend of the
+   * following steps up or down.
+   *
+   * @param p_demand The demand of every product between -1 and 1, in the
+   * order of the products.
+   * @throws std::invalid_argument If the amount does not match the products.
+   */
+  void setDemand(const std::vector<double>& p_demand);
+
+  /**
+   * @brief Advances every price by one step of a random walk.
+   *
+   * @param p_now The time of the new records.
+   * @param p_dt The length of the step, 1 for one tick.
+   * @return One record per product to persist, in the order of the products.
+   */
+  std::vector<PriceUpdate> step(const time_point& p_now, double p_dt = 1);
+
+  /**
+   * @brief Advances every price by one step without producing records, e.g.
+   * for ticks that are simulated but not persisted.
+   */
+  void advance(double p_dt = 1);
+
+  /**
+   * @brief Appends a record with the current price of every product.
+   *
+   * @param p_now The time of the records.
+   * @param p_updates The records are appended to it in the order of the
+   * products.
+   */
+  void appendUpdates(const time_point& p_now,
+                     std::vector<PriceUpdate>& p_updates) const;
+
+  const std::vector<int>& getProductIds() const;
+  const std::vector<int>& getPrices() const;
+
+ private:
+  static constexpr double m_volatility = 0.8;
+  /// trend added for the highest demand, as much as the random trend at most
+  static constexpr double m_demand_weight = 0.3;
+
+  struct Shard {
+    std::mt19937_64 generator;
+    std::uniform_real_distribution<> trend{-0.3, 0.3};
+    std::uniform_real_distribution<> shock{-0.05, 0.04};
+    std::uniform_real_distribution<> offset{2, 4};
+  };
+
+  void seedShards();
+  void advanceRange(Shard& p_shard, size_t p_begin, size_t p_end, double p_dt);
+
+  std::optional<uint64_t> m_seed;
+  std::vector<Shard> m_shards;
+  // runs all shards but the first, which runs on the calling thread
+  std::unique_ptr<WorkerPool> m_workers;
+
+  std::vector<int> m_product_ids;
+  std::vector<int> m_prices;
+  std::vector<double> m_demand;
+  // random numbers of the current step, reused between steps
+  std::vector<double> m_trends;
+  std::vector<double> m_shocks;
+  std::vector<double> m_offsets;
+};
+
+}  // namespace ProjectStockMarket
@@ -13,6 +13,9 @@ class Product {
   std::string getName() const;
   std::vector<Record> getAllRecords() const;
   std::vector<Record> getRecords(time_point from, time_point to) const;
+  std::vector<Record> getRecordsAfter(int64_t cursor) const;
+  std::vector<Candle> getCandles(time_point from, time_point to,
+                                 std::chrono::milliseconds interval) const;
   void addRecord(Record record);
   void reduceRecordCountToX(int limit);
   int getCurrentPrice() const;
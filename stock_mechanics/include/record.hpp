@@ -1,22 +1,68 @@
 #pragma once
 
 #include <chrono>
+#include <cstdint>
 #include <string>
 
 namespace ProjectStockMarket {
 
 using time_point = std::chrono::system_clock::time_point;
 
+/**
+ * @brief Converts a time point to milliseconds since the unix epoch. The
+ * system clock counts from the unix epoch, so the result is always UTC and
+ * independent of the local timezone.
+ */
+inline int64_t to_epoch_millis(const time_point& tp) {
+  return std::chrono::duration_cast<std::chrono::milliseconds>(
+             tp.time_since_epoch())
+      .count();
+}
+
+/**
+ * @brief Converts milliseconds since the unix epoch back to a time point.
+ */
+inline time_point from_epoch_millis(int64_t millis) {
+  return time_point(std::chrono::duration_cast<time_point::duration>(
+      std::chrono::milliseconds(millis)));
+}
+
 struct Record {
   time_point dateTime;
   int price;
+  /// entry_num of the stored record, grows with every insert across all
+  /// products, 0 if the record is not stored yet
+  int64_t cursor;
 
-  Record(time_point p_dateTime, int p_price)
-      : dateTime(p_dateTime), price(p_price) {}
+  Record(time_point p_dateTime, int p_price, int64_t p_cursor = 0)
+      : dateTime(p_dateTime), price(p_price), cursor(p_cursor) {}
 
   bool operator==(const Record& other) const {
     return dateTime == other.dateTime && price == other.price;
   }
 };
 
+/**
+ * @brief A new record for a specific product, e.g. produced by a price tick.
+ */
+struct PriceUpdate {
+  int productId;
+  Record record;
+
+  PriceUpdate(int p_productId, Record p_record)
+      : productId(p_productId), record(p_record) {}
+};
+
+/**
+ * @brief Open, high, low and close price of a product in one time bucket.
+ */
+struct Candle {
+  time_point start;  ///< start of the bucket, a multiple of the interval
+  int open;
+  int high;
+  int low;
+  int close;
+  int count;  ///< amount of records in the bucket
+};
+
 }  // namespace ProjectStockMarket
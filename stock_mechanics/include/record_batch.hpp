@@ -0,0 +1,76 @@
+#pragma once
+
+#include <cstdint>
+#include <string>
+#include <vector>
+
+#include "record.hpp"
+
+namespace ProjectStockMarket {
+
+/**
+ * @brief The records of one product as parallel arrays.
+ */
+struct RecordColumns {
+  int productId;
+  std::vector<int64_t> timestamps;  ///< milliseconds since the unix epoch (UTC)
+  std::vector<int32_t> prices;
+  std::vector<int64_t> cursors;
+};
+
+/**
+ * @class RecordBatch
+ * @brief Records of one or more products stored column wise, so a response
+ * can be encoded without creating an object per record.
+ *
+ * The binary encoding is little-endian:
+ *   uint32 product count
+ *   per product: int32 product id, uint32 record count
+ *   per product, in the same order: int64 timestamps[count],
+ *     int32 prices[count], int64 cursors[count]
+ *
+ * The JSON encoding is
+ *   {"products": [{"product_id": 1, "timestamps": [...], "prices": [...],
+ *     "cursors": [...]}, ...]}
+ */
+class RecordBatch {
+ public:
+  /**
+   * @brief Creates a batch with the records of a single product.
+   */
+  static RecordBatch fromRecords(int p_product_id,
+                                 const std::vector<Record>& p_records);
+
+  /**
+   * @brief Creates a batch from records ordered by product.
+   *
+   * @param p_updates The records together with their product ids.
+   * @param p_product_ids Products that are part of the batch even if they
+   * have no records.
+   */
+  static RecordBatch fromUpdates(const std::vector<PriceUpdate>& p_updates,
+                                 const std::vector<int>& p_product_ids = {});
+
+  /**
+   * @brief Gets the amount of records over all products.
+   */
+  size_t size() const;
+
+  const std::vector<RecordColumns>& getColumns() const;
+
+  /**
+   * @brief Moves the columns out of the batch, e.g. to hand their buffers to
+   * python without copying. The batch is empty afterwards.
+   */
+  std::vector<RecordColumns> takeColumns();
+
+  std::string toJson() const;
+  std::string toBinary() const;
+
+ private:
+  RecordColumns& columnsOf(int p_product_id);
+
+  std::vector<RecordColumns> m_columns;
+};
+
+}  // namespace ProjectStockMarket
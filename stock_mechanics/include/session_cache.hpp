@@ -0,0 +1,108 @@
+#pragma once
+
+#include <chrono>
+#include <cstddef>
+#include <cstdint>
+#include <list>
+#include <mutex>
+#include <optional>
+#include <string>
+#include <unordered_map>
+
+#include "user.hpp"
+
+namespace ProjectStockMarket {
+
+/**
+ * @brief Counters of the session cache.
+ */
+struct SessionCacheStats {
+  uint64_t hits;
+  uint64_t misses;
+  size_t size;
+};
+
+/**
+ * @class SessionCache
+ * @brief Thread-safe cache mapping login tokens to their users, so
+ * authenticated requests do not have to join Account and User every time.
+ * Entries expire after a TTL and the least recently used entry is evicted
+ * once the cache is full.
+ */
+class SessionCache {
+ public:
+  /**
+   * @brief Gets the user of a token if it is cached and not expired.
+   *
+   * @param p_token The login token.
+   * @return The user or std::nullopt on a cache miss.
+   */
+  static std::optional<User> get(const std::string& p_token);
+
+  /**
+   * @brief Gets the current generation, it changes whenever an entry is
+   * invalidated. Take it before loading a user from the database.
+   */
+  static uint64_t getGeneration();
+
+  /**
+   * @brief Caches the user of a token. If a user was updated or invalidated
+   * since `p_generation` was taken, the loaded user might already be outdated
+   * and is not cached.
+   */
+  static void put(const std::string& p_token, const User& p_user,
+                  uint64_t p_generation);
+
+  /**
+   * @brief Replaces the cached data of a user in the entries of all of its
+   * tokens, e.g. after a trade changed the balance. Users loaded before the
+   * update are not cached anymore.
+   */
+  static void updateUser(const User& p_user);
+
+  /**
+   * @brief Drops the entry of a token, e.g. on logout.
+   */
+  static void invalidateToken(const std::string& p_token);
+
+  /**
+   * @brief Drops the entries of all tokens of a user, e.g. when a new token
+   * is issued.
+   */
+  static void invalidateUser(int p_user_id);
+
+  /**
+   * @brief Sets how long entries stay valid and how many are kept. Shrinking
+   * the capacity evicts the least recently used entries.
+   */
+  static void configure(std::chrono::milliseconds p_ttl, size_t p_capacity);
+
+  static SessionCacheStats getStats();
+
+  /**
+   * @brief Drops all entries, e.g. when switching databases.
+   */
+  static void clear();
+
+ private:
+  struct Entry {
+    std::string token;
+    User user;
+    std::chrono::steady_clock::time_point expires;
+  };
+
+  static void erase(std::list<Entry>::iterator p_entry);
+
+  static std::mutex m_mutex;
+  static std::list<Entry> m_entries;  ///< most recently used first
+  static std::unordered_map<std::string, std::list<Entry>::iterator> m_tokens;
+  /// the entries of every token of a user
+  static std::unordered_multimap<int, std::list<Entry>::iterator> m_users;
+  static std::chrono::milliseconds m_ttl;
+  static size_t m_capacity;
+  static uint64_t m_generation;
+  static uint64_t m_hits;
+  static uint64_t m_misses;
+};
+
+}  // namespace ProjectStockMarket
@@ -0,0 +1,23 @@
+#pragma once
+
+#include <vector>
+
+#include "product_entry.hpp"
+#include "record.hpp"
+#include "user.hpp"
+
+namespace ProjectStockMarket {
+
+/**
+ * @brief Everything a client shows on its dashboard, read in one consistent
+ * database transaction.
+ */
+struct Snapshot {
+  User user;
+  std::vector<ProductEntry> inventory;  ///< products owned by the user
+  std::vector<ProductEntry> market;     ///< products offered by the market
+  std::vector<PriceUpdate> prices;      ///< latest record of every product
+  std::vector<PriceUpdate> records;     ///< ordered by product, then by time
+};
+
+}  // namespace ProjectStockMarket
@@ -0,0 +1,102 @@
+#pragma once
+
+#include <SQLiteCpp/SQLiteCpp.h>
+
+#include <atomic>
+#include <cstdint>
+#include <memory>
+#include <string>
+#include <unordered_map>
+#include <utility>
+
+namespace ProjectStockMarket {
+
+/**
+ * @brief Hit and miss counters of all statement caches.
+ */
+struct StatementCacheStats {
+  uint64_t hits;
+  uint64_t misses;
+};
+
+/**
+ * @class CachedStatement
+ * @brief Handle to a prepared statement borrowed from a StatementCache. When
+ * the handle goes out of scope the statement is reset and its bindings are
+ * cleared, so it is ready for the next query and does not keep a read
+ * transaction open.
+ */
+class CachedStatement {
+ public:
+  CachedStatement(SQLite::Statement& p_statement, bool* p_in_use);
+  explicit CachedStatement(std::unique_ptr<SQLite::Statement> p_statement);
+  ~CachedStatement();
+
+  CachedStatement(const CachedStatement&) = delete;
+  CachedStatement& operator=(const CachedStatement&) = delete;
+
+  template <typename... Args>
+  void bind(Args&&... args) {
+    m_statement->bind(std::forward<Args>(args)...);
+  }
+  bool executeStep();
+  int exec();
+  SQLite::Column getColumn(int p_index) const;
+  void reset();
+
+ private:
+  std::unique_ptr<SQLite::Statement> m_owned;  ///< only set if not cached
+  SQLite::Statement* m_statement;
+  bool* m_in_use;
+};
+
+/**
+ * @class StatementCache
+ * @brief Keeps the prepared statements of one database connection, keyed by
+ * their SQL text, so every query is only parsed and planned once.
+ */
+class StatementCache {
+ public:
+  explicit StatementCache(SQLite::Database& p_database);
+
+  /**
+   * @brief Gets the prepared statement for the query, preparing it on the
+   * first use. If the statement is already borrowed (e.g. by a nested call)
+   * a fresh, uncached statement is returned instead.
+   *
+   * @param p_query The SQL text of the statement.
+   * @return A handle that returns the statement to the cache when destroyed.
+   */
+  CachedStatement get(const std::string& p_query);
+
+  /**
+   * @brief Gets the hit and miss counters summed over all caches.
+   */
+  static StatementCacheStats getStats();
+
+  /**
+   * @brief Sets the hit and miss counters back to 0.
+   */
+  static void resetStats();
+
+  /**
+   * @brief Enables or disables caching for all caches, disabled caches
+   * prepare a new statement on every call. Used to compare both in benchmarks.
+   */
+  static void setEnabled(bool p_enabled);
+
+ private:
+  struct Entry {
+    std::unique_ptr<SQLite::Statement> statement;
+    bool in_use = false;
+  };
+
+  SQLite::Database& m_database;
+  std::unordered_map<std::string, Entry> m_statements;
+
+  static std::atomic<uint64_t> m_hits;
+  static std::atomic<uint64_t> m_misses;
+  static std::atomic<bool> m_enabled;
+};
+
+}  // namespace ProjectStockMarket
@@ -2,32 +2,116 @@
 
 #include <atomic>
 #include <chrono>
+#include <condition_variable>
+#include <cstdint>
 #include <functional>
+#include <mutex>
 #include <thread>
+#include <vector>
 
 namespace ProjectStockMarket {
 
+/**
+ * @brief What the timer does when a tick ends after the deadline of the next
+ * one.
+ */
+enum class OverrunPolicy {
+  Skip,     ///< drops the missed deadlines and waits for the next one ahead
+  CatchUp,  ///< runs the missed ticks back to back until it is on time again
+};
+
+/**
+ * @brief Counters of a timer, all durations are measured on the steady clock.
+ */
+struct TimerStats {
+  uint64_t ticks = 0;     ///< callbacks run
+  uint64_t overruns = 0;  ///< ticks that ended after the next deadline
+  uint64_t skipped = 0;   ///< deadlines dropped by OverrunPolicy::Skip
+  std::chrono::microseconds lastLag{0};  ///< how late the last tick started
+  std::chrono::microseconds maxLag{0};
+  /// upper bounds of the histogram buckets, the last bucket has none
+  std::vector<std::chrono::microseconds> bucketBounds;
+  /// ticks per duration bucket, one more entry than bucketBounds
+  std::vector<uint64_t> durationHistogram;
+};
+
+/**
+ * @brief When the next tick of a timer runs.
+ */
+struct TimerSchedule {
+  std::chrono::steady_clock::time_point deadline;
+  bool overrun;      ///< the finished tick ended after its next deadline
+  uint64_t skipped;  ///< deadlines dropped to get back on time
+};
+
+/**
+ * @class Timer
+ * @brief Runs a callback periodically on its own thread. The ticks are
+ * scheduled on absolute deadlines, so the time the callback takes does not
+ * add up to a drift.
+ */
 class Timer {
  public:
-  Timer();
+  Timer(std::chrono::nanoseconds period = std::chrono::seconds(1),
+        OverrunPolicy policy = OverrunPolicy::Skip);
   ~Timer();
 
-  // Starts the timer
+  // Starts the timer, the first tick is one period from now
   void start();
 
-  // Stops the timer
+  // Stops the timer and waits for a running tick to finish
   void stop();
 
-  // Sets the callback function to be called every second
+  // Sets the callback function to be called every period
   void setCallback(std::function<void()> callback);
 
+  /**
+   * @brief Changes the period, a running timer uses it from the next
+   * deadline on.
+   *
+   * @throws std::invalid_argument If the period is not positive.
+   */
+  void setPeriod(std::chrono::nanoseconds period);
+  std::chrono::nanoseconds getPeriod() const;
+
+  void setOverrunPolicy(OverrunPolicy policy);
+  OverrunPolicy getOverrunPolicy() const;
+
+  TimerStats getStats() const;
+
+  /**
+   * @brief Computes the deadline of the tick after one that finished.
+   *
+   * @param p_deadline The deadline the finished tick was started for.
+   * @param p_finished When the tick finished.
+   * @param p_period The period of the timer.
+   * @param p_policy What to do if the next deadline has already passed.
+   */
+  static TimerSchedule schedule(
+      std::chrono::steady_clock::time_point p_deadline,
+      std::chrono::steady_clock::time_point p_finished,
+      std::chrono::steady_clock::duration p_period, OverrunPolicy p_policy);
+
  private:
+  using Clock = std::chrono::steady_clock;
+
   std::atomic<bool> running;
   std::thread timerThread;
   std::function<void()> callback;
+  std::atomic<int64_t> m_period_ns;
+  std::atomic<OverrunPolicy> m_policy;
+
+  // wakes the timer thread up when it is stopped
+  std::mutex m_wait_mutex;
+  std::condition_variable m_stopped;
+
+  mutable std::mutex m_stats_mutex;
+  TimerStats m_stats;
 
-  // Function that increments the timer
+  // Function that waits for the deadlines and runs the callback
   void run();
+  void record(Clock::duration lag, Clock::duration duration, bool overrun,
+              uint64_t skipped);
 };
 
 }  // namespace ProjectStockMarket
@@ -2,6 +2,7 @@
 #include <string>
 
 #include "account.hpp"
+#include "order.hpp"
 #include "product_entry.hpp"
 namespace ProjectStockMarket {
 
@@ -17,6 +18,14 @@ class User {
   void buyProduct(const Product& p_product, int p_amount);
   void sellProduct(const Product& p_product, int p_amount);
 
+  /**
+   * @brief Executes all buy and sell legs at once, either all of them succeed
+   * or none does.
+   *
+   * @return The fills in the order of the legs.
+   */
+  std::vector<Fill> executeOrders(const std::vector<Order>& p_orders);
+
  private:
   int m_id;
   std::string m_name;
@@ -0,0 +1,55 @@
+#pragma once
+
+#include <condition_variable>
+#include <cstddef>
+#include <cstdint>
+#include <functional>
+#include <mutex>
+#include <thread>
+#include <vector>
+
+namespace ProjectStockMarket {
+
+/**
+ * @class WorkerPool
+ * @brief Threads that stay alive between calls and split a batch of tasks
+ * with the calling thread, so a tick does not pay for starting threads.
+ */
+class WorkerPool {
+ public:
+  /**
+   * @param p_workers The amount of threads besides the calling one.
+   */
+  explicit WorkerPool(size_t p_workers);
+  ~WorkerPool();
+
+  WorkerPool(const WorkerPool&) = delete;
+  WorkerPool& operator=(const WorkerPool&) = delete;
+
+  /**
+   * @brief Runs `p_task(i)` for every `i` below `p_count` on the workers and
+   * the calling thread. Returns once all tasks are done, only one thread may
+   * run tasks at a time.
+   */
+  void run(size_t p_count, const std::function<void(size_t)>& p_task);
+
+  size_t getWorkerCount() const;
+
+ private:
+  void work();
+  // runs unclaimed tasks of the current batch, the lock is held in between
+  void claimTasks(std::unique_lock<std::mutex>& p_lock);
+
+  std::vector<std::thread> m_threads;
+  std::mutex m_mutex;
+  std::condition_variable m_wake;
+  std::condition_variable m_done;
+  const std::function<void(size_t)>* m_task = nullptr;
+  size_t m_count = 0;
+  size_t m_next = 0;
+  size_t m_finished = 0;
+  uint64_t m_batch = 0;
+  bool m_stopping = false;
+};
+
+}  // namespace ProjectStockMarket
@@ -1,4 +1,5 @@
 #include <pybind11/chrono.h>
+#include <pybind11/numpy.h>
 #include <pybind11/pybind11.h>
 #include <pybind11/stl.h>
 #include <pybind11/stl_bind.h>
@@ -7,63 +8,323 @@
 #include "db_connector.hpp"
 #include "exception_classes.hpp"
 #include "market_place.hpp"
+#include "order.hpp"
 #include "product.hpp"
 #include "product_entry.hpp"
 #include "record.hpp"
+#include "record_batch.hpp"
+#include "session_cache.hpp"
+#include "snapshot.hpp"
+#include "statement_cache.hpp"
 #include "user.hpp"
 
 namespace py = pybind11;
 namespace sm = ProjectStockMarket;
 
+// everything that may wait for the database releases the GIL, so other python
+// threads keep running while sqlite works
+using release_gil = py::call_guard<py::gil_scoped_release>;
+
+// read only numpy view on a column of `owner`, the buffer is not copied and
+// stays alive as long as any view on it
+template <typename T>
+py::array_t<T> columnView(const std::vector<T>& column, py::handle owner) {
+  py::array_t<T> view(column.size(), column.data(), owner);
+  view.attr("setflags")(py::arg("write") = false);
+  return view;
+}
+
 PYBIND11_MODULE(market_logic, m) {
   m.doc() = "market_logic";
   py::class_<sm::Record>(m, "Record")
       .def(py::init<sm::time_point, int>())
       .def_readwrite("date", &sm::Record::dateTime)
-      .def_readwrite("value", &sm::Record::price);
+      .def_readwrite("value", &sm::Record::price)
+      .def_readonly("cursor", &sm::Record::cursor);
+
+  // responses are encoded in C++ without an object per record, only the
+  // encoded bytes are handed to python
+  py::class_<sm::RecordBatch>(m, "RecordBatch")
+      .def("__len__", &sm::RecordBatch::size)
+      .def("to_json",
+           [](const sm::RecordBatch& batch) {
+             std::string json;
+             {
+               py::gil_scoped_release release;
+               json = batch.toJson();
+             }
+             return py::bytes(json);
+           })
+      .def("to_binary", [](const sm::RecordBatch& batch) {
+        std::string binary;
+        {
+          py::gil_scoped_release release;
+          binary = batch.toBinary();
+        }
+        return py::bytes(binary);
+      });
+
+  // columns moved into python keep their C++ buffers, numpy arrays are views
+  // on them instead of one python object per record
+  py::class_<sm::RecordColumns>(m, "RecordColumns")
+      .def_readonly("product_id", &sm::RecordColumns::productId)
+      .def_property_readonly(
+          "timestamps",
+          [](py::object self) {
+            return columnView(self.cast<const sm::RecordColumns&>().timestamps,
+                              self);
+          })
+      .def_property_readonly("prices",
+                             [](py::object self) {
+                               return columnView(
+                                   self.cast<const sm::RecordColumns&>().prices,
+                                   self);
+                             })
+      .def_property_readonly(
+          "cursors",
+          [](py::object self) {
+            return columnView(self.cast<const sm::RecordColumns&>().cursors,
+                              self);
+          })
+      .def("__len__", [](const sm::RecordColumns& columns) {
+        return columns.prices.size();
+      });
+
+  py::class_<sm::Candle>(m, "Candle")
+      .def_readonly("start", &sm::Candle::start)
+      .def_readonly("open", &sm::Candle::open)
+      .def_readonly("high", &sm::Candle::high)
+      .def_readonly("low", &sm::Candle::low)
+      .def_readonly("close", &sm::Candle::close)
+      .def_readonly("count", &sm::Candle::count);
+
+  py::class_<sm::PriceUpdate>(m, "PriceUpdate")
+      .def_readonly("product_id", &sm::PriceUpdate::productId)
+      .def_readonly("record", &sm::PriceUpdate::record);
+
+  py::class_<sm::Tick>(m, "Tick")
+      .def_readonly("sequence", &sm::Tick::sequence)
+      .def_readonly("updates", &sm::Tick::updates);
+
+  py::enum_<sm::OverrunPolicy>(m, "OverrunPolicy")
+      .value("SKIP", sm::OverrunPolicy::Skip)
+      .value("CATCH_UP", sm::OverrunPolicy::CatchUp);
+
+  py::class_<sm::TimerStats>(m, "TimerStats")
+      .def_readonly("ticks", &sm::TimerStats::ticks)
+      .def_readonly("overruns", &sm::TimerStats::overruns)
+      .def_readonly("skipped", &sm::TimerStats::skipped)
+      .def_readonly("last_lag", &sm::TimerStats::lastLag)
+      .def_readonly("max_lag", &sm::TimerStats::maxLag)
+      .def_readonly("bucket_bounds", &sm::TimerStats::bucketBounds)
+      .def_readonly("duration_histogram", &sm::TimerStats::durationHistogram);
+
+  py::class_<sm::BackfillReport>(m, "BackfillReport")
+      .def_readonly("ticks", &sm::BackfillReport::ticks)
+      .def_readonly("prices", &sm::BackfillReport::prices)
+      .def_readonly("records", &sm::BackfillReport::records)
+      .def_readonly("simulation_time", &sm::BackfillReport::simulationTime)
+      .def_readonly("persist_time", &sm::BackfillReport::persistTime)
+      .def_property_readonly("prices_per_second",
+                             &sm::BackfillReport::pricesPerSecond)
+      .def_property_readonly("records_per_second",
+                             &sm::BackfillReport::recordsPerSecond);
 
   py::class_<sm::Product>(m, "Product")
       .def(py::init<int, std::string>())
       .def_property_readonly("name", &sm::Product::getName)
       .def_property_readonly("id", &sm::Product::getId)
-      .def("get_all_records", &sm::Product::getAllRecords)
-      .def("get_records", &sm::Product::getRecords);
+      .def_property_readonly(
+          "current_price",
+          py::cpp_function(&sm::Product::getCurrentPrice, release_gil()))
+      .def("get_all_records", &sm::Product::getAllRecords, release_gil())
+      .def("get_records", &sm::Product::getRecords, release_gil())
+      .def("get_records_after", &sm::Product::getRecordsAfter,
+           py::arg("cursor"), release_gil())
+      .def("get_candles", &sm::Product::getCandles, py::arg("from_"),
+           py::arg("to"), py::arg("interval"), release_gil())
+      .def(
+          "get_record_batch",
+          [](const sm::Product& product, sm::time_point from,
+             sm::time_point to) {
+            return sm::RecordBatch::fromRecords(product.getId(),
+                                                product.getRecords(from, to));
+          },
+          py::arg("from_"), py::arg("to"), release_gil())
+      .def(
+          "get_record_batch_after",
+          [](const sm::Product& product, int64_t cursor) {
+            return sm::RecordBatch::fromRecords(
+                product.getId(), product.getRecordsAfter(cursor));
+          },
+          py::arg("cursor"), release_gil())
+      .def(
+          "get_record_columns",
+          [](const sm::Product& product, sm::time_point from,
+             sm::time_point to) {
+            return std::move(sm::RecordBatch::fromRecords(
+                                 product.getId(), product.getRecords(from, to))
+                                 .takeColumns()
+                                 .front());
+          },
+          py::arg("from_"), py::arg("to"), release_gil())
+      .def(
+          "get_record_columns_after",
+          [](const sm::Product& product, int64_t cursor) {
+            return std::move(
+                sm::RecordBatch::fromRecords(product.getId(),
+                                             product.getRecordsAfter(cursor))
+                    .takeColumns()
+                    .front());
+          },
+          py::arg("cursor"), release_gil());
 
   py::class_<sm::ProductEntry>(m, "ProductEntry")
       .def(py::init<sm::Product, int>())
       .def_readwrite("product", &sm::ProductEntry::product)
       .def_readwrite("amount", &sm::ProductEntry::count);
 
+  py::enum_<sm::OrderSide>(m, "OrderSide")
+      .value("BUY", sm::OrderSide::Buy)
+      .value("SELL", sm::OrderSide::Sell);
+
+  py::class_<sm::Order>(m, "Order")
+      .def(py::init<int, sm::OrderSide, int>(), py::arg("product_id"),
+           py::arg("side"), py::arg("amount"))
+      .def_readwrite("product_id", &sm::Order::productId)
+      .def_readwrite("side", &sm::Order::side)
+      .def_readwrite("amount", &sm::Order::amount);
+
+  py::class_<sm::Fill>(m, "Fill")
+      .def_readonly("product_id", &sm::Fill::productId)
+      .def_readonly("side", &sm::Fill::side)
+      .def_readonly("amount", &sm::Fill::amount)
+      .def_readonly("price", &sm::Fill::price)
+      .def_readonly("total", &sm::Fill::total);
+
   py::class_<sm::User>(m, "User")
       .def(py::init<int, std::string, int>())
       .def_property_readonly("id", &sm::User::getId)
       .def_property_readonly("name", &sm::User::getName)
       .def_property_readonly("balance", &sm::User::getBalance)
-      .def("get_inventory", &sm::User::getInventory)
-      .def("buy_product", &sm::User::buyProduct)
-      .def("sell_product", &sm::User::sellProduct);
+      .def("get_inventory", &sm::User::getInventory, release_gil())
+      .def("buy_product", &sm::User::buyProduct, release_gil())
+      .def("sell_product", &sm::User::sellProduct, release_gil())
+      .def("execute_orders", &sm::User::executeOrders, py::arg("orders"),
+           release_gil());
+
+  py::class_<sm::Snapshot>(m, "Snapshot")
+      .def_readonly("user", &sm::Snapshot::user)
+      .def_readonly("inventory", &sm::Snapshot::inventory)
+      .def_readonly("market", &sm::Snapshot::market)
+      .def_readonly("prices", &sm::Snapshot::prices)
+      .def_readonly("records", &sm::Snapshot::records);
 
   py::class_<sm::MarketPlace>(m, "MarketPlace")
-      .def(py::init<int, bool>())
-      .def("get_inventory", &sm::MarketPlace::getInventory)
-      .def("get_all_products", &sm::MarketPlace::getAllProducts);
+      .def(py::init<int, bool, std::optional<uint64_t>>(),
+           py::arg("limit_record_entries"), py::arg("try_generate_products"),
+           py::arg("price_seed") = std::nullopt, release_gil())
+      .def("get_inventory", &sm::MarketPlace::getInventory, release_gil())
+      .def("get_all_products", &sm::MarketPlace::getAllProducts, release_gil())
+      .def("get_records", &sm::MarketPlace::getRecords, py::arg("product_ids"),
+           py::arg("since"), release_gil())
+      .def("get_records_after", &sm::MarketPlace::getRecordsAfter,
+           py::arg("product_ids"), py::arg("cursor"), release_gil())
+      .def("get_snapshot", &sm::MarketPlace::getSnapshot, py::arg("user"),
+           py::arg("records_since") = std::nullopt, release_gil())
+      .def(
+          "get_record_batch",
+          [](sm::MarketPlace& market, const std::vector<int>& product_ids,
+             sm::time_point since) {
+            return sm::RecordBatch::fromUpdates(
+                market.getRecords(product_ids, since), product_ids);
+          },
+          py::arg("product_ids"), py::arg("since"), release_gil())
+      .def(
+          "get_record_batch_after",
+          [](sm::MarketPlace& market, const std::vector<int>& product_ids,
+             int64_t cursor) {
+            return sm::RecordBatch::fromUpdates(
+                market.getRecordsAfter(product_ids, cursor), product_ids);
+          },
+          py::arg("product_ids"), py::arg("cursor"), release_gil())
+      .def(
+          "get_record_columns",
+          [](sm::MarketPlace& market, const std::vector<int>& product_ids,
+             sm::time_point since) {
+            return sm::RecordBatch::fromUpdates(
+                       market.getRecords(product_ids, since), product_ids)
+                .takeColumns();
+          },
+          py::arg("product_ids"), py::arg("since"), release_gil())
+      .def(
+          "get_record_columns_after",
+          [](sm::MarketPlace& market, const std::vector<int>& product_ids,
+             int64_t cursor) {
+            return sm::RecordBatch::fromUpdates(
+                       market.getRecordsAfter(product_ids, cursor), product_ids)
+                .takeColumns();
+          },
+          py::arg("product_ids"), py::arg("cursor"), release_gil())
+      .def_property_readonly("catalog_version",
+                             &sm::MarketPlace::getCatalogVersion)
+      .def_property_readonly("inventory_version",
+                             &sm::MarketPlace::getInventoryVersion)
+      .def_property_readonly("tick_sequence", &sm::MarketPlace::getTickSequence)
+      .def_property_readonly("last_tick_duration",
+                             &sm::MarketPlace::getLastTickDuration)
+      .def_property("tick_period", &sm::MarketPlace::getTickPeriod,
+                    &sm::MarketPlace::setTickPeriod)
+      .def_property("overrun_policy", &sm::MarketPlace::getOverrunPolicy,
+                    &sm::MarketPlace::setOverrunPolicy)
+      .def_property_readonly("timer_stats", &sm::MarketPlace::getTimerStats)
+      // both wait for a running price update
+      .def_property(
+          "price_shards",
+          py::cpp_function(&sm::MarketPlace::getPriceShards, release_gil()),
+          py::cpp_function(&sm::MarketPlace::setPriceShards, release_gil()))
+      .def("wait_for_tick", &sm::MarketPlace::waitForTick, py::arg("after"),
+           py::arg("timeout"), release_gil())
+      .def("seed_prices", &sm::MarketPlace::seedPrices, py::arg("seed"),
+           release_gil())
+      .def("backfill", &sm::MarketPlace::backfill, py::arg("history"),
+           py::arg("period"), py::arg("batch_size") = 100000, release_gil());
 
   // hier kein "&" vor DBConnector weil statische Funktionen ka, ob das klappt .
   // wenn irgendwas bricht dann wahrscheinlich hier
-  m.def("get_product", sm::DBConnector::getProduct);
-  m.def("get_user", sm::DBConnector::getUser);
-  m.def("init_database", sm::DBConnector::initDB);
+  m.def("get_product", sm::DBConnector::getProduct, release_gil());
+  m.def("get_user", sm::DBConnector::getUser, release_gil());
+  m.def("init_database", sm::DBConnector::initDB, py::arg("path"),
+        py::arg("readers") = -1, release_gil());
+  m.def("db_reader_count", sm::DBConnector::getReaderCount);
 
   py::class_<sm::Account>(m, "Account")
       .def(py::init<std::string, std::string>())
       .def_readwrite("username", &sm::Account::username)
       .def_readwrite("password", &sm::Account::password);
 
-  m.def("db_verify_credentials", sm::DBConnector::verifyCredentials);
-  m.def("db_register_account", sm::DBConnector::registerAccount);
-  m.def("db_add_token", sm::DBConnector::addToken);
-  m.def("db_remove_token", sm::DBConnector::removeToken);
-  m.def("db_get_user_by_token", sm::DBConnector::getUserByToken);
+  m.def("db_verify_credentials", sm::DBConnector::verifyCredentials,
+        release_gil());
+  m.def("db_register_account", sm::DBConnector::registerAccount, release_gil());
+  m.def("db_add_token", sm::DBConnector::addToken, release_gil());
+  m.def("db_remove_token", sm::DBConnector::removeToken, release_gil());
+  m.def("db_get_user_by_token", sm::DBConnector::getUserByToken, release_gil());
+
+  py::class_<sm::StatementCacheStats>(m, "StatementCacheStats")
+      .def_readonly("hits", &sm::StatementCacheStats::hits)
+      .def_readonly("misses", &sm::StatementCacheStats::misses);
+
+  m.def("db_statement_cache_stats", sm::StatementCache::getStats);
+  m.def("db_reset_statement_cache_stats", sm::StatementCache::resetStats);
+
+  py::class_<sm::SessionCacheStats>(m, "SessionCacheStats")
+      .def_readonly("hits", &sm::SessionCacheStats::hits)
+      .def_readonly("misses", &sm::SessionCacheStats::misses)
+      .def_readonly("size", &sm::SessionCacheStats::size);
+
+  m.def("configure_session_cache", sm::SessionCache::configure, py::arg("ttl"),
+        py::arg("capacity"));
+  m.def("session_cache_stats", sm::SessionCache::getStats);
 
   // py::class_<sm::ProductNotFound>(m, "ProductNotFound")
   //     .def(py::init<std::string>());
@@ -0,0 +1,102 @@
+#include "connection_pool.hpp"
+
+#include <algorithm>
+
+namespace ProjectStockMarket {
+
+thread_local int ConnectionPool::t_writer_depth = 0;
+
+Connection::Connection(const std::string& p_path, int p_flags)
+    : database(p_path, p_flags), statements(database) {
+  database.exec("PRAGMA busy_timeout = 5000;");
+}
+
+ConnectionLease::ConnectionLease(ConnectionPool& p_pool)
+    : m_pool(p_pool), m_generation(0) {
+  m_pool.m_writer_mutex.lock();
+  ConnectionPool::t_writer_depth++;
+  m_connection = m_pool.m_writer.get();
+}
+
+ConnectionLease::ConnectionLease(ConnectionPool& p_pool,
+                                 std::unique_ptr<Connection> p_reader,
+                                 uint64_t p_generation)
+    : m_pool(p_pool),
+      m_connection(p_reader.get()),
+      m_reader(std::move(p_reader)),
+      m_generation(p_generation) {}
+
+ConnectionLease::~ConnectionLease() {
+  if (m_reader) {
+    m_pool.releaseReader(std::move(m_reader), m_generation);
+  } else {
+    m_pool.releaseWriter();
+  }
+}
+
+SQLite::Database& ConnectionLease::database() { return m_connection->database; }
+
+CachedStatement ConnectionLease::statement(const std::string& p_query) {
+  return m_connection->statements.get(p_query);
+}
+
+void ConnectionPool::open(const std::string& p_path, int p_readers) {
+  std::lock_guard<std::recursive_mutex> writer_lock(m_writer_mutex);
+  std::lock_guard<std::mutex> reader_lock(m_reader_mutex);
+  m_idle_readers.clear();
+  m_generation++;
+  m_writer.reset();
+  m_writer = std::make_unique<Connection>(
+      p_path, SQLite::OPEN_READWRITE | SQLite::OPEN_CREATE);
+  m_writer->database.exec("PRAGMA journal_mode = WAL;");
+
+  // every connection to an in-memory database opens its own database
+  bool in_memory = p_path.empty() || p_path == ":memory:" ||
+                   p_path.find("mode=memory") != std::string::npos;
+  m_reader_count = in_memory ? 0 : std::max(p_readers, 0);
+  for (int i = 0; i < m_reader_count; i++) {
+    m_idle_readers.push_back(
+        std::make_unique<Connection>(p_path, SQLite::OPEN_READONLY));
+  }
+}
+
+ConnectionLease ConnectionPool::writer() { return ConnectionLease(*this); }
+
+ConnectionLease ConnectionPool::reader() {
+  if (t_writer_depth > 0) {
+    return ConnectionLease(*this);
+  }
+  std::unique_lock<std::mutex> lock(m_reader_mutex);
+  if (m_reader_count == 0) {
+    lock.unlock();
+    return ConnectionLease(*this);
+  }
+  m_reader_returned.wait(lock, [this]() { return !m_idle_readers.empty(); });
+  std::unique_ptr<Connection> reader = std::move(m_idle_readers.back());
+  m_idle_readers.pop_back();
+  return ConnectionLease(*this, std::move(reader), m_generation);
+}
+
+int ConnectionPool::getReaderCount() {
+  std::lock_guard<std::mutex> lock(m_reader_mutex);
+  return m_reader_count;
+}
+
+void ConnectionPool::releaseWriter() {
+  t_writer_depth--;
+  m_writer_mutex.unlock();
+}
+
+void ConnectionPool::releaseReader(std::unique_ptr<Connection> p_reader,
+                                   uint64_t p_generation) {
+  {
+    std::lock_guard<std::mutex> lock(m_reader_mutex);
+    if (p_generation != m_generation) {
+      return;  // the database was reopened, the reader is closed
+    }
+    m_idle_readers.push_back(std::move(p_reader));
+  }
+  m_reader_returned.notify_one();
+}
+
+}  // namespace ProjectStockMarket
@@ -3,73 +3,83 @@
 #include <chrono>
 
 #include "exception_classes.hpp"
+#include "order_flow.hpp"
+#include "price_board.hpp"
+#include "session_cache.hpp"
 
 // #include <format>
+#include <algorithm>
 #include <cmath>
 #include <functional>
-#include <iomanip>
 #include <iostream>
 #include <stdexcept>
 #include <thread>
 
 namespace ProjectStockMarket {
 
-std::string to_iso_string(const time_point& tp) {
-  auto in_time_t = std::chrono::system_clock::to_time_t(tp);
-  std::tm tm = *std::gmtime(&in_time_t);
-  char buffer[30];
-  std::strftime(buffer, sizeof(buffer), "%Y-%m-%dT%H:%M:%S%z", &tm);
-  return std::string(buffer);
-}
-
-time_point from_iso_string(const std::string& iso_string) {
-  std::istringstream in{iso_string};
-  std::tm tm = {};
-  in >> std::get_time(&tm, "%Y-%m-%dT%H:%M:%S%z");
-  return std::chrono::system_clock::from_time_t(std::mktime(&tm));
-}
-
-std::unique_ptr<SQLite::Database> DBConnector::m_database = nullptr;
+ConnectionPool DBConnector::m_pool;
+std::mutex DBConnector::m_catalog_mutex;
+std::shared_ptr<const DBConnector::ProductCatalog> DBConnector::m_catalog;
+std::atomic<uint64_t> DBConnector::m_catalog_version{0};
+std::atomic<uint64_t> DBConnector::m_inventory_version{0};
+std::mutex DBConnector::m_slot_mutex;
+int DBConnector::m_record_limit = 0;
+std::unordered_map<int, int> DBConnector::m_next_slot;
 // statically initializes the class without having an instance of it
-void DBConnector::initDB(std::string path) {
+void DBConnector::initDB(std::string path, int readers) {
   std::cout << "trying to initialize database...";
-  m_database = std::make_unique<SQLite::Database>(
-      path, SQLite::OPEN_READWRITE | SQLite::OPEN_CREATE);
+  if (readers < 0) {
+    readers = std::max(1u, std::thread::hardware_concurrency());
+  }
+  m_pool.open(path, readers);
+  ConnectionLease db = m_pool.writer();
   std::cout << " -> " << path << " Initialized!" << std::endl;
-  m_database->exec("PRAGMA busy_timeout = 5000;");
-  m_database->exec("PRAGMA journal_mode = WAL;");
   createTables();
+  invalidateCatalog();
+  PriceBoard::clear();
+  SessionCache::clear();
+  OrderFlow::clear();
+  {
+    std::lock_guard<std::mutex> lock(m_slot_mutex);
+    m_record_limit = 0;
+    m_next_slot.clear();
+  }
 }
 
+int DBConnector::getReaderCount() { return m_pool.getReaderCount(); }
+
 void DBConnector::createTables() {
+  ConnectionLease db = m_pool.writer();
   try {
     // Account
-    m_database->exec(
+    db.database().exec(
         "CREATE TABLE IF NOT EXISTS Account ("
         "id INTEGER PRIMARY KEY AUTOINCREMENT, "
         "username TEXT NOT NULL UNIQUE, "
         "password TEXT NOT NULL, "
         "token TEXT);");
+    db.database().exec(
+        "CREATE INDEX IF NOT EXISTS Account_token ON Account (token);");
     // User
-    m_database->exec(
+    db.database().exec(
         "CREATE TABLE IF NOT EXISTS User ("
         "id INTEGER PRIMARY KEY, "
         "name TEXT NOT NULL, "
         "balance INTEGER NOT NULL, "
         "FOREIGN KEY(id) REFERENCES Account(id));");
     // Product
-    m_database->exec(
+    db.database().exec(
         "CREATE TABLE IF NOT EXISTS Product ("
         "id INTEGER PRIMARY KEY AUTOINCREMENT, "
         "name TEXT NOT NULL UNIQUE);");
     // Marketplace
-    m_database->exec(
+    db.database().exec(
         "CREATE TABLE IF NOT EXISTS Marketplace ("
         "product_id INTEGER, "
         "count INTEGER NOT NULL, "
         "FOREIGN KEY(product_id) REFERENCES Product(id));");
     // Inventory
-    m_database->exec(
+    db.database().exec(
         "CREATE TABLE IF NOT EXISTS Inventory ("
         "user_id INTEGER, "
         "product_id INTEGER, "
@@ -78,47 +88,183 @@ void DBConnector::createTables() {
         "FOREIGN KEY(product_id) REFERENCES Product(id), "
         "PRIMARY KEY(user_id, product_id));");
     // PriceRecord
-    // datetime in ISO 8601 format
-    m_database->exec(
+    // datetime in milliseconds since the unix epoch (UTC)
+    // slot is the position of the record in the ring buffer of its product
+    db.database().exec(
         "CREATE TABLE IF NOT EXISTS PriceRecord ("
         "entry_num INTEGER PRIMARY KEY AUTOINCREMENT,"
         "product_id INTEGER, "
-        "date_time TEXT NOT NULL, "
+        "date_time INTEGER NOT NULL, "
         "price INTEGER NOT NULL, "
+        "slot INTEGER, "
         "FOREIGN KEY(product_id) REFERENCES Product(id));");
+    migratePriceRecordTimestamps();
+    migratePriceRecordSlots();
+    // covers range scans and latest price lookups without touching the table
+    db.database().exec(
+        "CREATE INDEX IF NOT EXISTS PriceRecord_product_time "
+        "ON PriceRecord (product_id, date_time, price);");
+    db.database().exec(
+        "CREATE UNIQUE INDEX IF NOT EXISTS PriceRecord_product_slot "
+        "ON PriceRecord (product_id, slot);");
+    // covers incremental fetches after a cursor
+    db.database().exec(
+        "CREATE INDEX IF NOT EXISTS PriceRecord_product_entry "
+        "ON PriceRecord (product_id, entry_num, date_time, price);");
   } catch (const SQLite::Exception& e) {
     throw std::runtime_error("Failed to create tables: " +
                              std::string(e.what()));
   }
 }
 
-void DBConnector::addPriceRecordLimitTrigger(int limit) {
+void DBConnector::migratePriceRecordTimestamps() {
+  ConnectionLease db = m_pool.writer();
+  CachedStatement column_type = db.statement(
+      "SELECT type FROM pragma_table_info('PriceRecord') "
+      "WHERE name = 'date_time'");
+  if (!column_type.executeStep() ||
+      column_type.getColumn(0).getString() != "TEXT") {
+    return;
+  }
+  column_type.reset();
+
+  // databases created before the switch store ISO 8601 text in UTC
+  // (YYYY-MM-DDTHH:MM:SS+0000), the first 19 characters can be parsed by
+  // sqlite directly
+  SQLite::Transaction transaction(db.database());
+  db.database().exec("ALTER TABLE PriceRecord RENAME TO PriceRecord_text;");
+  db.database().exec(
+      "CREATE TABLE PriceRecord ("
+      "entry_num INTEGER PRIMARY KEY AUTOINCREMENT,"
+      "product_id INTEGER, "
+      "date_time INTEGER NOT NULL, "
+      "price INTEGER NOT NULL, "
+      "FOREIGN KEY(product_id) REFERENCES Product(id));");
+  db.database().exec(
+      "INSERT INTO PriceRecord (entry_num, product_id, date_time, price) "
+      "SELECT entry_num, product_id, "
+      "CAST(strftime('%s', substr(date_time, 1, 19)) AS INTEGER) * 1000, "
+      "price FROM PriceRecord_text;");
+  db.database().exec("DROP TABLE PriceRecord_text;");
+  transaction.commit();
+}
+
+void DBConnector::migratePriceRecordSlots() {
+  ConnectionLease db = m_pool.writer();
+  CachedStatement slot_column = db.statement(
+      "SELECT 1 FROM pragma_table_info('PriceRecord') WHERE name = 'slot'");
+  if (slot_column.executeStep()) {
+    return;
+  }
+  slot_column.reset();
+  // slots are assigned by setRecordLimit
+  db.database().exec("ALTER TABLE PriceRecord ADD COLUMN slot INTEGER;");
+}
+
+void DBConnector::setRecordLimit(int limit) {
+  ConnectionLease db = m_pool.writer();
+  if (limit <= 0) {
+    throw std::invalid_argument("Record limit must be positive");
+  }
   try {
-    SQLite::Statement query(*m_database,
-                            "CREATE TRIGGER IF NOT EXISTS prune_records "
-                            "AFTER INSERT ON PriceRecord "
-                            "FOR EACH ROW "
-                            "BEGIN "
-                            "DELETE FROM PriceRecord WHERE rowid IN ("
-                            "SELECT entry_num FROM PriceRecord "
-                            "WHERE product_id = NEW.product_id "
-                            "ORDER BY date_time DESC "
-                            "LIMIT -1 OFFSET " +
-                                std::to_string(limit) +
-                                ");"
-                                "END;");
-    query.exec();
+    // older databases prune with a trigger that sorts on every insert
+    db.database().exec("DROP TRIGGER IF EXISTS prune_records;");
+
+    std::lock_guard<std::mutex> lock(m_slot_mutex);
+    m_record_limit = limit;
+    if (!loadRecordSlots()) {
+      reslotRecords();
+      loadRecordSlots();
+    }
   } catch (const SQLite::Exception& e) {
-    throw std::runtime_error("Failed to add trigger: " + std::string(e.what()));
+    throw std::runtime_error("Failed to set record limit: " +
+                             std::string(e.what()));
+  }
+}
+
+bool DBConnector::loadRecordSlots() {
+  ConnectionLease db = m_pool.writer();
+  m_next_slot.clear();
+  CachedStatement query = db.statement(
+      "SELECT product_id, COUNT(*), COUNT(slot), MAX(slot), "
+      "(SELECT slot FROM PriceRecord AS newest "
+      "WHERE newest.product_id = PriceRecord.product_id "
+      "ORDER BY entry_num DESC LIMIT 1) "
+      "FROM PriceRecord GROUP BY product_id");
+  while (query.executeStep()) {
+    int product_id = query.getColumn(0).getInt();
+    int count = query.getColumn(1).getInt();
+    int slotted = query.getColumn(2).getInt();
+    int max_slot = query.getColumn(3).getInt();
+    int newest_slot = query.getColumn(4).getInt();
+
+    bool unslotted = slotted < count;
+    bool over_limit = count > m_record_limit || max_slot >= m_record_limit;
+    // the ring wrapped around with a smaller limit, so it can not grow in place
+    bool wrapped = count < m_record_limit && newest_slot != count - 1;
+    if (unslotted || over_limit || wrapped) {
+      return false;
+    }
+    m_next_slot[product_id] = (newest_slot + 1) % m_record_limit;
+  }
+  return true;
+}
+
+void DBConnector::reslotRecords() {
+  ConnectionLease db = m_pool.writer();
+  SQLite::Transaction transaction(db.database());
+  db.database().exec(
+      "DELETE FROM PriceRecord WHERE entry_num IN ("
+      "SELECT entry_num FROM ("
+      "SELECT entry_num, ROW_NUMBER() OVER ("
+      "PARTITION BY product_id ORDER BY entry_num DESC) AS age "
+      "FROM PriceRecord) WHERE age > " +
+      std::to_string(m_record_limit) + ");");
+  // clear first so renumbering never collides with the unique index
+  db.database().exec("UPDATE PriceRecord SET slot = NULL;");
+  db.database().exec(
+      "UPDATE PriceRecord SET slot = ranked.position - 1 FROM ("
+      "SELECT entry_num, ROW_NUMBER() OVER ("
+      "PARTITION BY product_id ORDER BY entry_num) AS position "
+      "FROM PriceRecord) AS ranked "
+      "WHERE PriceRecord.entry_num = ranked.entry_num;");
+  transaction.commit();
+}
+
+void DBConnector::bindRecordSlot(CachedStatement& p_query, int p_index,
+                                 int p_product_id,
+                                 std::unordered_map<int, int>& p_slots) {
+  std::lock_guard<std::mutex> lock(m_slot_mutex);
+  if (m_record_limit <= 0) {
+    p_query.bind(p_index);
+    return;
+  }
+  auto [slot, added] = p_slots.try_emplace(p_product_id, 0);
+  if (added) {
+    auto committed = m_next_slot.find(p_product_id);
+    if (committed != m_next_slot.end()) {
+      slot->second = committed->second;
+    }
+  }
+  p_query.bind(p_index, slot->second);
+  slot->second = (slot->second + 1) % m_record_limit;
+}
+
+void DBConnector::commitRecordSlots(
+    const std::unordered_map<int, int>& p_slots) {
+  std::lock_guard<std::mutex> lock(m_slot_mutex);
+  for (const auto& [product_id, slot] : p_slots) {
+    m_next_slot[product_id] = slot;
   }
 }
 
 void DBConnector::registerAccount(const Account& account,
                                   const std::string& display_name) {
+  ConnectionLease db = m_pool.writer();
   // Check if account already exists
   try {
-    SQLite::Statement check_account(
-        *m_database, "SELECT id FROM Account WHERE username = ?");
+    CachedStatement check_account =
+        db.statement("SELECT id FROM Account WHERE username = ?");
     check_account.bind(1, account.username);
     if (check_account.executeStep()) {
       throw AccountAlreadyExists("Account already exists");
@@ -129,8 +275,8 @@ void DBConnector::registerAccount(const Account& account,
   }
   // Register account
   try {
-    SQLite::Statement query(
-        *m_database, "INSERT INTO Account (username, password) VALUES (?, ?)");
+    CachedStatement query =
+        db.statement("INSERT INTO Account (username, password) VALUES (?, ?)");
     query.bind(1, account.username);
     query.bind(2, account.password);
     query.exec();
@@ -141,9 +287,9 @@ void DBConnector::registerAccount(const Account& account,
 
   // add corresponding user
   try {
-    SQLite::Statement query(
-        *m_database, "INSERT INTO User (id, name, balance) VALUES (?, ?, ?)");
-    query.bind(1, m_database->getLastInsertRowid());
+    CachedStatement query =
+        db.statement("INSERT INTO User (id, name, balance) VALUES (?, ?, ?)");
+    query.bind(1, db.database().getLastInsertRowid());
     query.bind(2, display_name);
     query.bind(3, 1000);  // INITIAL_BALANCE
     query.exec();
@@ -153,9 +299,14 @@ void DBConnector::registerAccount(const Account& account,
 }
 
 User DBConnector::getUser(int p_user_id) {
+  ConnectionLease db = m_pool.reader();
+  return queryUser(db, p_user_id);
+}
+
+User DBConnector::queryUser(ConnectionLease& p_db, int p_user_id) {
   try {
-    SQLite::Statement query(*m_database,
-                            "SELECT name, balance FROM User WHERE id = ?");
+    CachedStatement query =
+        p_db.statement("SELECT name, balance FROM User WHERE id = ?");
     query.bind(1, p_user_id);
 
     if (query.executeStep()) {
@@ -172,13 +323,15 @@ User DBConnector::getUser(int p_user_id) {
 }
 
 void DBConnector::updateUser(const User& p_user) {
+  ConnectionLease db = m_pool.writer();
   try {
-    SQLite::Statement query(
-        *m_database, "UPDATE User SET name = ?, balance = ? WHERE id = ?");
+    CachedStatement query =
+        db.statement("UPDATE User SET name = ?, balance = ? WHERE id = ?");
     query.bind(1, p_user.getName());
     query.bind(2, p_user.getBalance());
     query.bind(3, p_user.getId());
     query.exec();
+    SessionCache::updateUser(p_user);
   } catch (const SQLite::Exception& e) {
     throw std::runtime_error("Failed to update user: " + std::string(e.what()));
   }
@@ -186,28 +339,79 @@ void DBConnector::updateUser(const User& p_user) {
 
 Product DBConnector::addProduct(const std::string& p_product_name,
                                 int p_count) {
+  ConnectionLease db = m_pool.writer();
   try {
-    SQLite::Statement query(*m_database,
-                            "INSERT INTO Product (name) VALUES (?)");
+    CachedStatement query =
+        db.statement("INSERT INTO Product (name) VALUES (?)");
     query.bind(1, p_product_name);
     query.exec();
 
-    SQLite::Statement addProductToMarket(
-        *m_database,
+    CachedStatement addProductToMarket = db.statement(
         "INSERT INTO Marketplace (product_id, count) VALUES (?, ?)");
-    addProductToMarket.bind(1, m_database->getLastInsertRowid());
+    addProductToMarket.bind(1, db.database().getLastInsertRowid());
     addProductToMarket.bind(2, p_count);
     addProductToMarket.exec();
 
-    return Product(m_database->getLastInsertRowid(), p_product_name);
+    Product product(db.database().getLastInsertRowid(), p_product_name);
+    invalidateCatalog();
+    return product;
   } catch (const SQLite::Exception& e) {
     throw std::runtime_error("Failed to add product: " + std::string(e.what()));
   }
 }
 
+std::shared_ptr<const DBConnector::ProductCatalog> DBConnector::getCatalog() {
+  std::shared_ptr<const ProductCatalog> catalog = std::atomic_load(&m_catalog);
+  if (catalog) {
+    return catalog;
+  }
+
+  // the lease is taken first, like addProduct which invalidates while
+  // holding the writer
+  ConnectionLease db = m_pool.reader();
+  std::lock_guard<std::mutex> lock(m_catalog_mutex);
+  catalog = std::atomic_load(&m_catalog);
+  if (catalog) {  // loaded by another thread in the meantime
+    return catalog;
+  }
+  auto loaded = std::make_shared<ProductCatalog>();
+  CachedStatement query =
+      db.statement("SELECT id, name FROM Product ORDER BY id");
+  while (query.executeStep()) {
+    int id = query.getColumn(0).getInt();
+    loaded->index.emplace(id, loaded->products.size());
+    loaded->products.emplace_back(id, query.getColumn(1).getText());
+  }
+  catalog = loaded;
+  std::atomic_store(&m_catalog, catalog);
+  return catalog;
+}
+
+void DBConnector::invalidateCatalog() {
+  std::lock_guard<std::mutex> lock(m_catalog_mutex);
+  std::atomic_store(&m_catalog, std::shared_ptr<const ProductCatalog>());
+  // bumped after the change is committed, so a catalog read after seeing the
+  // new version always contains the change
+  m_catalog_version++;
+  m_inventory_version++;
+}
+
+uint64_t DBConnector::getCatalogVersion() { return m_catalog_version.load(); }
+
+uint64_t DBConnector::getInventoryVersion() {
+  return m_inventory_version.load();
+}
+
 Product DBConnector::getProduct(int p_product_id) {
-  SQLite::Statement findProductName(*m_database,
-                                    "SELECT name FROM Product WHERE id = ?");
+  std::shared_ptr<const ProductCatalog> catalog = getCatalog();
+  auto it = catalog->index.find(p_product_id);
+  if (it != catalog->index.end()) {
+    return catalog->products[it->second];
+  }
+
+  ConnectionLease db = m_pool.reader();
+  CachedStatement findProductName =
+      db.statement("SELECT name FROM Product WHERE id = ?");
   findProductName.bind(1, p_product_id);
   if (!findProductName.executeStep()) {
     throw ProductNotFound("Product not found for ID " +
@@ -218,9 +422,10 @@ Product DBConnector::getProduct(int p_product_id) {
 
 void DBConnector::updateMarketProductEntry(const Product& p_product,
                                            int p_change) {
+  ConnectionLease db = m_pool.writer();
   // Get Current Entry
-  SQLite::Statement query(
-      *m_database, "SELECT count FROM Marketplace WHERE product_id = ? ");
+  CachedStatement query =
+      db.statement("SELECT count FROM Marketplace WHERE product_id = ? ");
 
   query.bind(1, p_product.getId());
 
@@ -237,22 +442,30 @@ void DBConnector::updateMarketProductEntry(const Product& p_product,
                      " are available");
   }
 
-  SQLite::Statement updateQuery(
-      *m_database, "UPDATE Marketplace SET count = ? WHERE product_id = ?");
+  CachedStatement updateQuery =
+      db.statement("UPDATE Marketplace SET count = ? WHERE product_id = ?");
   updateQuery.bind(1, newAmount);
   updateQuery.bind(2, p_product.getId());
   updateQuery.exec();
+  m_inventory_version++;
 }
 
 std::vector<ProductEntry> DBConnector::getMarketInventory() {
+  ConnectionLease db = m_pool.reader();
+  return queryMarketInventory(db);
+}
+
+std::vector<ProductEntry> DBConnector::queryMarketInventory(
+    ConnectionLease& p_db) {
   try {
     std::vector<ProductEntry> productEntries;
-    SQLite::Statement query(*m_database,
-                            "SELECT product_id, count FROM Marketplace");
+    CachedStatement query = p_db.statement(
+        "SELECT Product.id, Product.name, Marketplace.count FROM Marketplace "
+        "JOIN Product ON Product.id = Marketplace.product_id");
     while (query.executeStep()) {
-      int id = query.getColumn(0).getInt();
-      int count = query.getColumn(1).getInt();
-      productEntries.emplace_back(getProduct(id), count);
+      productEntries.emplace_back(
+          Product(query.getColumn(0).getInt(), query.getColumn(1).getText()),
+          query.getColumn(2).getInt());
     }
     return productEntries;
   } catch (const SQLite::Exception& e) {
@@ -263,13 +476,7 @@ std::vector<ProductEntry> DBConnector::getMarketInventory() {
 
 std::vector<Product> DBConnector::getAllProducts() {
   try {
-    std::vector<Product> products;
-    SQLite::Statement query(*m_database, "SELECT id FROM Product");
-    while (query.executeStep()) {
-      int id = query.getColumn(0).getInt();
-      products.emplace_back(getProduct(id));
-    }
-    return products;
+    return getCatalog()->products;
   } catch (const SQLite::Exception& e) {
     throw std::runtime_error("Failed to get all products: " +
                              std::string(e.what()));
@@ -279,10 +486,11 @@ std::vector<Product> DBConnector::getAllProducts() {
 void DBConnector::updateUserProductEntry(const User& p_user,
                                          const Product& p_product,
                                          int p_change) {
+  ConnectionLease db = m_pool.writer();
   // Get Current Entry
-  SQLite::Statement query(*m_database,
-                          "SELECT count FROM Inventory WHERE user_id = ? AND "
-                          "product_id = ?");
+  CachedStatement query = db.statement(
+      "SELECT count FROM Inventory WHERE user_id = ? AND "
+      "product_id = ?");
   query.bind(1, p_user.getId());
   query.bind(2, p_product.getId());
 
@@ -298,24 +506,21 @@ void DBConnector::updateUserProductEntry(const User& p_user,
   } else if (currentAmount == 0 && newAmount == 0) {  // No Entry and no change
     return;
   } else if (newAmount == 0) {  // Entry exists, but new amount is 0, so delete
-    SQLite::Statement deleteQuery(
-        *m_database,
+    CachedStatement deleteQuery = db.statement(
         "DELETE FROM Inventory WHERE user_id = ? AND product_id = ?");
     deleteQuery.bind(1, p_user.getId());
     deleteQuery.bind(2, p_product.getId());
     deleteQuery.exec();
   } else if (currentAmount ==
              0) {  // Entry does not exist, new amount is more than 0, so insert
-    SQLite::Statement insertQuery(
-        *m_database,
+    CachedStatement insertQuery = db.statement(
         "INSERT INTO Inventory (user_id, product_id, count) VALUES (?, ?, ?)");
     insertQuery.bind(1, p_user.getId());
     insertQuery.bind(2, p_product.getId());
     insertQuery.bind(3, newAmount);
     insertQuery.exec();
   } else {  // Entry exists, new amount is more than 0, so update
-    SQLite::Statement updateQuery(
-        *m_database,
+    CachedStatement updateQuery = db.statement(
         "UPDATE Inventory SET count = ? WHERE user_id = ? AND product_id = "
         "?");
     updateQuery.bind(1, newAmount);
@@ -325,18 +530,231 @@ void DBConnector::updateUserProductEntry(const User& p_user,
   }
 }
 
+int DBConnector::buyProduct(const User& p_user, const Product& p_product,
+                            int p_amount, int p_price) {
+  checkTradeAmount(p_amount);
+  ConnectionLease db = m_pool.writer();
+  try {
+    // takes the write lock up front, so the conditional updates of concurrent
+    // trades are applied one after another
+    SQLite::Transaction transaction(db.database(),
+                                    SQLite::TransactionBehavior::IMMEDIATE);
+    int balance =
+        buyInTransaction(db, p_user.getId(), p_product, p_amount, p_price);
+    transaction.commit();
+    m_inventory_version++;
+    OrderFlow::recordBuy(p_product.getId(), p_amount);
+    SessionCache::updateUser(User(p_user.getId(), p_user.getName(), balance));
+    return balance;
+  } catch (const SQLite::Exception& e) {
+    throw std::runtime_error("Failed to buy product: " + std::string(e.what()));
+  }
+}
+
+int DBConnector::sellProduct(const User& p_user, const Product& p_product,
+                             int p_amount, int p_price) {
+  checkTradeAmount(p_amount);
+  ConnectionLease db = m_pool.writer();
+  try {
+    SQLite::Transaction transaction(db.database(),
+                                    SQLite::TransactionBehavior::IMMEDIATE);
+    int balance =
+        sellInTransaction(db, p_user.getId(), p_product, p_amount, p_price);
+    transaction.commit();
+    m_inventory_version++;
+    OrderFlow::recordSell(p_product.getId(), p_amount);
+    SessionCache::updateUser(User(p_user.getId(), p_user.getName(), balance));
+    return balance;
+  } catch (const SQLite::Exception& e) {
+    throw std::runtime_error("Failed to sell product: " +
+                             std::string(e.what()));
+  }
+}
+
+OrderResult DBConnector::executeOrders(const User& p_user,
+                                       const std::vector<Order>& p_orders) {
+  for (const Order& order : p_orders) {
+    checkTradeAmount(order.amount);
+  }
+  ConnectionLease db = m_pool.writer();
+  try {
+    SQLite::Transaction transaction(db.database(),
+                                    SQLite::TransactionBehavior::IMMEDIATE);
+    // ticks are committed as a whole, so with the write lock held the latest
+    // records are one consistent set of prices
+    std::unordered_map<int, int> prices;
+    for (const PriceUpdate& latest : queryLatestRecords(db)) {
+      prices.emplace(latest.productId, latest.record.price);
+    }
+
+    OrderResult result{{}, getBalance(db, p_user.getId())};
+    result.fills.reserve(p_orders.size());
+    for (const Order& order : p_orders) {
+      Product product = getProduct(order.productId);
+      auto price = prices.find(order.productId);
+      if (price == prices.end()) {
+        throw ProductNotFound("No price for product " + product.getName());
+      }
+      if (order.side == OrderSide::Buy) {
+        result.balance = buyInTransaction(db, p_user.getId(), product,
+                                          order.amount, price->second);
+      } else {
+        result.balance = sellInTransaction(db, p_user.getId(), product,
+                                           order.amount, price->second);
+      }
+      result.fills.push_back(
+          Fill{order.productId, order.side, order.amount, price->second,
+               static_cast<int64_t>(price->second) * order.amount});
+    }
+    transaction.commit();
+    m_inventory_version++;
+    for (const Fill& fill : result.fills) {
+      if (fill.side == OrderSide::Buy) {
+        OrderFlow::recordBuy(fill.productId, fill.amount);
+      } else {
+        OrderFlow::recordSell(fill.productId, fill.amount);
+      }
+    }
+    SessionCache::updateUser(
+        User(p_user.getId(), p_user.getName(), result.balance));
+    return result;
+  } catch (const SQLite::Exception& e) {
+    throw std::runtime_error("Failed to execute orders: " +
+                             std::string(e.what()));
+  }
+}
+
+int DBConnector::buyInTransaction(ConnectionLease& p_db, int p_user_id,
+                                  const Product& p_product, int p_amount,
+                                  int p_price) {
+  int64_t total_price = static_cast<int64_t>(p_price) * p_amount;
+  CachedStatement pay = p_db.statement(
+      "UPDATE User SET balance = balance - ? WHERE id = ? AND balance >= ?");
+  pay.bind(1, total_price);
+  pay.bind(2, p_user_id);
+  pay.bind(3, total_price);
+  if (pay.exec() == 0) {
+    getBalance(p_db, p_user_id);  // throws if the user does not exist
+    throw NotEnoughMoney("Insufficient balance to buy these products. " +
+                         std::to_string(total_price) + " needed.");
+  }
+
+  CachedStatement take = p_db.statement(
+      "UPDATE Marketplace SET count = count - ? "
+      "WHERE product_id = ? AND count >= ?");
+  take.bind(1, p_amount);
+  take.bind(2, p_product.getId());
+  take.bind(3, p_amount);
+  if (take.exec() == 0) {
+    CachedStatement stock =
+        p_db.statement("SELECT count FROM Marketplace WHERE product_id = ?");
+    stock.bind(1, p_product.getId());
+    if (!stock.executeStep()) {
+      throw ProductNotFound("Product " + p_product.getName() +
+                            " not found in market");
+    }
+    throw OutOfStock(
+        "Tried to buy " + std::to_string(p_amount) + " products, but only " +
+        std::to_string(stock.getColumn(0).getInt()) + " are available");
+  }
+
+  CachedStatement store = p_db.statement(
+      "INSERT INTO Inventory (user_id, product_id, count) VALUES (?, ?, ?) "
+      "ON CONFLICT (user_id, product_id) "
+      "DO UPDATE SET count = count + excluded.count");
+  store.bind(1, p_user_id);
+  store.bind(2, p_product.getId());
+  store.bind(3, p_amount);
+  store.exec();
+
+  return getBalance(p_db, p_user_id);
+}
+
+int DBConnector::sellInTransaction(ConnectionLease& p_db, int p_user_id,
+                                   const Product& p_product, int p_amount,
+                                   int p_price) {
+  CachedStatement take = p_db.statement(
+      "UPDATE Inventory SET count = count - ? "
+      "WHERE user_id = ? AND product_id = ? AND count >= ?");
+  take.bind(1, p_amount);
+  take.bind(2, p_user_id);
+  take.bind(3, p_product.getId());
+  take.bind(4, p_amount);
+  if (take.exec() == 0) {
+    CachedStatement owned = p_db.statement(
+        "SELECT count FROM Inventory WHERE user_id = ? AND product_id = ?");
+    owned.bind(1, p_user_id);
+    owned.bind(2, p_product.getId());
+    int current_amount = owned.executeStep() ? owned.getColumn(0).getInt() : 0;
+    throw NotInInventory("Tried to sell " + std::to_string(p_amount) +
+                         " products, but only " +
+                         std::to_string(current_amount) + " are available");
+  }
+
+  CachedStatement cleanup = p_db.statement(
+      "DELETE FROM Inventory WHERE user_id = ? AND product_id = ? "
+      "AND count = 0");
+  cleanup.bind(1, p_user_id);
+  cleanup.bind(2, p_product.getId());
+  cleanup.exec();
+
+  CachedStatement give = p_db.statement(
+      "UPDATE Marketplace SET count = count + ? WHERE product_id = ?");
+  give.bind(1, p_amount);
+  give.bind(2, p_product.getId());
+  if (give.exec() == 0) {
+    throw ProductNotFound("Product " + p_product.getName() +
+                          " not found in market");
+  }
+
+  CachedStatement pay =
+      p_db.statement("UPDATE User SET balance = balance + ? WHERE id = ?");
+  pay.bind(1, static_cast<int64_t>(p_price) * p_amount);
+  pay.bind(2, p_user_id);
+  if (pay.exec() == 0) {
+    throw UserNotFound("User not found for account ID " +
+                       std::to_string(p_user_id));
+  }
+
+  return getBalance(p_db, p_user_id);
+}
+
+void DBConnector::checkTradeAmount(int p_amount) {
+  if (p_amount <= 0) {
+    throw std::invalid_argument("Trade amount must be positive, got " +
+                                std::to_string(p_amount));
+  }
+}
+
+int DBConnector::getBalance(ConnectionLease& p_db, int p_user_id) {
+  CachedStatement query =
+      p_db.statement("SELECT balance FROM User WHERE id = ?");
+  query.bind(1, p_user_id);
+  if (!query.executeStep()) {
+    throw UserNotFound("User not found for account ID " +
+                       std::to_string(p_user_id));
+  }
+  return query.getColumn(0).getInt();
+}
+
 std::vector<ProductEntry> DBConnector::getUserInventory(User p_user) {
+  ConnectionLease db = m_pool.reader();
+  return queryUserInventory(db, p_user.getId());
+}
+
+std::vector<ProductEntry> DBConnector::queryUserInventory(ConnectionLease& p_db,
+                                                          int p_user_id) {
   try {
     std::vector<ProductEntry> products;
-    SQLite::Statement query(
-        *m_database,
-        "SELECT product_id, count FROM Inventory WHERE user_id = ?");
-    query.bind(1, p_user.getId());
-    std::vector<ProductEntry> product_entries;
+    CachedStatement query = p_db.statement(
+        "SELECT Product.id, Product.name, Inventory.count FROM Inventory "
+        "JOIN Product ON Product.id = Inventory.product_id "
+        "WHERE Inventory.user_id = ?");
+    query.bind(1, p_user_id);
     while (query.executeStep()) {
-      int id = query.getColumn(0).getInt();
-      int count = query.getColumn(1).getInt();
-      products.emplace_back(getProduct(id), count);
+      products.emplace_back(
+          Product(query.getColumn(0).getInt(), query.getColumn(1).getText()),
+          query.getColumn(2).getInt());
     }
     return products;
   } catch (const SQLite::Exception& e) {
@@ -345,32 +763,103 @@ std::vector<ProductEntry> DBConnector::getUserInventory(User p_user) {
   }
 }
 
-void DBConnector::addRecord(const Product& p_product, const Record& p_record) {
+int64_t DBConnector::addRecord(const Product& p_product,
+                               const Record& p_record) {
+  ConnectionLease db = m_pool.writer();
   try {
-    SQLite::Statement query(*m_database,
-                            "INSERT INTO PriceRecord (product_id, date_time, "
-                            "price) VALUES (?, ?, ?)");
+    // replacing the record in the same slot keeps the amount of records per
+    // product at the limit without sorting or counting
+    CachedStatement query = db.statement(
+        "INSERT OR REPLACE INTO PriceRecord (product_id, "
+        "date_time, price, slot) VALUES (?, ?, ?, ?)");
     query.bind(1, p_product.getId());
-    query.bind(2, to_iso_string(p_record.dateTime));
+    query.bind(2, to_epoch_millis(p_record.dateTime));
     query.bind(3, p_record.price);
+    std::unordered_map<int, int> slots;
+    bindRecordSlot(query, 4, p_product.getId(), slots);
     query.exec();
+    commitRecordSlots(slots);
+    return db.database().getLastInsertRowid();
   } catch (const SQLite::Exception& e) {
     throw std::runtime_error("Failed to add record: " + std::string(e.what()));
   }
 }
 
+void DBConnector::addRecords(std::vector<PriceUpdate>& p_updates) {
+  ConnectionLease db = m_pool.writer();
+  try {
+    SQLite::Transaction transaction(db.database());
+    CachedStatement query = db.statement(
+        "INSERT OR REPLACE INTO PriceRecord (product_id, "
+        "date_time, price, slot) VALUES (?, ?, ?, ?)");
+    std::unordered_map<int, int> slots;
+    for (PriceUpdate& update : p_updates) {
+      query.bind(1, update.productId);
+      query.bind(2, to_epoch_millis(update.record.dateTime));
+      query.bind(3, update.record.price);
+      bindRecordSlot(query, 4, update.productId, slots);
+      query.exec();
+      query.reset();
+      update.record.cursor = db.database().getLastInsertRowid();
+    }
+    transaction.commit();
+    commitRecordSlots(slots);
+  } catch (const SQLite::Exception& e) {
+    throw std::runtime_error("Failed to add records: " +
+                             std::string(e.what()));
+  }
+}
+
+std::unordered_map<int, int> DBConnector::getRecordCounts() {
+  ConnectionLease db = m_pool.reader();
+  try {
+    CachedStatement query = db.statement(
+        "SELECT product_id, COUNT(*) FROM PriceRecord GROUP BY product_id");
+    std::unordered_map<int, int> counts;
+    while (query.executeStep()) {
+      counts[query.getColumn(0).getInt()] = query.getColumn(1).getInt();
+    }
+    return counts;
+  } catch (const SQLite::Exception& e) {
+    throw std::runtime_error("Failed to count records: " +
+                             std::string(e.what()));
+  }
+}
+
+void DBConnector::removeRecords(const std::vector<int>& p_product_ids) {
+  ConnectionLease db = m_pool.writer();
+  try {
+    SQLite::Transaction transaction(db.database());
+    CachedStatement query =
+        db.statement("DELETE FROM PriceRecord WHERE product_id = ?");
+    for (int product_id : p_product_ids) {
+      query.bind(1, product_id);
+      query.exec();
+      query.reset();
+    }
+    transaction.commit();
+  } catch (const SQLite::Exception& e) {
+    throw std::runtime_error("Failed to remove records: " +
+                             std::string(e.what()));
+  }
+  std::lock_guard<std::mutex> lock(m_slot_mutex);
+  for (int product_id : p_product_ids) {
+    m_next_slot.erase(product_id);
+  }
+}
+
 std::vector<Record> DBConnector::getAllRecords(const Product& product) {
-  SQLite::Statement query(*m_database,
-                          "SELECT date_time, price FROM PriceRecord WHERE "
-                          "product_id = ? ORDER BY date_time ASC;");
+  ConnectionLease db = m_pool.reader();
+  CachedStatement query = db.statement(
+      "SELECT date_time, price, entry_num FROM PriceRecord WHERE "
+      "product_id = ? ORDER BY date_time ASC;");
   query.bind(1, product.getId());
   std::vector<Record> records;
   try {
     while (query.executeStep()) {
-      std::string dateTimeText = query.getColumn(0).getString();
-      time_point dateTime = from_iso_string(dateTimeText);
+      time_point dateTime = from_epoch_millis(query.getColumn(0).getInt64());
       int price = query.getColumn(1).getInt();
-      records.emplace_back(dateTime, price);
+      records.emplace_back(dateTime, price, query.getColumn(2).getInt64());
     }
     return records;
   } catch (const SQLite::Exception& e) {
@@ -381,20 +870,122 @@ std::vector<Record> DBConnector::getAllRecords(const Product& product) {
 std::vector<Record> DBConnector::getRecords(const Product& product,
                                             const time_point& from,
                                             const time_point& to) {
-  SQLite::Statement query(
-      *m_database,
+  ConnectionLease db = m_pool.reader();
+  CachedStatement query = db.statement(
+      "SELECT date_time, price, entry_num FROM PriceRecord WHERE product_id = "
+      "? "
+      "AND date_time >= ? AND date_time <= ? ORDER BY date_time ASC;");
+  query.bind(1, product.getId());
+  query.bind(2, to_epoch_millis(from));
+  query.bind(3, to_epoch_millis(to));
+  std::vector<Record> records;
+  try {
+    while (query.executeStep()) {
+      time_point dateTime = from_epoch_millis(query.getColumn(0).getInt64());
+      int price = query.getColumn(1).getInt();
+      records.emplace_back(dateTime, price, query.getColumn(2).getInt64());
+    }
+    return records;
+  } catch (const SQLite::Exception& e) {
+    throw std::runtime_error("Failed to get records: " + std::string(e.what()));
+  }
+}
+
+std::vector<Candle> DBConnector::getCandles(
+    const Product& product, const time_point& from, const time_point& to,
+    std::chrono::milliseconds interval) {
+  if (interval.count() <= 0) {
+    throw std::invalid_argument("Candle interval must be positive");
+  }
+  ConnectionLease db = m_pool.reader();
+  CachedStatement query = db.statement(
       "SELECT date_time, price FROM PriceRecord WHERE product_id = ? AND "
       "date_time >= ? AND date_time <= ? ORDER BY date_time ASC;");
   query.bind(1, product.getId());
-  query.bind(2, to_iso_string(from));
-  query.bind(3, to_iso_string(to));
+  query.bind(2, to_epoch_millis(from));
+  query.bind(3, to_epoch_millis(to));
+  std::vector<Candle> candles;
+  try {
+    int64_t bucket_millis = interval.count();
+    int64_t current_bucket = 0;
+    while (query.executeStep()) {
+      int64_t millis = query.getColumn(0).getInt64();
+      int price = query.getColumn(1).getInt();
+      // floor division, so records before the epoch land in the right bucket
+      int64_t bucket =
+          millis / bucket_millis - (millis % bucket_millis < 0 ? 1 : 0);
+      if (candles.empty() || bucket != current_bucket) {
+        current_bucket = bucket;
+        candles.push_back(Candle{from_epoch_millis(bucket * bucket_millis),
+                                 price, price, price, price, 0});
+      }
+      Candle& candle = candles.back();
+      candle.high = std::max(candle.high, price);
+      candle.low = std::min(candle.low, price);
+      candle.close = price;
+      candle.count++;
+    }
+    return candles;
+  } catch (const SQLite::Exception& e) {
+    throw std::runtime_error("Failed to get candles: " + std::string(e.what()));
+  }
+}
+
+std::vector<PriceUpdate> DBConnector::getRecordsSince(
+    const std::vector<int>& p_product_ids, const time_point& p_since) {
+  ConnectionLease db = m_pool.reader();
+  return queryPriceUpdates(db, p_product_ids, "date_time > ?",
+                           to_epoch_millis(p_since));
+}
+
+Snapshot DBConnector::getSnapshot(
+    int p_user_id, const std::optional<time_point>& p_records_since) {
+  ConnectionLease db = m_pool.reader();
+  try {
+    // a read transaction keeps one WAL snapshot for all queries, so trades and
+    // ticks committed in between are either fully visible or not at all
+    SQLite::Transaction transaction(db.database());
+    Snapshot snapshot{queryUser(db, p_user_id),
+                      queryUserInventory(db, p_user_id),
+                      queryMarketInventory(db),
+                      queryLatestRecords(db),
+                      {}};
+    if (p_records_since) {
+      // filtered by the products of the market, so the (product_id,
+      // date_time) index is used instead of scanning all records
+      std::vector<int> product_ids;
+      product_ids.reserve(snapshot.market.size());
+      for (const ProductEntry& entry : snapshot.market) {
+        product_ids.push_back(entry.product.getId());
+      }
+      if (!product_ids.empty()) {
+        snapshot.records =
+            queryPriceUpdates(db, product_ids, "date_time > ?",
+                              to_epoch_millis(*p_records_since));
+      }
+    }
+    transaction.commit();
+    return snapshot;
+  } catch (const SQLite::Exception& e) {
+    throw std::runtime_error("Failed to get snapshot: " +
+                             std::string(e.what()));
+  }
+}
+
+std::vector<Record> DBConnector::getRecordsAfter(const Product& product,
+                                                 int64_t p_cursor) {
+  ConnectionLease db = m_pool.reader();
+  CachedStatement query = db.statement(
+      "SELECT date_time, price, entry_num FROM PriceRecord "
+      "WHERE product_id = ? AND entry_num > ? ORDER BY entry_num");
+  query.bind(1, product.getId());
+  query.bind(2, p_cursor);
   std::vector<Record> records;
   try {
     while (query.executeStep()) {
-      std::string dateTimeText = query.getColumn(0).getString();
-      time_point dateTime = from_iso_string(dateTimeText);
+      time_point dateTime = from_epoch_millis(query.getColumn(0).getInt64());
       int price = query.getColumn(1).getInt();
-      records.emplace_back(dateTime, price);
+      records.emplace_back(dateTime, price, query.getColumn(2).getInt64());
     }
     return records;
   } catch (const SQLite::Exception& e) {
@@ -402,16 +993,82 @@ std::vector<Record> DBConnector::getRecords(const Product& product,
   }
 }
 
-int DBConnector::getLatestRecordPrice(const Product& p_product) {
+std::vector<PriceUpdate> DBConnector::getRecordsAfter(
+    const std::vector<int>& p_product_ids, int64_t p_cursor) {
+  ConnectionLease db = m_pool.reader();
+  return queryPriceUpdates(db, p_product_ids, "entry_num > ?", p_cursor);
+}
+
+std::vector<PriceUpdate> DBConnector::queryPriceUpdates(
+    ConnectionLease& p_db, const std::vector<int>& p_product_ids,
+    const std::string& p_condition, int64_t p_value) {
+  try {
+    std::vector<PriceUpdate> updates;
+    // the ids are bound as one json array, so the statement text is the same
+    // for any amount of products and stays cached
+    std::string filter =
+        p_product_ids.empty()
+            ? p_condition
+            : "product_id IN (SELECT value FROM json_each(?)) AND " +
+                  p_condition;
+    CachedStatement query = p_db.statement(
+        "SELECT product_id, date_time, price, entry_num FROM PriceRecord "
+        "WHERE " +
+        filter + " ORDER BY product_id, entry_num");
+    int index = 1;
+    if (!p_product_ids.empty()) {
+      std::string ids = "[";
+      for (size_t i = 0; i < p_product_ids.size(); i++) {
+        ids += (i > 0 ? "," : "") + std::to_string(p_product_ids[i]);
+      }
+      query.bind(index++, ids + "]");
+    }
+    query.bind(index, p_value);
+    while (query.executeStep()) {
+      updates.emplace_back(
+          query.getColumn(0).getInt(),
+          Record(from_epoch_millis(query.getColumn(1).getInt64()),
+                 query.getColumn(2).getInt(), query.getColumn(3).getInt64()));
+    }
+    return updates;
+  } catch (const SQLite::Exception& e) {
+    throw std::runtime_error("Failed to get records: " + std::string(e.what()));
+  }
+}
+
+std::vector<PriceUpdate> DBConnector::queryLatestRecords(
+    ConnectionLease& p_db) {
   try {
-    SQLite::Statement query(
-        *m_database,
-        "SELECT price FROM PriceRecord WHERE product_id = ? ORDER BY date_time "
-        "DESC LIMIT 1");
+    std::vector<PriceUpdate> updates;
+    // the newest entry of each product is a single index seek
+    CachedStatement query = p_db.statement(
+        "SELECT Product.id, date_time, price, entry_num FROM Product "
+        "JOIN PriceRecord ON entry_num = (SELECT MAX(entry_num) FROM "
+        "PriceRecord WHERE product_id = Product.id) ORDER BY Product.id");
+    while (query.executeStep()) {
+      updates.emplace_back(
+          query.getColumn(0).getInt(),
+          Record(from_epoch_millis(query.getColumn(1).getInt64()),
+                 query.getColumn(2).getInt(), query.getColumn(3).getInt64()));
+    }
+    return updates;
+  } catch (const SQLite::Exception& e) {
+    throw std::runtime_error("Failed to get latest records: " +
+                             std::string(e.what()));
+  }
+}
+
+Record DBConnector::getLatestRecord(const Product& p_product) {
+  ConnectionLease db = m_pool.reader();
+  try {
+    CachedStatement query = db.statement(
+        "SELECT date_time, price, entry_num FROM PriceRecord "
+        "WHERE product_id = ? ORDER BY date_time DESC LIMIT 1");
     query.bind(1, p_product.getId());
 
     if (query.executeStep()) {
-      return query.getColumn(0).getInt();
+      return Record(from_epoch_millis(query.getColumn(0).getInt64()),
+                    query.getColumn(1).getInt(), query.getColumn(2).getInt64());
     } else {
       throw std::runtime_error("No Record found");
     }
@@ -420,9 +1077,13 @@ int DBConnector::getLatestRecordPrice(const Product& p_product) {
   }
 }
 
+int DBConnector::getLatestRecordPrice(const Product& p_product) {
+  return getLatestRecord(p_product).price;
+}
+
 int DBConnector::verifyCredentials(const Account& account) {
-  SQLite::Statement query(
-      *m_database,
+  ConnectionLease db = m_pool.reader();
+  CachedStatement query = db.statement(
       "SELECT id FROM Account WHERE username = ? AND password = ?");
   query.bind(1, account.username);
   query.bind(2, account.password);
@@ -436,14 +1097,17 @@ int DBConnector::verifyCredentials(const Account& account) {
 }
 
 std::string DBConnector::addToken(int user_id, const std::string& token) {
-  SQLite::Statement query(*m_database,
-                          "UPDATE Account "
-                          "SET token = ? "
-                          "WHERE id = ?;");
+  ConnectionLease db = m_pool.writer();
+  CachedStatement query = db.statement(
+      "UPDATE Account "
+      "SET token = ? "
+      "WHERE id = ?;");
   query.bind(1, token);
   query.bind(2, user_id);
   try {
     query.exec();
+    // the previous token of the user is not valid anymore
+    SessionCache::invalidateUser(user_id);
     return token;
   } catch (const SQLite::Exception& e) {
     throw std::runtime_error("Failed to add token: " + std::string(e.what()));
@@ -451,14 +1115,16 @@ std::string DBConnector::addToken(int user_id, const std::string& token) {
 }
 
 void DBConnector::removeToken(const std::string& p_token) {
-  SQLite::Statement query(*m_database,
-                          "UPDATE Account "
-                          "SET token = NULL "
-                          "WHERE token = ?;");
+  ConnectionLease db = m_pool.writer();
+  CachedStatement query = db.statement(
+      "UPDATE Account "
+      "SET token = NULL "
+      "WHERE token = ?;");
   query.bind(1, p_token);
   try {
     query.exec();
-    int changes = m_database->getChanges();
+    SessionCache::invalidateToken(p_token);
+    int changes = db.database().getChanges();
     if (changes <= 0) {
       throw InvalidToken("token not valid");
     }
@@ -468,16 +1134,24 @@ void DBConnector::removeToken(const std::string& p_token) {
 }
 
 User DBConnector::getUserByToken(const std::string& p_token) {
-  SQLite::Statement query(*m_database,
-                          "SELECT User.id, name, balance FROM User "
-                          "JOIN Account ON User.id = Account.id "
-                          "WHERE Account.token = ?");
+  if (auto user = SessionCache::get(p_token)) {
+    return *user;
+  }
+  uint64_t generation = SessionCache::getGeneration();
+  ConnectionLease db = m_pool.reader();
+
+  CachedStatement query = db.statement(
+      "SELECT User.id, name, balance FROM User "
+      "JOIN Account ON User.id = Account.id "
+      "WHERE Account.token = ?");
   query.bind(1, p_token);
   if (query.executeStep()) {
     int id = query.getColumn(0).getInt();
     std::string name = query.getColumn(1).getText();
     int balance = query.getColumn(2).getInt();
-    return User(id, name, balance);
+    User user(id, name, balance);
+    SessionCache::put(p_token, user, generation);
+    return user;
   } else {
     throw InvalidToken("Token not valid");
   }
@@ -1,18 +1,22 @@
 #include "market_place.hpp"
 
+#include <algorithm>
 #include <cmath>
-#include <ctime>
 #include <mutex>
-#include <random>
+#include <stdexcept>
 #include <thread>
 
 #include "db_connector.hpp"
+#include "order_flow.hpp"
+#include "price_board.hpp"
 
 namespace ProjectStockMarket {
 
-MarketPlace::MarketPlace(int limit_record_entries, bool try_generate_products)
-    : m_limit_record_entries(limit_record_entries) {
-  DBConnector::addPriceRecordLimitTrigger(m_limit_record_entries);
+MarketPlace::MarketPlace(int limit_record_entries, bool try_generate_products,
+                         std::optional<uint64_t> price_seed)
+    : m_price_engine(price_seed ? PriceEngine(*price_seed) : PriceEngine()),
+      m_limit_record_entries(limit_record_entries) {
+  DBConnector::setRecordLimit(m_limit_record_entries);
   timer.setCallback([this]() { updateProductPrices(); });
 
   if (try_generate_products) {
@@ -45,25 +49,254 @@ std::vector<Product> MarketPlace::getAllProducts() {
 Product MarketPlace::addProduct(const std::string& p_name, int p_count) {
   return DBConnector::addProduct(p_name, p_count);
 }
+uint64_t MarketPlace::getCatalogVersion() const {
+  return DBConnector::getCatalogVersion();
+}
+
+std::vector<PriceUpdate> MarketPlace::getRecords(
+    const std::vector<int>& p_product_ids, const time_point& p_since) {
+  return DBConnector::getRecordsSince(p_product_ids, p_since);
+}
+
+std::vector<PriceUpdate> MarketPlace::getRecordsAfter(
+    const std::vector<int>& p_product_ids, int64_t p_cursor) {
+  return DBConnector::getRecordsAfter(p_product_ids, p_cursor);
+}
+
+Snapshot MarketPlace::getSnapshot(
+    const User& p_user, const std::optional<time_point>& p_records_since) {
+  return DBConnector::getSnapshot(p_user.getId(), p_records_since);
+}
 
 void MarketPlace::startPriceUpdate() { timer.start(); }
 
 void MarketPlace::updateProductPrices() {
+  auto start = std::chrono::steady_clock::now();
+  // a backfill running at the same time finishes first
+  std::lock_guard<std::mutex> lock(m_price_engine_mutex);
   time_point now = std::chrono::system_clock::now();
-  for (auto product : getAllProducts()) {
-    int current_price = product.getCurrentPrice();
-    // in the future trend should be based on supply and demand
-    double trend = 0.3 * (2.0 * ((double) std::rand() / RAND_MAX) - 1.0);
-    Record record(now, randomWalk(current_price, trend, 0.8, 1));
-    product.addRecord(record);
+
+  // the board stays the source of the current prices, so prices changed
+  // outside of the simulation are picked up by the next tick
+  loadPrices();
+  loadDemand();
+  std::vector<PriceUpdate> updates = m_price_engine.step(now);
+
+  DBConnector::addRecords(updates);
+  // only publish the new prices once they are persisted
+  for (const auto& update : updates) {
+    PriceBoard::update(update.productId, update.record);
+  }
+  publishTick(std::move(updates));
+
+  m_last_tick_duration_us =
+      std::chrono::duration_cast<std::chrono::microseconds>(
+          std::chrono::steady_clock::now() - start)
+          .count();
+}
+
+void MarketPlace::loadDemand() {
+  std::vector<ProductFlow> flows = OrderFlow::drain();
+  if (flows.empty()) {
+    return;
+  }
+  uint64_t version = DBConnector::getInventoryVersion();
+  if (version != m_supply_version) {
+    m_supply.clear();
+    for (const auto& entry : DBConnector::getMarketInventory()) {
+      m_supply[entry.product.getId()] = entry.count;
+    }
+    m_supply_version = version;
+  }
+
+  std::unordered_map<int, int64_t> net_flow;
+  for (const auto& flow : flows) {
+    net_flow[flow.productId] = flow.bought - flow.sold;
+  }
+  const std::vector<int>& product_ids = m_price_engine.getProductIds();
+  std::vector<double> demand(product_ids.size(), 0);
+  for (size_t i = 0; i < product_ids.size(); i++) {
+    auto flow = net_flow.find(product_ids[i]);
+    if (flow == net_flow.end()) {
+      continue;
+    }
+    // buying what is left of a scarce product weighs more than the same
+    // amount of a plentiful one
+    double supply = std::max(m_supply[product_ids[i]], 0);
+    demand[i] = std::tanh(flow->second / (supply + 1));
+  }
+  m_price_engine.setDemand(demand);
+}
+
+BackfillReport MarketPlace::backfill(std::chrono::seconds p_history,
+                                     std::chrono::microseconds p_period,
+                                     size_t p_batch_size) {
+  if (p_period <= std::chrono::microseconds::zero() || p_history < p_period ||
+      p_batch_size == 0) {
+    throw std::invalid_argument(
+        "A backfill needs a positive period shorter than the history and a "
+        "positive batch size");
+  }
+  auto start = std::chrono::steady_clock::now();
+  std::lock_guard<std::mutex> lock(m_price_engine_mutex);
+  time_point end = std::chrono::system_clock::now();
+  loadPrices();
+
+  // a series ending now would interleave with the history products already
+  // have, so only products with nothing but their seed record are backfilled
+  std::unordered_map<int, int> record_counts = DBConnector::getRecordCounts();
+  std::vector<int> product_ids;
+  std::vector<int> prices;
+  for (size_t i = 0; i < m_price_engine.getProductIds().size(); i++) {
+    int product_id = m_price_engine.getProductIds()[i];
+    if (record_counts[product_id] <= 1) {
+      product_ids.push_back(product_id);
+      prices.push_back(m_price_engine.getPrices()[i]);
+    }
+  }
+  BackfillReport report;
+  if (product_ids.empty()) {
+    return report;
+  }
+  m_price_engine.setPrices(product_ids, prices);
+  // the walk starts at the seed price, the record itself is replaced by the
+  // simulated history
+  DBConnector::removeRecords(product_ids);
+  const size_t product_count = product_ids.size();
+
+  report.ticks = p_history / p_period;
+  // older records would be overwritten in the ring right away, so only the
+  // newest ticks are stored
+  uint64_t stored_ticks =
+      std::min<uint64_t>(report.ticks, m_limit_record_entries);
+  std::chrono::steady_clock::duration persisting{0};
+
+  std::vector<PriceUpdate> batch;
+  batch.reserve(p_batch_size + product_count);
+  for (uint64_t tick = 0; tick < report.ticks; tick++) {
+    m_price_engine.advance();
+    uint64_t remaining = report.ticks - 1 - tick;
+    if (remaining >= stored_ticks) {
+      continue;
+    }
+    m_price_engine.appendUpdates(
+        end - std::chrono::duration_cast<time_point::duration>(p_period *
+                                                               remaining),
+        batch);
+    // the last batch is kept to publish the final prices
+    if (batch.size() >= p_batch_size && remaining > 0) {
+      auto persist_start = std::chrono::steady_clock::now();
+      DBConnector::addRecords(batch);
+      persisting += std::chrono::steady_clock::now() - persist_start;
+      report.records += batch.size();
+      batch.clear();
+    }
   }
+  auto persist_start = std::chrono::steady_clock::now();
+  DBConnector::addRecords(batch);
+  persisting += std::chrono::steady_clock::now() - persist_start;
+  report.records += batch.size();
+  report.prices = report.ticks * product_count;
+
+  std::vector<PriceUpdate> updates(batch.end() - product_count, batch.end());
+  for (const auto& update : updates) {
+    PriceBoard::update(update.productId, update.record);
+  }
+  publishTick(std::move(updates));
+
+  report.persistTime =
+      std::chrono::duration_cast<std::chrono::microseconds>(persisting);
+  report.simulationTime = std::chrono::duration_cast<std::chrono::microseconds>(
+                              std::chrono::steady_clock::now() - start) -
+                          report.persistTime;
+  return report;
+}
+
+void MarketPlace::loadPrices() {
+  std::vector<Product> products = getAllProducts();
+  std::vector<int> product_ids;
+  std::vector<int> prices;
+  product_ids.reserve(products.size());
+  prices.reserve(products.size());
+  for (const auto& product : products) {
+    product_ids.push_back(product.getId());
+    prices.push_back(product.getCurrentPrice());
+  }
+  m_price_engine.setPrices(product_ids, prices);
+}
+
+void MarketPlace::setTickPeriod(std::chrono::microseconds p_period) {
+  timer.setPeriod(p_period);
+}
+
+std::chrono::microseconds MarketPlace::getTickPeriod() const {
+  return std::chrono::duration_cast<std::chrono::microseconds>(
+      timer.getPeriod());
+}
+
+void MarketPlace::setOverrunPolicy(OverrunPolicy p_policy) {
+  timer.setOverrunPolicy(p_policy);
+}
+
+OverrunPolicy MarketPlace::getOverrunPolicy() const {
+  return timer.getOverrunPolicy();
+}
+
+TimerStats MarketPlace::getTimerStats() const { return timer.getStats(); }
+
+void MarketPlace::setPriceShards(size_t p_shards) {
+  std::lock_guard<std::mutex> lock(m_price_engine_mutex);
+  m_price_engine.setShards(p_shards);
+}
+
+size_t MarketPlace::getPriceShards() {
+  std::lock_guard<std::mutex> lock(m_price_engine_mutex);
+  return m_price_engine.getShards();
+}
+
+void MarketPlace::seedPrices(uint64_t p_seed) {
+  std::lock_guard<std::mutex> lock(m_price_engine_mutex);
+  m_price_engine.seed(p_seed);
+}
+
+std::chrono::microseconds MarketPlace::getLastTickDuration() const {
+  return std::chrono::microseconds(m_last_tick_duration_us.load());
+}
+
+std::optional<Tick> MarketPlace::waitForTick(
+    uint64_t p_after, std::chrono::milliseconds p_timeout) {
+  std::shared_ptr<const Tick> tick;
+  {
+    std::unique_lock<std::mutex> lock(m_tick_mutex);
+    bool published = m_tick_published.wait_for(lock, p_timeout, [&]() {
+      return m_last_tick && m_last_tick->sequence > p_after;
+    });
+    if (!published) {
+      return std::nullopt;
+    }
+    tick = m_last_tick;
+  }
+  // copied outside of the lock, the tick itself is never modified
+  return *tick;
+}
+
+void MarketPlace::publishTick(std::vector<PriceUpdate> p_updates) {
+  {
+    std::lock_guard<std::mutex> lock(m_tick_mutex);
+    uint64_t sequence = m_last_tick ? m_last_tick->sequence + 1 : 1;
+    m_last_tick =
+        std::make_shared<const Tick>(Tick{sequence, std::move(p_updates)});
+  }
+  m_tick_published.notify_all();
+}
+
+uint64_t MarketPlace::getTickSequence() {
+  std::lock_guard<std::mutex> lock(m_tick_mutex);
+  return m_last_tick ? m_last_tick->sequence : 0;
 }
 
-int MarketPlace::randomWalk(int current_price, double trend, double streuung, double dt) {
-  double sqdt = std::sqrt(dt);
-  std::mt19937 generator(std::random_device{}());
-  double Y = trendDistribution(generator);
-  return current_price * (1 + trend * dt + streuung * sqdt * Y)+ randomNumber(generator);
+uint64_t MarketPlace::getInventoryVersion() const {
+  return DBConnector::getInventoryVersion();
 }
 
 // void MarketPlace::updateProductPrices() {
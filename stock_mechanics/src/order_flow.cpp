@@ -0,0 +1,56 @@
+#include "order_flow.hpp"
+
+#include <mutex>
+
+namespace ProjectStockMarket {
+
+std::shared_mutex OrderFlow::m_mutex;
+std::unordered_map<int, std::unique_ptr<OrderFlow::Counters>>
+    OrderFlow::m_counters;
+
+void OrderFlow::recordBuy(int product_id, int amount) {
+  counters(product_id).bought.fetch_add(amount, std::memory_order_relaxed);
+}
+
+void OrderFlow::recordSell(int product_id, int amount) {
+  counters(product_id).sold.fetch_add(amount, std::memory_order_relaxed);
+}
+
+std::vector<ProductFlow> OrderFlow::drain() {
+  std::shared_lock<std::shared_mutex> lock(m_mutex);
+  std::vector<ProductFlow> flows;
+  for (auto& [product_id, counters] : m_counters) {
+    int64_t bought = counters->bought.exchange(0, std::memory_order_relaxed);
+    int64_t sold = counters->sold.exchange(0, std::memory_order_relaxed);
+    if (bought != 0 || sold != 0) {
+      flows.push_back(ProductFlow{product_id, bought, sold});
+    }
+  }
+  return flows;
+}
+
+void OrderFlow::clear() {
+  std::shared_lock<std::shared_mutex> lock(m_mutex);
+  for (auto& [product_id, counters] : m_counters) {
+    counters->bought = 0;
+    counters->sold = 0;
+  }
+}
+
+OrderFlow::Counters& OrderFlow::counters(int product_id) {
+  {
+    std::shared_lock<std::shared_mutex> lock(m_mutex);
+    auto it = m_counters.find(product_id);
+    if (it != m_counters.end()) {
+      return *it->second;
+    }
+  }
+  std::unique_lock<std::shared_mutex> lock(m_mutex);
+  auto& counters = m_counters[product_id];
+  if (!counters) {
+    counters = std::make_unique<Counters>();
+  }
+  return *counters;
+}
+
+}  // namespace ProjectStockMarket
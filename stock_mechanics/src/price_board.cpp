@@ -0,0 +1,43 @@
+#include "price_board.hpp"
+
+#include <mutex>
+
+namespace ProjectStockMarket {
+
+std::shared_mutex PriceBoard::m_mutex;
+std::unordered_map<int, Record> PriceBoard::m_records;
+
+std::optional<Record> PriceBoard::getLatestRecord(int product_id) {
+  std::shared_lock<std::shared_mutex> lock(m_mutex);
+  auto it = m_records.find(product_id);
+  if (it == m_records.end()) {
+    return std::nullopt;
+  }
+  return it->second;
+}
+
+std::optional<int> PriceBoard::getPrice(int product_id) {
+  std::shared_lock<std::shared_mutex> lock(m_mutex);
+  auto it = m_records.find(product_id);
+  if (it == m_records.end()) {
+    return std::nullopt;
+  }
+  return it->second.price;
+}
+
+void PriceBoard::update(int product_id, const Record& record) {
+  std::unique_lock<std::shared_mutex> lock(m_mutex);
+  auto it = m_records.find(product_id);
+  if (it == m_records.end()) {
+    m_records.emplace(product_id, record);
+  } else if (it->second.dateTime <= record.dateTime) {
+    it->second = record;
+  }
+}
+
+void PriceBoard::clear() {
+  std::unique_lock<std::shared_mutex> lock(m_mutex);
+  m_records.clear();
+}
+
+}  // namespace ProjectStockMarket
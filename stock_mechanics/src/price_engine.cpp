@@ -0,0 +1,127 @@
+#include "price_engine.hpp"
+
+#include <cmath>
+#include <stdexcept>
+
+namespace ProjectStockMarket {
+
+PriceEngine::PriceEngine() : m_shards(1) { seedShards(); }
+
+PriceEngine::PriceEngine(uint64_t p_seed) : m_seed(p_seed), m_shards(1) {
+  seedShards();
+}
+
+void PriceEngine::seed(uint64_t p_seed) {
+  m_seed = p_seed;
+  seedShards();
+}
+
+void PriceEngine::setShards(size_t p_shards) {
+  if (p_shards == 0) {
+    throw std::invalid_argument("A price engine needs at least one shard");
+  }
+  m_workers.reset();
+  m_shards = std::vector<Shard>(p_shards);
+  seedShards();
+  if (p_shards > 1) {
+    m_workers = std::make_unique<WorkerPool>(p_shards - 1);
+  }
+}
+
+size_t PriceEngine::getShards() const { return m_shards.size(); }
+
+void PriceEngine::seedShards() {
+  for (size_t i = 0; i < m_shards.size(); i++) {
+    Shard& shard = m_shards[i];
+    if (!m_seed) {
+      shard.generator.seed(std::random_device{}());
+    } else if (i == 0) {
+      // a single shard walks exactly like an unsharded engine
+      shard.generator.seed(*m_seed);
+    } else {
+      std::seed_seq sequence{static_cast<uint32_t>(*m_seed),
+                             static_cast<uint32_t>(*m_seed >> 32),
+                             static_cast<uint32_t>(i)};
+      shard.generator.seed(sequence);
+    }
+    shard.trend.reset();
+    shard.shock.reset();
+    shard.offset.reset();
+  }
+}
+
+void PriceEngine::setPrices(const std::vector<int>& p_product_ids,
+                            const std::vector<int>& p_prices) {
+  m_product_ids.assign(p_product_ids.begin(), p_product_ids.end());
+  m_prices.assign(p_prices.begin(), p_prices.end());
+  m_demand.assign(m_prices.size(), 0);
+}
+
+void PriceEngine::setDemand(const std::vector<double>& p_demand) {
+  if (p_demand.size() != m_prices.size()) {
+    throw std::invalid_argument("Demand does not match the products");
+  }
+  m_demand.assign(p_demand.begin(), p_demand.end());
+}
+
+std::vector<PriceUpdate> PriceEngine::step(const time_point& p_now,
+                                           double p_dt) {
+  advance(p_dt);
+  std::vector<PriceUpdate> updates;
+  updates.reserve(m_prices.size());
+  appendUpdates(p_now, updates);
+  return updates;
+}
+
+void PriceEngine::advance(double p_dt) {
+  const size_t count = m_prices.size();
+  m_trends.resize(count);
+  m_shocks.resize(count);
+  m_offsets.resize(count);
+
+  const size_t shards = m_shards.size();
+  auto advanceShard = [&](size_t shard) {
+    advanceRange(m_shards[shard], count * shard / shards,
+                 count * (shard + 1) / shards, p_dt);
+  };
+  if (m_workers) {
+    m_workers->run(shards, advanceShard);
+  } else {
+    advanceShard(0);
+  }
+}
+
+void PriceEngine::advanceRange(Shard& p_shard, size_t p_begin, size_t p_end,
+                               double p_dt) {
+  // drawn product by product, so the walk of a seeded shard only depends on
+  // the order of its products
+  for (size_t i = p_begin; i < p_end; i++) {
+    m_trends[i] =
+        p_shard.trend(p_shard.generator) + m_demand_weight * m_demand[i];
+    m_shocks[i] = p_shard.shock(p_shard.generator);
+    m_offsets[i] = p_shard.offset(p_shard.generator);
+  }
+
+  const double sqdt = std::sqrt(p_dt);
+  for (size_t i = p_begin; i < p_end; i++) {
+    m_prices[i] =
+        static_cast<int>(m_prices[i] * (1 + m_trends[i] * p_dt +
+                                        m_volatility * sqdt * m_shocks[i]) +
+                         m_offsets[i]);
+  }
+}
+
+void PriceEngine::appendUpdates(const time_point& p_now,
+                                std::vector<PriceUpdate>& p_updates) const {
+  for (size_t i = 0; i < m_prices.size(); i++) {
+    p_updates.emplace_back(m_product_ids[i], Record(p_now, m_prices[i]));
+  }
+}
+
+const std::vector<int>& PriceEngine::getProductIds() const {
+  return m_product_ids;
+}
+
+const std::vector<int>& PriceEngine::getPrices() const { return m_prices; }
+
+}  // namespace ProjectStockMarket
@@ -1,6 +1,7 @@
 #include "product.hpp"
 
 #include "db_connector.hpp"
+#include "price_board.hpp"
 
 using namespace ProjectStockMarket;
 
@@ -13,7 +14,12 @@ bool ProjectStockMarket::Product::operator==(const Product& other) const {
 std::string Product::getName() const { return m_name; }
 
 int Product::getCurrentPrice() const {
-  return DBConnector::getLatestRecordPrice(*this);
+  if (auto price = PriceBoard::getPrice(m_id)) {
+    return *price;
+  }
+  // not on the board yet (e.g. after a restart), load it once from the db
+  PriceBoard::update(m_id, DBConnector::getLatestRecord(*this));
+  return *PriceBoard::getPrice(m_id);
 }
 
 std::vector<Record> Product::getAllRecords() const {
@@ -24,6 +30,16 @@ std::vector<Record> Product::getRecords(time_point from, time_point to) const {
   return DBConnector::getRecords(*this, from, to);
 }
 
+std::vector<Record> Product::getRecordsAfter(int64_t cursor) const {
+  return DBConnector::getRecordsAfter(*this, cursor);
+}
+
+std::vector<Candle> Product::getCandles(
+    time_point from, time_point to, std::chrono::milliseconds interval) const {
+  return DBConnector::getCandles(*this, from, to, interval);
+}
+
 void Product::addRecord(Record record) {
-  DBConnector::addRecord(*this, record);
+  record.cursor = DBConnector::addRecord(*this, record);
+  PriceBoard::update(m_id, record);
 }
@@ -0,0 +1,142 @@
+#include "record_batch.hpp"
+
+#include <algorithm>
+#include <type_traits>
+#include <utility>
+
+namespace ProjectStockMarket {
+
+namespace {
+
+template <typename T>
+void appendLittleEndian(std::string& p_out, T p_value) {
+  auto bits = static_cast<std::make_unsigned_t<T>>(p_value);
+  for (size_t i = 0; i < sizeof(T); i++) {
+    p_out.push_back(static_cast<char>((bits >> (8 * i)) & 0xff));
+  }
+}
+
+template <typename T>
+void appendJsonArray(std::string& p_out, const std::vector<T>& p_values) {
+  p_out += '[';
+  for (size_t i = 0; i < p_values.size(); i++) {
+    if (i > 0) {
+      p_out += ',';
+    }
+    p_out += std::to_string(p_values[i]);
+  }
+  p_out += ']';
+}
+
+}  // namespace
+
+RecordBatch RecordBatch::fromRecords(int p_product_id,
+                                     const std::vector<Record>& p_records) {
+  RecordBatch batch;
+  RecordColumns& columns = batch.columnsOf(p_product_id);
+  columns.timestamps.reserve(p_records.size());
+  columns.prices.reserve(p_records.size());
+  columns.cursors.reserve(p_records.size());
+  for (const Record& record : p_records) {
+    columns.timestamps.push_back(to_epoch_millis(record.dateTime));
+    columns.prices.push_back(record.price);
+    columns.cursors.push_back(record.cursor);
+  }
+  return batch;
+}
+
+RecordBatch RecordBatch::fromUpdates(const std::vector<PriceUpdate>& p_updates,
+                                     const std::vector<int>& p_product_ids) {
+  RecordBatch batch;
+  for (int product_id : p_product_ids) {
+    batch.columnsOf(product_id);
+  }
+  for (const PriceUpdate& update : p_updates) {
+    RecordColumns& columns = batch.columnsOf(update.productId);
+    columns.timestamps.push_back(to_epoch_millis(update.record.dateTime));
+    columns.prices.push_back(update.record.price);
+    columns.cursors.push_back(update.record.cursor);
+  }
+  return batch;
+}
+
+RecordColumns& RecordBatch::columnsOf(int p_product_id) {
+  // the updates are ordered by product, so this is nearly always the last one
+  if (!m_columns.empty() && m_columns.back().productId == p_product_id) {
+    return m_columns.back();
+  }
+  auto it = std::find_if(m_columns.begin(), m_columns.end(),
+                         [&](const RecordColumns& columns) {
+                           return columns.productId == p_product_id;
+                         });
+  if (it != m_columns.end()) {
+    return *it;
+  }
+  m_columns.push_back(RecordColumns{p_product_id, {}, {}, {}});
+  return m_columns.back();
+}
+
+size_t RecordBatch::size() const {
+  size_t size = 0;
+  for (const RecordColumns& columns : m_columns) {
+    size += columns.prices.size();
+  }
+  return size;
+}
+
+const std::vector<RecordColumns>& RecordBatch::getColumns() const {
+  return m_columns;
+}
+
+std::vector<RecordColumns> RecordBatch::takeColumns() {
+  std::vector<RecordColumns> columns = std::move(m_columns);
+  m_columns.clear();
+  return columns;
+}
+
+std::string RecordBatch::toJson() const {
+  std::string out;
+  // roughly the digits of a timestamp, a price and a cursor per record
+  out.reserve(64 + m_columns.size() * 64 + size() * 32);
+  out += "{\"products\":[";
+  for (size_t i = 0; i < m_columns.size(); i++) {
+    const RecordColumns& columns = m_columns[i];
+    if (i > 0) {
+      out += ',';
+    }
+    out += "{\"product_id\":" + std::to_string(columns.productId);
+    out += ",\"timestamps\":";
+    appendJsonArray(out, columns.timestamps);
+    out += ",\"prices\":";
+    appendJsonArray(out, columns.prices);
+    out += ",\"cursors\":";
+    appendJsonArray(out, columns.cursors);
+    out += '}';
+  }
+  out += "]}";
+  return out;
+}
+
+std::string RecordBatch::toBinary() const {
+  std::string out;
+  out.reserve(4 + m_columns.size() * 8 + size() * 20);
+  appendLittleEndian(out, static_cast<uint32_t>(m_columns.size()));
+  for (const RecordColumns& columns : m_columns) {
+    appendLittleEndian(out, static_cast<int32_t>(columns.productId));
+    appendLittleEndian(out, static_cast<uint32_t>(columns.prices.size()));
+  }
+  for (const RecordColumns& columns : m_columns) {
+    for (int64_t timestamp : columns.timestamps) {
+      appendLittleEndian(out, timestamp);
+    }
+    for (int32_t price : columns.prices) {
+      appendLittleEndian(out, price);
+    }
+    for (int64_t cursor : columns.cursors) {
+      appendLittleEndian(out, cursor);
+    }
+  }
+  return out;
+}
+
+}  // namespace ProjectStockMarket
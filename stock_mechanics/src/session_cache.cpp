@@ -0,0 +1,129 @@
+#include "session_cache.hpp"
+
+#include <vector>
+
+namespace ProjectStockMarket {
+
+std::mutex SessionCache::m_mutex;
+std::list<SessionCache::Entry> SessionCache::m_entries;
+std::unordered_map<std::string, std::list<SessionCache::Entry>::iterator>
+    SessionCache::m_tokens;
+std::unordered_multimap<int, std::list<SessionCache::Entry>::iterator>
+    SessionCache::m_users;
+std::chrono::milliseconds SessionCache::m_ttl = std::chrono::seconds(60);
+size_t SessionCache::m_capacity = 1024;
+uint64_t SessionCache::m_generation = 0;
+uint64_t SessionCache::m_hits = 0;
+uint64_t SessionCache::m_misses = 0;
+
+std::optional<User> SessionCache::get(const std::string& p_token) {
+  std::lock_guard<std::mutex> lock(m_mutex);
+  auto it = m_tokens.find(p_token);
+  if (it == m_tokens.end()) {
+    m_misses++;
+    return std::nullopt;
+  }
+  if (it->second->expires < std::chrono::steady_clock::now()) {
+    erase(it->second);
+    m_misses++;
+    return std::nullopt;
+  }
+  // move to the front, it is now the most recently used entry
+  m_entries.splice(m_entries.begin(), m_entries, it->second);
+  m_hits++;
+  return it->second->user;
+}
+
+uint64_t SessionCache::getGeneration() {
+  std::lock_guard<std::mutex> lock(m_mutex);
+  return m_generation;
+}
+
+void SessionCache::put(const std::string& p_token, const User& p_user,
+                       uint64_t p_generation) {
+  std::lock_guard<std::mutex> lock(m_mutex);
+  if (m_capacity == 0 || p_generation != m_generation) {
+    return;
+  }
+  auto token = m_tokens.find(p_token);
+  if (token != m_tokens.end()) {
+    erase(token->second);
+  }
+  while (m_entries.size() >= m_capacity) {
+    erase(std::prev(m_entries.end()));
+  }
+
+  m_entries.push_front(
+      Entry{p_token, p_user, std::chrono::steady_clock::now() + m_ttl});
+  m_tokens[p_token] = m_entries.begin();
+  m_users.emplace(p_user.getId(), m_entries.begin());
+}
+
+void SessionCache::updateUser(const User& p_user) {
+  std::lock_guard<std::mutex> lock(m_mutex);
+  // a miss loading the user right now would cache the outdated data
+  m_generation++;
+  auto [begin, end] = m_users.equal_range(p_user.getId());
+  for (auto it = begin; it != end; it++) {
+    it->second->user = p_user;
+  }
+}
+
+void SessionCache::invalidateToken(const std::string& p_token) {
+  std::lock_guard<std::mutex> lock(m_mutex);
+  m_generation++;
+  auto it = m_tokens.find(p_token);
+  if (it != m_tokens.end()) {
+    erase(it->second);
+  }
+}
+
+void SessionCache::invalidateUser(int p_user_id) {
+  std::lock_guard<std::mutex> lock(m_mutex);
+  m_generation++;
+  auto [begin, end] = m_users.equal_range(p_user_id);
+  std::vector<std::list<Entry>::iterator> entries;
+  for (auto it = begin; it != end; it++) {
+    entries.push_back(it->second);
+  }
+  for (auto entry : entries) {
+    erase(entry);
+  }
+}
+
+void SessionCache::configure(std::chrono::milliseconds p_ttl,
+                             size_t p_capacity) {
+  std::lock_guard<std::mutex> lock(m_mutex);
+  m_ttl = p_ttl;
+  m_capacity = p_capacity;
+  while (m_entries.size() > m_capacity) {
+    erase(std::prev(m_entries.end()));
+  }
+}
+
+SessionCacheStats SessionCache::getStats() {
+  std::lock_guard<std::mutex> lock(m_mutex);
+  return SessionCacheStats{m_hits, m_misses, m_entries.size()};
+}
+
+void SessionCache::clear() {
+  std::lock_guard<std::mutex> lock(m_mutex);
+  m_generation++;
+  m_entries.clear();
+  m_tokens.clear();
+  m_users.clear();
+}
+
+void SessionCache::erase(std::list<Entry>::iterator p_entry) {
+  m_tokens.erase(p_entry->token);
+  auto [begin, end] = m_users.equal_range(p_entry->user.getId());
+  for (auto it = begin; it != end; it++) {
+    if (it->second == p_entry) {
+      m_users.erase(it);
+      break;
+    }
+  }
+  m_entries.erase(p_entry);
+}
+
+}  // namespace ProjectStockMarket
@@ -0,0 +1,74 @@
+#include "statement_cache.hpp"
+
+namespace ProjectStockMarket {
+
+std::atomic<uint64_t> StatementCache::m_hits{0};
+std::atomic<uint64_t> StatementCache::m_misses{0};
+std::atomic<bool> StatementCache::m_enabled{true};
+
+CachedStatement::CachedStatement(SQLite::Statement& p_statement, bool* p_in_use)
+    : m_statement(&p_statement), m_in_use(p_in_use) {
+  *m_in_use = true;
+}
+
+CachedStatement::CachedStatement(std::unique_ptr<SQLite::Statement> p_statement)
+    : m_owned(std::move(p_statement)),
+      m_statement(m_owned.get()),
+      m_in_use(nullptr) {}
+
+CachedStatement::~CachedStatement() {
+  if (m_in_use) {
+    m_statement->tryReset();
+    m_statement->clearBindings();
+    *m_in_use = false;
+  }
+}
+
+bool CachedStatement::executeStep() { return m_statement->executeStep(); }
+
+int CachedStatement::exec() { return m_statement->exec(); }
+
+SQLite::Column CachedStatement::getColumn(int p_index) const {
+  return m_statement->getColumn(p_index);
+}
+
+void CachedStatement::reset() { m_statement->reset(); }
+
+StatementCache::StatementCache(SQLite::Database& p_database)
+    : m_database(p_database) {}
+
+CachedStatement StatementCache::get(const std::string& p_query) {
+  if (!m_enabled) {
+    m_misses++;
+    return CachedStatement(
+        std::make_unique<SQLite::Statement>(m_database, p_query));
+  }
+
+  auto it = m_statements.find(p_query);
+  if (it == m_statements.end()) {
+    m_misses++;
+    Entry entry;
+    entry.statement = std::make_unique<SQLite::Statement>(m_database, p_query);
+    it = m_statements.emplace(p_query, std::move(entry)).first;
+  } else if (it->second.in_use) {
+    m_misses++;
+    return CachedStatement(
+        std::make_unique<SQLite::Statement>(m_database, p_query));
+  } else {
+    m_hits++;
+  }
+  return CachedStatement(*it->second.statement, &it->second.in_use);
+}
+
+StatementCacheStats StatementCache::getStats() {
+  return StatementCacheStats{m_hits.load(), m_misses.load()};
+}
+
+void StatementCache::resetStats() {
+  m_hits = 0;
+  m_misses = 0;
+}
+
+void StatementCache::setEnabled(bool p_enabled) { m_enabled = p_enabled; }
+
+}  // namespace ProjectStockMarket
@@ -1,18 +1,46 @@
 #include "timer.hpp"
 
+#include <algorithm>
+#include <stdexcept>
+
 namespace ProjectStockMarket {
 
-Timer::Timer() : running(false) {}
+namespace {
+
+const std::vector<std::chrono::microseconds> kDurationBuckets = {
+    std::chrono::microseconds(100),  std::chrono::microseconds(250),
+    std::chrono::microseconds(500),  std::chrono::milliseconds(1),
+    std::chrono::microseconds(2500), std::chrono::milliseconds(5),
+    std::chrono::milliseconds(10),   std::chrono::milliseconds(25),
+    std::chrono::milliseconds(50),   std::chrono::milliseconds(100),
+    std::chrono::milliseconds(250),  std::chrono::milliseconds(500),
+    std::chrono::seconds(1),
+};
+
+}  // namespace
+
+Timer::Timer(std::chrono::nanoseconds period, OverrunPolicy policy)
+    : running(false), m_period_ns(0), m_policy(policy) {
+  setPeriod(period);
+  m_stats.bucketBounds = kDurationBuckets;
+  m_stats.durationHistogram.assign(kDurationBuckets.size() + 1, 0);
+}
 
 Timer::~Timer() { stop(); }
 
 void Timer::start() {
-  running = true;
+  if (running.exchange(true)) {
+    return;
+  }
   timerThread = std::thread(&Timer::run, this);
 }
 
 void Timer::stop() {
-  running = false;
+  {
+    std::lock_guard<std::mutex> lock(m_wait_mutex);
+    running = false;
+  }
+  m_stopped.notify_all();
   if (timerThread.joinable()) {
     timerThread.join();
   }
@@ -22,13 +50,81 @@ void Timer::setCallback(std::function<void()> callback) {
   this->callback = callback;
 }
 
+void Timer::setPeriod(std::chrono::nanoseconds period) {
+  if (period <= std::chrono::nanoseconds::zero()) {
+    throw std::invalid_argument("The period of a timer has to be positive");
+  }
+  m_period_ns = period.count();
+}
+
+std::chrono::nanoseconds Timer::getPeriod() const {
+  return std::chrono::nanoseconds(m_period_ns.load());
+}
+
+void Timer::setOverrunPolicy(OverrunPolicy policy) { m_policy = policy; }
+
+OverrunPolicy Timer::getOverrunPolicy() const { return m_policy; }
+
+TimerStats Timer::getStats() const {
+  std::lock_guard<std::mutex> lock(m_stats_mutex);
+  return m_stats;
+}
+
 void Timer::run() {
-  while (running) {
-    std::this_thread::sleep_for(std::chrono::milliseconds(1000));
+  Clock::time_point deadline = Clock::now() + getPeriod();
+  while (true) {
+    {
+      std::unique_lock<std::mutex> lock(m_wait_mutex);
+      m_stopped.wait_until(lock, deadline, [this]() { return !running; });
+      if (!running) {
+        return;
+      }
+    }
+
+    Clock::time_point started = Clock::now();
     if (callback) {
       callback();
     }
+    Clock::time_point finished = Clock::now();
+
+    Clock::duration lag = started - deadline;
+    TimerSchedule next =
+        schedule(deadline, finished, getPeriod(), m_policy.load());
+    deadline = next.deadline;
+    record(lag, finished - started, next.overrun, next.skipped);
   }
 }
 
+TimerSchedule Timer::schedule(Clock::time_point p_deadline,
+                              Clock::time_point p_finished,
+                              Clock::duration p_period,
+                              OverrunPolicy p_policy) {
+  TimerSchedule next{p_deadline + p_period, false, 0};
+  next.overrun = p_finished > next.deadline;
+  if (next.overrun && p_policy == OverrunPolicy::Skip) {
+    // the next deadline ahead of now, every one in between is dropped
+    next.skipped = (p_finished - next.deadline) / p_period + 1;
+    next.deadline += p_period * next.skipped;
+  }
+  return next;
+}
+
+void Timer::record(Clock::duration lag, Clock::duration duration, bool overrun,
+                   uint64_t skipped) {
+  auto lag_us = std::chrono::duration_cast<std::chrono::microseconds>(lag);
+  auto duration_us =
+      std::chrono::duration_cast<std::chrono::microseconds>(duration);
+  size_t bucket = std::lower_bound(kDurationBuckets.begin(),
+                                   kDurationBuckets.end(), duration_us) -
+                  kDurationBuckets.begin();
+
+  std::lock_guard<std::mutex> lock(m_stats_mutex);
+  m_stats.ticks++;
+  m_stats.overruns += overrun;
+  m_stats.skipped += skipped;
+  m_stats.lastLag = lag_us;
+  m_stats.maxLag = std::max(m_stats.maxLag, lag_us);
+  m_stats.durationHistogram[bucket]++;
+}
+
 }  // namespace ProjectStockMarket
@@ -1,29 +1,25 @@
 #include "user.hpp"
 
 #include "db_connector.hpp"
-#include "exception_classes.hpp"
 
 using namespace ProjectStockMarket;
 
 void User::buyProduct(const Product& p_product, int p_amount) {
   int current_price = p_product.getCurrentPrice();
-  int product_total_price = current_price * p_amount;
-  if (m_balance < product_total_price)
-    throw NotEnoughMoney("Insufficient balance to buy these products. " +
-                         std::to_string(product_total_price) + " needed.");
-  DBConnector::updateMarketProductEntry(p_product, -p_amount);
-  DBConnector::updateUserProductEntry(*this, p_product, p_amount);
-  m_balance -= product_total_price;
-  DBConnector::updateUser(*this);
+  m_balance =
+      DBConnector::buyProduct(*this, p_product, p_amount, current_price);
 }
 
 void User::sellProduct(const Product& p_product, int p_amount) {
   int current_price = p_product.getCurrentPrice();
-  int product_total_price = current_price * p_amount;
-  DBConnector::updateUserProductEntry(*this, p_product, -p_amount);
-  DBConnector::updateMarketProductEntry(p_product, p_amount);
-  m_balance += product_total_price;
-  DBConnector::updateUser(*this);
+  m_balance =
+      DBConnector::sellProduct(*this, p_product, p_amount, current_price);
+}
+
+std::vector<Fill> User::executeOrders(const std::vector<Order>& p_orders) {
+  OrderResult result = DBConnector::executeOrders(*this, p_orders);
+  m_balance = result.balance;
+  return result.fills;
 }
 
 int User::getId() const { return m_id; }
@@ -0,0 +1,66 @@
+#include "worker_pool.hpp"
+
+namespace ProjectStockMarket {
+
+WorkerPool::WorkerPool(size_t p_workers) {
+  m_threads.reserve(p_workers);
+  for (size_t i = 0; i < p_workers; i++) {
+    m_threads.emplace_back(&WorkerPool::work, this);
+  }
+}
+
+WorkerPool::~WorkerPool() {
+  {
+    std::lock_guard<std::mutex> lock(m_mutex);
+    m_stopping = true;
+  }
+  m_wake.notify_all();
+  for (auto& thread : m_threads) {
+    thread.join();
+  }
+}
+
+void WorkerPool::run(size_t p_count,
+                     const std::function<void(size_t)>& p_task) {
+  std::unique_lock<std::mutex> lock(m_mutex);
+  m_task = &p_task;
+  m_count = p_count;
+  m_next = 0;
+  m_finished = 0;
+  m_batch++;
+  m_wake.notify_all();
+
+  claimTasks(lock);
+  m_done.wait(lock, [this]() { return m_finished == m_count; });
+  m_task = nullptr;
+}
+
+size_t WorkerPool::getWorkerCount() const { return m_threads.size(); }
+
+void WorkerPool::work() {
+  std::unique_lock<std::mutex> lock(m_mutex);
+  uint64_t seen = 0;
+  while (true) {
+    m_wake.wait(lock, [&]() { return m_stopping || m_batch != seen; });
+    if (m_stopping) {
+      return;
+    }
+    seen = m_batch;
+    claimTasks(lock);
+  }
+}
+
+void WorkerPool::claimTasks(std::unique_lock<std::mutex>& p_lock) {
+  while (m_next < m_count) {
+    size_t index = m_next++;
+    const std::function<void(size_t)>& task = *m_task;
+    p_lock.unlock();
+    task(index);
+    p_lock.lock();
+    if (++m_finished == m_count) {
+      m_done.notify_all();
+    }
+  }
+}
+
+}  // namespace ProjectStockMarket
@@ -1,9 +1,18 @@
 #include <gtest/gtest.h>
 
+#include <atomic>
 #include <authenticator.hpp>
 #include <db_connector.hpp>
+#include <exception_classes.hpp>
+#include <filesystem>
 #include <market_place.hpp>
+#include <order_flow.hpp>
+#include <price_board.hpp>
+#include <price_engine.hpp>
+#include <record_batch.hpp>
+#include <session_cache.hpp>
 #include <string>
+#include <thread>
 
 using namespace std::chrono_literals;
 
@@ -176,4 +185,1023 @@ TEST(TestDatabase, loginWhileGenerating) {
   sm::DBConnector::initDB(":memory:");
   sm::MarketPlace mp(3600, true);
   sm::Authenticator::registerAccount("admin", "admin", "Admin");
-}
\ No newline at end of file
+}
+
+TEST(TestDatabase, PriceBoard) {
+  sm::DBConnector::initDB(":memory:");
+
+  sm::MarketPlace mp(3600, false);
+
+  auto apple = mp.addProduct("Apple", 100);
+  sm::time_point now = std::chrono::system_clock::now();
+  apple.addRecord(sm::Record(now, 5000));
+  ASSERT_EQ(sm::PriceBoard::getPrice(apple.getId()), 5000)
+      << "Price board not updated on new record";
+
+  apple.addRecord(sm::Record(now - 1s, 4000));
+  ASSERT_EQ(apple.getCurrentPrice(), 5000)
+      << "Older record overwrote the current price";
+
+  sm::PriceBoard::clear();
+  ASSERT_EQ(apple.getCurrentPrice(), 5000)
+      << "Current price not loaded from the database";
+  ASSERT_EQ(sm::PriceBoard::getPrice(apple.getId()), 5000)
+      << "Loaded price not put on the board";
+}
+
+TEST(TestDatabase, MigrateTextTimestamps) {
+  std::string path =
+      (std::filesystem::temp_directory_path() / "migrate_test.db").string();
+  std::filesystem::remove(path);
+  {
+    SQLite::Database legacy(path, SQLite::OPEN_READWRITE | SQLite::OPEN_CREATE);
+    legacy.exec(
+        "CREATE TABLE PriceRecord ("
+        "entry_num INTEGER PRIMARY KEY AUTOINCREMENT,"
+        "product_id INTEGER, "
+        "date_time TEXT NOT NULL, "
+        "price INTEGER NOT NULL);");
+    legacy.exec(
+        "INSERT INTO PriceRecord (product_id, date_time, price) VALUES "
+        "(1, '2024-06-29T12:00:00+0000', 100), "
+        "(1, '2024-06-29T12:00:01+0000', 200);");
+  }
+  sm::DBConnector::initDB(path);
+
+  sm::Product product(1, "Legacy");
+  auto records = product.getAllRecords();
+  ASSERT_EQ(records.size(), 2) << "Records lost during migration";
+  ASSERT_EQ(sm::to_epoch_millis(records[0].dateTime), 1719662400000)
+      << "Timestamp not converted as UTC";
+  ASSERT_EQ(records[1].price, 200) << "Price lost during migration";
+  ASSERT_EQ(product.getCurrentPrice(), 200) << "Latest record not found";
+
+  sm::DBConnector::initDB(":memory:");
+  std::filesystem::remove(path);
+}
+
+TEST(TestDatabase, BatchedTick) {
+  sm::DBConnector::initDB(":memory:");
+
+  sm::MarketPlace mp(3600, false);
+
+  sm::time_point now = std::chrono::system_clock::now();
+  for (int i = 0; i < 2000; i++) {
+    mp.addProduct("Product " + std::to_string(i), 100)
+        .addRecord(sm::Record(now - 1s, 100));
+  }
+
+  mp.updateProductPrices();
+
+  for (auto product : mp.getAllProducts()) {
+    auto records = product.getAllRecords();
+    ASSERT_EQ(records.size(), 2) << "Tick did not add a record for "
+                                 << product.getName();
+    ASSERT_EQ(product.getCurrentPrice(), records.back().price)
+        << "Price board not updated by tick";
+  }
+  // how long a tick takes is left to benchmarkShardedTicks
+  ASSERT_GT(mp.getLastTickDuration(), 0us) << "Tick duration not reported";
+}
+
+TEST(TestDatabase, RecordLimit) {
+  sm::DBConnector::initDB(":memory:");
+
+  sm::MarketPlace mp(3, false);
+
+  auto apple = mp.addProduct("Apple", 100);
+  sm::time_point now = std::chrono::system_clock::now();
+  for (int i = 0; i < 5; i++) {
+    apple.addRecord(sm::Record(now + i * 1s, i));
+  }
+  auto records = apple.getAllRecords();
+  ASSERT_EQ(records.size(), 3) << "Records over the limit not replaced";
+  ASSERT_EQ(records.front().price, 2) << "Oldest records not replaced first";
+  ASSERT_EQ(records.back().price, 4) << "Newest record missing";
+
+  // growing the limit keeps the existing records
+  sm::MarketPlace bigger(5, false);
+  for (int i = 5; i < 8; i++) {
+    apple.addRecord(sm::Record(now + i * 1s, i));
+  }
+  records = apple.getAllRecords();
+  ASSERT_EQ(records.size(), 5) << "Records not kept after growing the limit";
+  ASSERT_EQ(records.front().price, 3) << "Wrong records kept after growing";
+
+  // shrinking the limit drops the oldest records
+  sm::MarketPlace smaller(2, false);
+  records = apple.getAllRecords();
+  ASSERT_EQ(records.size(), 2) << "Records not pruned after shrinking";
+  ASSERT_EQ(records.front().price, 6) << "Wrong records kept after shrinking";
+  apple.addRecord(sm::Record(now + 8s, 8));
+  records = apple.getAllRecords();
+  ASSERT_EQ(records.size(), 2) << "Limit not applied after shrinking";
+  ASSERT_EQ(records.back().price, 8) << "Newest record missing";
+}
+
+TEST(TestDatabase, RecordLimitRollback) {
+  std::string path =
+      (std::filesystem::temp_directory_path() / "rollback_test.db").string();
+  std::filesystem::remove(path);
+  sm::DBConnector::initDB(path);
+
+  sm::MarketPlace mp(3, false);
+  auto apple = mp.addProduct("Apple", 100);
+  sm::time_point now = std::chrono::system_clock::now();
+  for (int i = 0; i < 3; i++) {
+    apple.addRecord(sm::Record(now + i * 1s, i));
+  }
+
+  // let the second insert of the batch fail, so the batch is rolled back
+  SQLite::Database(path, SQLite::OPEN_READWRITE)
+      .exec(
+          "CREATE TRIGGER reject_price BEFORE INSERT ON PriceRecord "
+          "WHEN NEW.price < 0 BEGIN SELECT RAISE(ABORT, 'rejected'); END;");
+  std::vector<sm::PriceUpdate> updates = {
+      sm::PriceUpdate(apple.getId(), sm::Record(now + 3s, 3)),
+      sm::PriceUpdate(apple.getId(), sm::Record(now + 4s, -1))};
+  ASSERT_THROW(sm::DBConnector::addRecords(updates), std::exception);
+  ASSERT_EQ(apple.getAllRecords().size(), 3) << "Failed batch was committed";
+
+  apple.addRecord(sm::Record(now + 5s, 5));
+  auto records = apple.getAllRecords();
+  ASSERT_EQ(records.size(), 3);
+  ASSERT_EQ(records[0].price, 1) << "Slot of the rolled back insert skipped";
+  ASSERT_EQ(records[1].price, 2) << "Record replaced out of order";
+  ASSERT_EQ(records[2].price, 5) << "Newest record missing";
+  ASSERT_LT(records[0].cursor, records[1].cursor);
+  ASSERT_LT(records[1].cursor, records[2].cursor);
+
+  sm::DBConnector::initDB(":memory:");
+  std::filesystem::remove(path);
+  std::filesystem::remove(path + "-wal");
+  std::filesystem::remove(path + "-shm");
+}
+
+TEST(TestDatabase, StatementCache) {
+  sm::DBConnector::initDB(":memory:");
+
+  sm::MarketPlace mp(3600, false);
+  std::string token =
+      sm::Authenticator::registerAccount("admin", "admin", "Admin");
+  sm::User admin = sm::Authenticator::findUserByToken(token);
+
+  sm::StatementCache::resetStats();
+  for (int i = 0; i < 10; i++) {
+    ASSERT_EQ(sm::DBConnector::getUser(admin.getId()).getName(), "Admin")
+        << "Cached statement returned wrong user";
+  }
+  ASSERT_THROW(sm::DBConnector::getUser(admin.getId() + 1), std::exception)
+      << "Bindings of cached statement not replaced";
+
+  sm::StatementCacheStats stats = sm::StatementCache::getStats();
+  ASSERT_EQ(stats.misses, 1) << "Statement prepared more than once";
+  ASSERT_EQ(stats.hits, 10) << "Cached statement not reused";
+}
+
+TEST(TestDatabase, ProductCatalog) {
+  sm::DBConnector::initDB(":memory:");
+
+  sm::MarketPlace mp(3600, false);
+  uint64_t version = mp.getCatalogVersion();
+  auto apple = mp.addProduct("Apple", 100);
+  ASSERT_EQ(mp.getAllProducts().size(), 1) << "Product missing in catalog";
+  ASSERT_GT(mp.getCatalogVersion(), version) << "Version not bumped by insert";
+  version = mp.getCatalogVersion();
+
+  auto banana = mp.addProduct("Banana", 200);
+  std::vector<sm::Product> products = mp.getAllProducts();
+  ASSERT_EQ(products.size(), 2) << "Catalog not invalidated by addProduct";
+  ASSERT_GT(mp.getCatalogVersion(), version) << "Version not bumped by insert";
+  version = mp.getCatalogVersion();
+  mp.getAllProducts();
+  mp.getInventory();
+  ASSERT_EQ(mp.getCatalogVersion(), version) << "Version bumped by a read";
+  ASSERT_EQ(products[1], banana) << "Catalog not ordered by id";
+
+  sm::StatementCache::resetStats();
+  ASSERT_EQ(sm::DBConnector::getProduct(banana.getId()), banana)
+      << "Wrong product found in catalog";
+  sm::StatementCacheStats stats = sm::StatementCache::getStats();
+  ASSERT_EQ(stats.hits + stats.misses, 0)
+      << "Database queried for a known product";
+
+  std::vector<sm::ProductEntry> market = mp.getInventory();
+  ASSERT_EQ(market.size(), 2) << "Market inventory incomplete";
+  ASSERT_EQ(market[0], sm::ProductEntry(apple, 100))
+      << "Market inventory join returned wrong entry";
+}
+
+TEST(TestDatabase, SessionCache) {
+  sm::DBConnector::initDB(":memory:");
+  sm::SessionCache::configure(std::chrono::seconds(60), 1024);
+
+  sm::MarketPlace mp(3600, false);
+  auto banana = mp.addProduct("Banana", 100);
+  banana.addRecord(sm::Record(std::chrono::system_clock::now(), 1));
+
+  std::string token =
+      sm::Authenticator::registerAccount("admin", "admin", "Admin");
+  sm::User user = sm::Authenticator::findUserByToken(token);
+  sm::SessionCacheStats before = sm::SessionCache::getStats();
+  sm::Authenticator::findUserByToken(token);
+  ASSERT_EQ(sm::SessionCache::getStats().hits, before.hits + 1)
+      << "Token lookup not served from the session cache";
+
+  user.buyProduct(banana, 10);
+  ASSERT_EQ(sm::Authenticator::findUserByToken(token).getBalance(), 990)
+      << "Cached balance not updated after a trade";
+
+  std::string new_token =
+      sm::DBConnector::addToken(user.getId(), token + "-renewed");
+  ASSERT_THROW(sm::Authenticator::findUserByToken(token), std::exception)
+      << "Old token still cached after logging in again";
+  sm::Authenticator::findUserByToken(new_token);
+
+  sm::Authenticator::logout(new_token);
+  ASSERT_THROW(sm::Authenticator::findUserByToken(new_token), std::exception)
+      << "Token still cached after logout";
+
+  token = sm::Authenticator::login(sm::Account("admin", "admin"));
+  sm::SessionCache::configure(std::chrono::milliseconds(1), 1024);
+  sm::Authenticator::findUserByToken(token);
+  std::this_thread::sleep_for(std::chrono::milliseconds(5));
+  before = sm::SessionCache::getStats();
+  sm::Authenticator::findUserByToken(token);
+  ASSERT_EQ(sm::SessionCache::getStats().misses, before.misses + 1)
+      << "Expired entry served from the session cache";
+
+  // a trade committed while a miss loads the user keeps it out of the cache
+  sm::SessionCache::configure(std::chrono::seconds(60), 1024);
+  sm::SessionCache::invalidateToken(token);
+  uint64_t generation = sm::SessionCache::getGeneration();
+  sm::User loaded = sm::DBConnector::getUser(user.getId());
+  sm::SessionCache::updateUser(
+      sm::User(user.getId(), user.getName(), loaded.getBalance() - 1));
+  sm::SessionCache::put(token, loaded, generation);
+  ASSERT_FALSE(sm::SessionCache::get(token).has_value())
+      << "Balance loaded before a trade cached";
+
+  // every token of a user sees the new balance
+  sm::SessionCache::put("first", loaded, sm::SessionCache::getGeneration());
+  sm::SessionCache::put("second", loaded, sm::SessionCache::getGeneration());
+  sm::SessionCache::updateUser(sm::User(user.getId(), user.getName(), 5));
+  ASSERT_EQ(sm::SessionCache::get("first")->getBalance(), 5);
+  ASSERT_EQ(sm::SessionCache::get("second")->getBalance(), 5);
+  sm::SessionCache::invalidateUser(user.getId());
+  ASSERT_FALSE(sm::SessionCache::get("first").has_value());
+  ASSERT_FALSE(sm::SessionCache::get("second").has_value());
+
+  sm::SessionCache::configure(std::chrono::seconds(60), 0);
+  ASSERT_EQ(sm::SessionCache::getStats().size, 0)
+      << "Entries not evicted when shrinking the cache";
+  sm::SessionCache::configure(std::chrono::seconds(60), 1024);
+}
+
+TEST(TestDatabase, ConcurrentAccess) {
+  sm::DBConnector::initDB(":memory:");
+
+  sm::MarketPlace mp(3600, false);
+  sm::time_point now = std::chrono::system_clock::now();
+  for (int i = 0; i < 20; i++) {
+    mp.addProduct("Product " + std::to_string(i), 1000)
+        .addRecord(sm::Record(now, 1));
+  }
+  std::string token =
+      sm::Authenticator::registerAccount("admin", "admin", "Admin");
+
+  std::atomic<bool> failed = false;
+  std::vector<std::thread> readers;
+  for (int t = 0; t < 4; t++) {
+    readers.emplace_back([&]() {
+      try {
+        for (int i = 0; i < 50; i++) {
+          sm::User user = sm::DBConnector::getUserByToken(token);
+          user.getInventory();
+          mp.getInventory();
+          mp.getAllProducts().front().getRecords(now, now + 1h);
+        }
+      } catch (const std::exception& e) {
+        failed = true;
+      }
+    });
+  }
+  for (int i = 0; i < 10; i++) {
+    mp.updateProductPrices();
+  }
+  for (auto& reader : readers) {
+    reader.join();
+  }
+  ASSERT_FALSE(failed) << "Concurrent access to the database failed";
+}
+
+TEST(TestDatabase, ConnectionPool) {
+  std::string path =
+      (std::filesystem::temp_directory_path() / "pool_test.db").string();
+  std::filesystem::remove(path);
+  sm::DBConnector::initDB(path, 4);
+  ASSERT_EQ(sm::DBConnector::getReaderCount(), 4);
+
+  sm::MarketPlace mp(3600, false);
+  sm::time_point now = std::chrono::system_clock::now();
+  for (int i = 0; i < 20; i++) {
+    mp.addProduct("Product " + std::to_string(i), 1000)
+        .addRecord(sm::Record(now, 1));
+  }
+  std::string token =
+      sm::Authenticator::registerAccount("admin", "admin", "Admin");
+  ASSERT_EQ(sm::DBConnector::getUserByToken(token).getName(), "Admin")
+      << "Committed write not visible to the readers";
+
+  std::atomic<bool> failed = false;
+  std::vector<std::thread> readers;
+  for (int t = 0; t < 8; t++) {
+    readers.emplace_back([&]() {
+      try {
+        for (int i = 0; i < 50; i++) {
+          sm::DBConnector::getUser(1).getInventory();
+          mp.getInventory();
+          if (mp.getAllProducts().front().getRecords(now, now + 1h).empty()) {
+            failed = true;
+          }
+        }
+      } catch (const std::exception& e) {
+        failed = true;
+      }
+    });
+  }
+  for (int i = 0; i < 10; i++) {
+    mp.updateProductPrices();
+  }
+  for (auto& reader : readers) {
+    reader.join();
+  }
+  ASSERT_FALSE(failed) << "Concurrent reads on the reader connections failed";
+  ASSERT_EQ(mp.getAllProducts().front().getAllRecords().size(), 11);
+
+  sm::DBConnector::initDB(":memory:");
+  ASSERT_EQ(sm::DBConnector::getReaderCount(), 0);
+  std::filesystem::remove(path);
+  std::filesystem::remove(path + "-wal");
+  std::filesystem::remove(path + "-shm");
+}
+
+TEST(TestDatabase, ConcurrentTrades) {
+  // a file database, so the trades read through the WAL reader connections
+  std::string path =
+      (std::filesystem::temp_directory_path() / "concurrent_trades_test.db")
+          .string();
+  std::filesystem::remove(path);
+  std::filesystem::remove(path + "-wal");
+  std::filesystem::remove(path + "-shm");
+  sm::DBConnector::initDB(path, 4);
+  ASSERT_EQ(sm::DBConnector::getReaderCount(), 4);
+
+  sm::MarketPlace mp(3600, false);
+  sm::Product product = mp.addProduct("Scarce", 100);
+  product.addRecord(sm::Record(std::chrono::system_clock::now(), 30));
+
+  const int traders = 8;
+  for (int t = 0; t < traders; t++) {
+    sm::DBConnector::registerAccount(
+        sm::Account("trader" + std::to_string(t), "secret"), "Trader");
+  }
+
+  std::atomic<int> bought = 0;
+  std::vector<std::thread> threads;
+  for (int t = 0; t < traders; t++) {
+    // two threads per user, so balance updates of the same user race too
+    for (int copy = 0; copy < 2; copy++) {
+      threads.emplace_back([&, t]() {
+        sm::User user = sm::DBConnector::getUser(t + 1);
+        while (true) {
+          try {
+            user.buyProduct(product, 1);
+            bought++;
+          } catch (const std::exception& e) {
+            return;  // out of money or out of stock
+          }
+        }
+      });
+    }
+  }
+  for (auto& thread : threads) {
+    thread.join();
+  }
+
+  ASSERT_EQ(bought, 100) << "Sold more or less than the stock";
+  ASSERT_EQ(mp.getInventory().front().count, 0);
+  int total_balance = 0;
+  for (int t = 0; t < traders; t++) {
+    sm::User user = sm::DBConnector::getUser(t + 1);
+    ASSERT_GE(user.getBalance(), 0) << "Balance overdrawn";
+    int owned = 0;
+    for (auto& entry : user.getInventory()) {
+      owned += entry.count;
+    }
+    ASSERT_EQ(user.getBalance(), 1000 - owned * 30) << "Lost balance update";
+    total_balance += user.getBalance();
+  }
+  ASSERT_EQ(total_balance, traders * 1000 - 100 * 30);
+
+  sm::User user = sm::DBConnector::getUser(1);
+  int balance = user.getBalance();
+  ASSERT_THROW(user.buyProduct(product, 1), std::exception);
+  ASSERT_THROW(user.sellProduct(product, 1000), std::exception);
+  ASSERT_EQ(sm::DBConnector::getUser(1).getBalance(), balance)
+      << "Failed trade was committed";
+
+  sm::DBConnector::initDB(":memory:");
+  std::filesystem::remove(path);
+  std::filesystem::remove(path + "-wal");
+  std::filesystem::remove(path + "-shm");
+}
+
+TEST(TestDatabase, TickStream) {
+  sm::DBConnector::initDB(":memory:");
+
+  sm::MarketPlace mp(3600, false);
+  sm::time_point now = std::chrono::system_clock::now();
+  for (int i = 0; i < 5; i++) {
+    mp.addProduct("Product " + std::to_string(i), 100)
+        .addRecord(sm::Record(now, 100));
+  }
+  ASSERT_FALSE(mp.waitForTick(0, 10ms).has_value())
+      << "Tick published before the first price update";
+
+  mp.updateProductPrices();
+  std::optional<sm::Tick> tick = mp.waitForTick(0, 10ms);
+  ASSERT_TRUE(tick.has_value());
+  ASSERT_EQ(tick->sequence, 1);
+  ASSERT_EQ(tick->updates.size(), 5);
+  for (const auto& update : tick->updates) {
+    ASSERT_EQ(sm::PriceBoard::getPrice(update.productId), update.record.price)
+        << "Published tick does not match the current prices";
+  }
+  ASSERT_FALSE(mp.waitForTick(1, 10ms).has_value());
+
+  std::optional<sm::Tick> waited;
+  std::thread subscriber([&]() { waited = mp.waitForTick(1, 5s); });
+  mp.updateProductPrices();
+  subscriber.join();
+  ASSERT_TRUE(waited.has_value()) << "Waiting subscriber not woken up";
+  ASSERT_EQ(waited->sequence, 2);
+
+  // a subscriber that fell behind skips to the newest tick
+  mp.updateProductPrices();
+  mp.updateProductPrices();
+  ASSERT_EQ(mp.waitForTick(2, 10ms)->sequence, 4);
+}
+
+TEST(TestDatabase, BulkRecords) {
+  sm::DBConnector::initDB(":memory:");
+
+  sm::MarketPlace mp(3600, false);
+  sm::time_point now = std::chrono::system_clock::now();
+  std::vector<sm::Product> products;
+  for (int i = 0; i < 3; i++) {
+    products.push_back(mp.addProduct("Product " + std::to_string(i), 100));
+    for (int j = 0; j < 4; j++) {
+      products.back().addRecord(sm::Record(now + j * 1s, i * 10 + j));
+    }
+  }
+
+  auto updates =
+      mp.getRecords({products[2].getId(), products[0].getId()}, now + 1s);
+  ASSERT_EQ(updates.size(), 4) << "Records not filtered by product and time";
+  ASSERT_EQ(updates[0].productId, products[0].getId());
+  ASSERT_EQ(updates[0].record.price, 2) << "Record at `since` not excluded";
+  ASSERT_EQ(updates[1].record.price, 3);
+  ASSERT_EQ(updates[2].productId, products[2].getId());
+  ASSERT_EQ(updates[2].record.price, 22);
+
+  ASSERT_EQ(mp.getRecords({}, now - 1s).size(), 12)
+      << "Records of all products not returned without ids";
+  ASSERT_TRUE(mp.getRecords({products[1].getId()}, now + 3s).empty());
+}
+
+TEST(TestDatabase, RecordCursor) {
+  sm::DBConnector::initDB(":memory:");
+
+  sm::MarketPlace mp(3, false);
+  sm::time_point now = std::chrono::system_clock::now();
+  sm::Product apple = mp.addProduct("Apple", 100);
+  sm::Product pear = mp.addProduct("Pear", 100);
+  apple.addRecord(sm::Record(now, 1));
+  pear.addRecord(sm::Record(now, 2));
+
+  std::vector<sm::Record> records = apple.getRecordsAfter(0);
+  ASSERT_EQ(records.size(), 1);
+  int64_t cursor = records.back().cursor;
+  ASSERT_GT(cursor, 0) << "Stored record has no cursor";
+  ASSERT_TRUE(apple.getRecordsAfter(cursor).empty())
+      << "Unchanged product returned records after its cursor";
+
+  // same timestamp as the known record, still part of the delta
+  apple.addRecord(sm::Record(now, 3));
+  records = apple.getRecordsAfter(cursor);
+  ASSERT_EQ(records.size(), 1) << "Record with a colliding timestamp missed";
+  ASSERT_EQ(records[0].price, 3);
+  ASSERT_GT(records[0].cursor, cursor);
+
+  // the tick hands out the cursors of the stored records
+  mp.updateProductPrices();
+  std::optional<sm::Tick> tick = mp.waitForTick(0, 10ms);
+  ASSERT_TRUE(tick.has_value());
+  std::vector<sm::PriceUpdate> updates =
+      mp.getRecordsAfter({}, records[0].cursor);
+  ASSERT_EQ(updates.size(), 2) << "Delta over all products is not exact";
+  for (const auto& update : tick->updates) {
+    ASSERT_GT(update.record.cursor, records[0].cursor);
+  }
+
+  // replacing records of a full ring keeps the cursor growing
+  int64_t newest = updates.back().record.cursor;
+  for (int i = 0; i < 5; i++) {
+    mp.updateProductPrices();
+  }
+  ASSERT_EQ(mp.getRecordsAfter({apple.getId()}, newest).size(), 3)
+      << "Records replaced in the ring are not after the cursor";
+  ASSERT_EQ(apple.getAllRecords().size(), 3);
+}
+
+TEST(TestDatabase, Candles) {
+  sm::DBConnector::initDB(":memory:");
+
+  sm::MarketPlace mp(3600, false);
+  sm::Product apple = mp.addProduct("Apple", 100);
+  // a minute aligned start, so the buckets are known
+  sm::time_point start = sm::from_epoch_millis(1'700'000'040'000);
+  std::vector<int> prices = {10, 14, 8, 12, 20, 5, 7};
+  for (size_t i = 0; i < prices.size(); i++) {
+    apple.addRecord(sm::Record(start + i * 20s, prices[i]));
+  }
+
+  // 20s apart: buckets of a minute hold 3, 3 and 1 records
+  auto candles = apple.getCandles(start, start + 1h, 1min);
+  ASSERT_EQ(candles.size(), 3);
+  ASSERT_EQ(candles[0].start, start);
+  ASSERT_EQ(candles[0].open, 10);
+  ASSERT_EQ(candles[0].high, 14);
+  ASSERT_EQ(candles[0].low, 8);
+  ASSERT_EQ(candles[0].close, 8);
+  ASSERT_EQ(candles[0].count, 3);
+  ASSERT_EQ(candles[1].start, start + 1min);
+  ASSERT_EQ(candles[1].open, 12);
+  ASSERT_EQ(candles[1].high, 20);
+  ASSERT_EQ(candles[1].low, 5);
+  ASSERT_EQ(candles[1].close, 5);
+  ASSERT_EQ(candles[2].open, 7);
+  ASSERT_EQ(candles[2].close, 7);
+  ASSERT_EQ(candles[2].count, 1);
+
+  candles = apple.getCandles(start + 20s, start + 40s, 1h);
+  ASSERT_EQ(candles.size(), 1) << "Time range not respected";
+  ASSERT_EQ(candles[0].count, 2);
+  ASSERT_THROW(apple.getCandles(start, start + 1h, 0ms), std::invalid_argument);
+}
+
+TEST(TestDatabase, RecordBatch) {
+  sm::DBConnector::initDB(":memory:");
+
+  sm::MarketPlace mp(3600, false);
+  sm::Product apple = mp.addProduct("Apple", 100);
+  sm::Product pear = mp.addProduct("Pear", 100);
+  sm::Product plum = mp.addProduct("Plum", 100);
+  sm::time_point start = sm::from_epoch_millis(1'700'000'000'000);
+  apple.addRecord(sm::Record(start, 5));
+  pear.addRecord(sm::Record(start + 1s, -7));
+  apple.addRecord(sm::Record(start + 2s, 6));
+
+  sm::RecordBatch batch = sm::RecordBatch::fromUpdates(
+      mp.getRecords({apple.getId(), pear.getId(), plum.getId()}, start - 1s),
+      {apple.getId(), pear.getId(), plum.getId()});
+  ASSERT_EQ(batch.size(), 3);
+  ASSERT_EQ(batch.toJson(),
+            "{\"products\":["
+            "{\"product_id\":1,\"timestamps\":[1700000000000,1700000002000],"
+            "\"prices\":[5,6],\"cursors\":[1,3]},"
+            "{\"product_id\":2,\"timestamps\":[1700000001000],"
+            "\"prices\":[-7],\"cursors\":[2]},"
+            "{\"product_id\":3,\"timestamps\":[],\"prices\":[],"
+            "\"cursors\":[]}]}");
+
+  std::string binary = batch.toBinary();
+  ASSERT_EQ(binary.size(), 4 + 3 * 8 + 3 * 20);
+  auto read = [&](size_t offset, size_t size) {
+    uint64_t value = 0;
+    for (size_t i = 0; i < size; i++) {
+      value |= uint64_t(uint8_t(binary[offset + i])) << (8 * i);
+    }
+    return value;
+  };
+  ASSERT_EQ(read(0, 4), 3) << "Product count not little-endian";
+  ASSERT_EQ(read(4, 4), apple.getId());
+  ASSERT_EQ(read(8, 4), 2);
+  ASSERT_EQ(read(28, 8), 1700000000000) << "First timestamp misplaced";
+  ASSERT_EQ(read(44, 4), 5) << "First price misplaced";
+  // the price of pear follows its timestamp and is negative
+  ASSERT_EQ(int32_t(read(28 + 2 * 20 + 8, 4)), -7);
+
+  batch = sm::RecordBatch::fromRecords(apple.getId(), apple.getAllRecords());
+  ASSERT_EQ(batch.getColumns().size(), 1);
+  ASSERT_EQ(batch.getColumns()[0].prices, std::vector<int32_t>({5, 6}));
+
+  const int32_t* prices = batch.getColumns()[0].prices.data();
+  std::vector<sm::RecordColumns> columns = batch.takeColumns();
+  ASSERT_EQ(columns[0].prices.data(), prices) << "Columns copied on take";
+  ASSERT_EQ(batch.size(), 0);
+}
+
+TEST(TestDatabase, Snapshot) {
+  std::string path =
+      (std::filesystem::temp_directory_path() / "snapshot_test.db").string();
+  std::filesystem::remove(path);
+  sm::DBConnector::initDB(path, 2);
+
+  sm::MarketPlace mp(3600, false);
+  sm::Product apple = mp.addProduct("Apple", 100);
+  sm::Product pear = mp.addProduct("Pear", 50);
+  sm::time_point now = std::chrono::system_clock::now();
+  apple.addRecord(sm::Record(now - std::chrono::minutes(2), 20));
+  apple.addRecord(sm::Record(now - std::chrono::seconds(5), 30));
+  pear.addRecord(sm::Record(now - std::chrono::minutes(2), 40));
+  sm::DBConnector::registerAccount(sm::Account("snapshot", "secret"), "Snap");
+  sm::User user = sm::DBConnector::getUser(1);
+
+  sm::Snapshot snapshot = mp.getSnapshot(user, std::nullopt);
+  ASSERT_EQ(snapshot.user.getBalance(), 1000);
+  ASSERT_TRUE(snapshot.inventory.empty());
+  ASSERT_EQ(snapshot.market.size(), 2);
+  ASSERT_EQ(snapshot.prices.size(), 2) << "Latest price per product missing";
+  ASSERT_EQ(snapshot.prices[0].productId, apple.getId());
+  ASSERT_EQ(snapshot.prices[0].record.price, 30) << "Not the newest record";
+  ASSERT_EQ(snapshot.prices[1].record.price, 40);
+  ASSERT_TRUE(snapshot.records.empty()) << "Records loaded without asking";
+
+  snapshot = mp.getSnapshot(user, now - std::chrono::minutes(1));
+  ASSERT_EQ(snapshot.records.size(), 1) << "Records tail not filtered by time";
+  ASSERT_EQ(snapshot.records[0].record.price, 30);
+
+  // trades committed while snapshots are taken are never seen halfway
+  std::atomic<bool> done = false;
+  std::atomic<bool> trade_failed = false;
+  std::thread trader([&]() {
+    // ends the snapshot loop even if a purchase throws
+    struct DoneGuard {
+      std::atomic<bool>& done;
+      ~DoneGuard() { done = true; }
+    } guard{done};
+    try {
+      sm::User buyer = sm::DBConnector::getUser(1);
+      for (int i = 0; i < 30; i++) {
+        buyer.buyProduct(apple, 1);
+      }
+    } catch (const std::exception& e) {
+      trade_failed = true;
+    }
+  });
+  // nothing is asserted before the join, a returning test would destroy the
+  // running thread
+  int torn_snapshots = 0;
+  bool snapshot_failed = false;
+  while (!done && !snapshot_failed) {
+    try {
+      snapshot = mp.getSnapshot(user, std::nullopt);
+      int owned = snapshot.inventory.empty() ? 0 : snapshot.inventory[0].count;
+      if (snapshot.user.getBalance() != 1000 - owned * 30 ||
+          snapshot.market[0].count != 100 - owned) {
+        torn_snapshots++;
+      }
+    } catch (const std::exception& e) {
+      snapshot_failed = true;
+    }
+  }
+  trader.join();
+  EXPECT_FALSE(trade_failed) << "Purchase failed";
+  EXPECT_FALSE(snapshot_failed) << "Snapshot failed during the trades";
+  EXPECT_EQ(torn_snapshots, 0) << "Snapshot saw a trade halfway";
+  std::vector<sm::ProductEntry> inventory =
+      mp.getSnapshot(user, std::nullopt).inventory;
+  EXPECT_EQ(inventory.size(), 1);
+  if (!inventory.empty()) {
+    EXPECT_EQ(inventory[0].count, 30);
+  }
+
+  sm::DBConnector::initDB(":memory:");
+  std::filesystem::remove(path);
+  std::filesystem::remove(path + "-wal");
+  std::filesystem::remove(path + "-shm");
+}
+
+TEST(TestDatabase, OrderBatch) {
+  sm::DBConnector::initDB(":memory:");
+
+  sm::MarketPlace mp(3600, false);
+  sm::Product apple = mp.addProduct("Apple", 100);
+  sm::Product pear = mp.addProduct("Pear", 100);
+  sm::time_point now = std::chrono::system_clock::now();
+  apple.addRecord(sm::Record(now, 10));
+  pear.addRecord(sm::Record(now, 20));
+  sm::DBConnector::registerAccount(sm::Account("orders", "secret"), "Trader");
+  sm::User user = sm::DBConnector::getUser(1);
+
+  std::vector<sm::Fill> fills =
+      user.executeOrders({{apple.getId(), sm::OrderSide::Buy, 5},
+                          {pear.getId(), sm::OrderSide::Buy, 10},
+                          {apple.getId(), sm::OrderSide::Sell, 2}});
+  ASSERT_EQ(fills.size(), 3);
+  ASSERT_EQ(fills[1].price, 20);
+  ASSERT_EQ(fills[1].total, 200);
+  ASSERT_EQ(fills[2].side, sm::OrderSide::Sell);
+  ASSERT_EQ(user.getBalance(), 1000 - 50 - 200 + 20);
+  ASSERT_EQ(sm::DBConnector::getUser(1).getBalance(), user.getBalance());
+
+  // the last leg fails, so the first one is rolled back as well
+  ASSERT_THROW(user.executeOrders({{pear.getId(), sm::OrderSide::Sell, 10},
+                                   {apple.getId(), sm::OrderSide::Sell, 4}}),
+               std::exception);
+  ASSERT_EQ(sm::DBConnector::getUser(1).getBalance(), 770);
+  std::vector<sm::ProductEntry> inventory = user.getInventory();
+  ASSERT_EQ(inventory.size(), 2) << "Sale of the first leg not rolled back";
+  ASSERT_EQ(inventory[1], sm::ProductEntry(pear, 10));
+  ASSERT_EQ(mp.getInventory()[1], sm::ProductEntry(pear, 90));
+
+  ASSERT_THROW(user.executeOrders({{42, sm::OrderSide::Buy, 1}}),
+               std::exception)
+      << "Unknown product traded";
+
+  sm::Product plum = mp.addProduct("Plum", 100);
+  ASSERT_THROW(user.executeOrders({{plum.getId(), sm::OrderSide::Buy, 1}}),
+               sm::ProductNotFound)
+      << "Product without a price traded";
+}
+
+TEST(TestDatabase, NonPositiveTrades) {
+  sm::DBConnector::initDB(":memory:");
+
+  sm::MarketPlace mp(3600, false);
+  sm::Product apple = mp.addProduct("Apple", 100);
+  apple.addRecord(sm::Record(std::chrono::system_clock::now(), 10));
+  sm::DBConnector::registerAccount(sm::Account("negative", "secret"), "Trader");
+  sm::User user = sm::DBConnector::getUser(1);
+  user.buyProduct(apple, 5);
+
+  ASSERT_THROW(user.buyProduct(apple, -5), std::invalid_argument);
+  ASSERT_THROW(user.buyProduct(apple, 0), std::invalid_argument);
+  ASSERT_THROW(user.sellProduct(apple, -5), std::invalid_argument);
+  ASSERT_THROW(user.sellProduct(apple, 0), std::invalid_argument);
+  ASSERT_THROW(user.executeOrders({{apple.getId(), sm::OrderSide::Buy, 1},
+                                   {apple.getId(), sm::OrderSide::Sell, -1}}),
+               std::invalid_argument);
+  ASSERT_THROW(user.executeOrders({{apple.getId(), sm::OrderSide::Buy, 0}}),
+               std::invalid_argument);
+
+  ASSERT_EQ(sm::DBConnector::getUser(1).getBalance(), 950);
+  std::vector<sm::ProductEntry> inventory = user.getInventory();
+  ASSERT_EQ(inventory.size(), 1);
+  ASSERT_EQ(inventory[0], sm::ProductEntry(apple, 5));
+  ASSERT_EQ(mp.getInventory()[0], sm::ProductEntry(apple, 95));
+}
+
+TEST(TestDatabase, ResponseVersions) {
+  sm::DBConnector::initDB(":memory:");
+
+  sm::MarketPlace mp(3600, false);
+  sm::Product apple = mp.addProduct("Apple", 1);
+  apple.addRecord(sm::Record(std::chrono::system_clock::now(), 10));
+  sm::DBConnector::registerAccount(sm::Account("versions", "secret"), "Reader");
+  sm::User user = sm::DBConnector::getUser(1);
+
+  ASSERT_EQ(mp.getTickSequence(), 0);
+  mp.updateProductPrices();
+  ASSERT_EQ(mp.getTickSequence(), 1) << "Tick not counted";
+
+  uint64_t version = mp.getInventoryVersion();
+  user.buyProduct(apple, 1);
+  ASSERT_GT(mp.getInventoryVersion(), version) << "Version not bumped by trade";
+  version = mp.getInventoryVersion();
+  ASSERT_THROW(user.buyProduct(apple, 1), std::exception);
+  ASSERT_EQ(mp.getInventoryVersion(), version) << "Failed trade bumped version";
+  mp.updateProductPrices();
+  ASSERT_EQ(mp.getInventoryVersion(), version) << "Tick bumped inventory";
+}
+
+TEST(TestDatabase, PriceEngine) {
+  sm::time_point now = std::chrono::system_clock::now();
+  std::vector<int> ids = {1, 2, 3};
+  std::vector<int> prices = {100, 50, 1000};
+
+  sm::PriceEngine first(42);
+  sm::PriceEngine second(42);
+  first.setPrices(ids, prices);
+  second.setPrices(ids, prices);
+  for (int i = 0; i < 10; i++) {
+    std::vector<sm::PriceUpdate> updates = first.step(now);
+    ASSERT_EQ(updates.size(), 3);
+    ASSERT_EQ(updates[2].productId, 3);
+    ASSERT_EQ(updates[2].record.price, first.getPrices()[2]);
+    second.step(now);
+    ASSERT_EQ(first.getPrices(), second.getPrices()) << "Seeded walk differs";
+  }
+  sm::PriceEngine other(43);
+  other.setPrices(ids, prices);
+  other.step(now);
+  second.seed(42);
+  second.setPrices(ids, prices);
+  second.step(now);
+  ASSERT_NE(other.getPrices(), second.getPrices()) << "Seed ignored";
+
+  // a seeded market replays the same prices on the same database
+  std::vector<int> replayed;
+  for (int run = 0; run < 2; run++) {
+    sm::DBConnector::initDB(":memory:");
+    sm::MarketPlace mp(3600, false, 7);
+    for (int i = 0; i < 3; i++) {
+      mp.addProduct("Product " + std::to_string(i), 1)
+          .addRecord(sm::Record(now, 100));
+    }
+    mp.updateProductPrices();
+    mp.updateProductPrices();
+    std::vector<int> current;
+    for (const auto& product : mp.getAllProducts()) {
+      current.push_back(product.getCurrentPrice());
+    }
+    if (run == 1) {
+      ASSERT_EQ(current, replayed) << "Seeded market not reproducible";
+    }
+    replayed = current;
+  }
+}
+
+TEST(TestDatabase, Timer) {
+  using Clock = std::chrono::steady_clock;
+  Clock::time_point start;
+
+  // a tick within its period keeps the deadlines fixed
+  sm::TimerSchedule next =
+      sm::Timer::schedule(start, start + 15ms, 20ms, sm::OverrunPolicy::Skip);
+  ASSERT_EQ(next.deadline, start + 20ms) << "Tick duration added to the period";
+  ASSERT_FALSE(next.overrun);
+
+  // a tick ending at 90 ms misses the deadlines at 20, 40, 60 and 80 ms
+  next =
+      sm::Timer::schedule(start, start + 90ms, 20ms, sm::OverrunPolicy::Skip);
+  ASSERT_TRUE(next.overrun);
+  ASSERT_EQ(next.skipped, 4);
+  ASSERT_EQ(next.deadline, start + 100ms);
+  next = sm::Timer::schedule(start, start + 90ms, 20ms,
+                             sm::OverrunPolicy::CatchUp);
+  ASSERT_TRUE(next.overrun);
+  ASSERT_EQ(next.skipped, 0);
+  ASSERT_EQ(next.deadline, start + 20ms) << "Missed ticks not caught up";
+
+  // the timer thread applies the schedule and counts every tick
+  std::atomic<int> ticks{0};
+  sm::Timer timer(1ms);
+  timer.setCallback([&]() { ticks++; });
+  timer.start();
+  while (ticks < 3) {
+    std::this_thread::sleep_for(1ms);
+  }
+  timer.stop();
+  sm::TimerStats stats = timer.getStats();
+  ASSERT_EQ(stats.ticks, ticks);
+  ASSERT_EQ(stats.durationHistogram.size(), stats.bucketBounds.size() + 1);
+  uint64_t counted = 0;
+  for (uint64_t count : stats.durationHistogram) {
+    counted += count;
+  }
+  ASSERT_EQ(counted, stats.ticks);
+  ASSERT_THROW(timer.setPeriod(0ms), std::invalid_argument);
+}
+
+TEST(TestDatabase, Backfill) {
+  sm::DBConnector::initDB(":memory:");
+
+  sm::MarketPlace mp(50, false, 3);
+  sm::time_point now = std::chrono::system_clock::now();
+  for (int i = 0; i < 4; i++) {
+    mp.addProduct("Product " + std::to_string(i), 1)
+        .addRecord(sm::Record(now, 100));
+  }
+  sm::Product traded = mp.addProduct("Traded", 1);
+  traded.addRecord(sm::Record(now - 1s, 100));
+  traded.addRecord(sm::Record(now, 101));
+  sm::BackfillReport report = mp.backfill(std::chrono::minutes(2), 1s, 30);
+  ASSERT_EQ(report.ticks, 120);
+  ASSERT_EQ(report.prices, 480);
+  ASSERT_EQ(report.records, 200) << "Ticks beyond the record limit stored";
+  ASSERT_EQ(mp.getTickSequence(), 1);
+
+  ASSERT_EQ(traded.getAllRecords().size(), 2)
+      << "Product with history backfilled";
+  for (const auto& product : mp.getAllProducts()) {
+    if (product == traded) {
+      continue;
+    }
+    std::vector<sm::Record> records = product.getAllRecords();
+    ASSERT_EQ(records.size(), 50);
+    ASSERT_EQ(records.back().price, product.getCurrentPrice())
+        << "Last simulated price is not the current price";
+    ASSERT_EQ(records.back().dateTime - records.front().dateTime, 49s);
+    for (size_t i = 1; i < records.size(); i++) {
+      ASSERT_GT(records[i].cursor, records[i - 1].cursor)
+          << "Records not stored in order";
+    }
+  }
+  ASSERT_EQ(mp.backfill(std::chrono::minutes(2), 1s).ticks, 0)
+      << "Backfilled history backfilled again";
+  ASSERT_THROW(mp.backfill(1s, 2s), std::invalid_argument);
+}
+
+TEST(TestDatabase, ShardedPrices) {
+  sm::time_point now = std::chrono::system_clock::now();
+  std::vector<int> ids(1001);
+  std::vector<int> prices(1001, 100);
+  for (size_t i = 0; i < ids.size(); i++) {
+    ids[i] = i + 1;
+  }
+
+  sm::PriceEngine single(42);
+  sm::PriceEngine sharded(42);
+  sm::PriceEngine replay(42);
+  sharded.setShards(4);
+  replay.setShards(4);
+  for (sm::PriceEngine* engine : {&single, &sharded, &replay}) {
+    engine->setPrices(ids, prices);
+  }
+  std::vector<sm::PriceUpdate> updates = sharded.step(now);
+  single.step(now);
+  replay.step(now);
+  // the first shard starts from the seed of the engine
+  ASSERT_EQ(std::vector<int>(single.getPrices().begin(),
+                             single.getPrices().begin() + 250),
+            std::vector<int>(sharded.getPrices().begin(),
+                             sharded.getPrices().begin() + 250));
+  ASSERT_NE(single.getPrices(), sharded.getPrices());
+  for (int i = 0; i < 4; i++) {
+    updates = sharded.step(now);
+    replay.step(now);
+  }
+  ASSERT_EQ(updates.size(), ids.size());
+  ASSERT_EQ(updates.back().productId, 1001) << "Shards not merged in order";
+  ASSERT_EQ(sharded.getPrices(), replay.getPrices())
+      << "Seeded shards not reproducible";
+  ASSERT_THROW(sharded.setShards(0), std::invalid_argument);
+
+  // a sharded market still stores every price of a tick in one batch
+  sm::DBConnector::initDB(":memory:");
+  sm::MarketPlace mp(3600, false, 1);
+  mp.setPriceShards(3);
+  ASSERT_EQ(mp.getPriceShards(), 3);
+  for (int i = 0; i < 10; i++) {
+    mp.addProduct("Product " + std::to_string(i), 1)
+        .addRecord(sm::Record(now, 100));
+  }
+  mp.updateProductPrices();
+  std::optional<sm::Tick> tick = mp.waitForTick(0, 10ms);
+  ASSERT_EQ(tick->updates.size(), 10);
+  for (const auto& update : tick->updates) {
+    ASSERT_GT(update.record.cursor, 0) << "Price not stored";
+    ASSERT_EQ(sm::PriceBoard::getPrice(update.productId), update.record.price);
+  }
+}
+
+TEST(TestDatabase, OrderFlowDemand) {
+  // two markets walk the same prices, only one of them is traded
+  std::vector<int> quiet;
+  std::vector<int> traded;
+  for (bool trade : {false, true}) {
+    sm::DBConnector::initDB(":memory:");
+    sm::MarketPlace mp(3600, false, 11);
+    sm::time_point now = std::chrono::system_clock::now();
+    sm::Product apple = mp.addProduct("Apple", 100);
+    sm::Product pear = mp.addProduct("Pear", 100);
+    apple.addRecord(sm::Record(now, 10));
+    pear.addRecord(sm::Record(now, 10));
+    if (trade) {
+      sm::DBConnector::registerAccount(sm::Account("flow", "secret"), "Buyer");
+      sm::User user = sm::DBConnector::getUser(1);
+      user.buyProduct(apple, 90);
+      user.executeOrders({{apple.getId(), sm::OrderSide::Sell, 5},
+                          {pear.getId(), sm::OrderSide::Buy, 1},
+                          {pear.getId(), sm::OrderSide::Sell, 1}});
+    }
+    mp.updateProductPrices();
+    ASSERT_TRUE(sm::OrderFlow::drain().empty()) << "Flow not consumed by tick";
+    std::vector<int>& prices = trade ? traded : quiet;
+    for (const auto& product : mp.getAllProducts()) {
+      prices.push_back(product.getCurrentPrice());
+    }
+  }
+  ASSERT_GT(traded[0], quiet[0]) << "Demand did not raise the price";
+  ASSERT_EQ(traded[1], quiet[1]) << "Balanced flow moved the price";
+
+  sm::OrderFlow::recordBuy(1, 3);
+  sm::OrderFlow::recordSell(1, 5);
+  std::vector<sm::ProductFlow> flows = sm::OrderFlow::drain();
+  ASSERT_EQ(flows.size(), 1);
+  ASSERT_EQ(flows[0].bought, 3);
+  ASSERT_EQ(flows[0].sold, 5);
+}